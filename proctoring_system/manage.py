@@ -7,6 +7,10 @@ import sys
 def main():
     """Run administrative tasks."""
     os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'proctoring_system.settings')
+    # The process runserver serves requests from (its autoreloaded child, or
+    # itself with --noreload) runs the analysis job monitor, as wsgi.py does
+    if sys.argv[1:2] == ['runserver'] and (os.environ.get('RUN_MAIN') == 'true' or '--noreload' in sys.argv):
+        os.environ.setdefault('PROCTORING_JOB_MONITOR', '1')
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc:
@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class ProctoringConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'proctoring'
+
+    def ready(self):
+        from django.conf import settings
+
+        from .jobs import start_job_monitor
+
+        # Only web server processes run 'thread' backend jobs; database workers start their own monitor
+        if settings.PROCTORING_JOB_MONITOR and settings.PROCTORING_JOB_BACKEND == 'thread':
+            start_job_monitor(submit=True)
@@ -0,0 +1,80 @@
+from django.conf import settings
+from django.core import signing
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+
+STREAM_TOKEN_SALT = 'proctoring.stream-token'
+
+
+def make_stream_token(session):
+    """
+    Signed token letting the owner of `session` send frames for it without full authentication.
+    """
+    return signing.TimestampSigner(salt=STREAM_TOKEN_SALT).sign(f"{session.id}:{session.user_id}")
+
+
+def read_stream_token(token):
+    """
+    Check a stream token's signature and age.
+
+    Returns:
+        Tuple of (session_id, user_id)
+
+    Raises:
+        signing.BadSignature: If the token is forged, malformed or older than
+            PROCTORING_STREAM_TOKEN_MAX_AGE (signing.SignatureExpired)
+    """
+    value = signing.TimestampSigner(salt=STREAM_TOKEN_SALT).unsign(
+        token, max_age=settings.PROCTORING_STREAM_TOKEN_MAX_AGE
+    )
+    try:
+        session_id, user_id = (int(part) for part in value.split(':'))
+    except ValueError:
+        raise signing.BadSignature("Malformed stream token")
+    return session_id, user_id
+
+
+class StreamTokenUser:
+    """
+    The user a valid stream token was issued to, known without a database query.
+
+    Only authorizes frames for `stream_session_id`; views that need the full User
+    must not accept stream token authentication.
+    """
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, user_id, session_id):
+        self.id = self.pk = user_id
+        self.stream_session_id = session_id
+
+    def __str__(self):
+        return f"Stream token user {self.id} (session {self.stream_session_id})"
+
+
+class StreamTokenAuthentication(BaseAuthentication):
+    """
+    Authenticate live frame requests with `Authorization: Stream <token>`.
+
+    The token is checked by its signature alone, so unlike session or Basic
+    authentication no session row, user row or password hash is touched.
+    Requests without a Stream authorization header fall through to the other
+    authentication classes.
+    """
+    keyword = 'Stream'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed("Invalid stream token header")
+
+        try:
+            session_id, user_id = read_stream_token(auth[1].decode())
+        except (signing.BadSignature, UnicodeError):
+            raise exceptions.AuthenticationFailed("Invalid or expired stream token")
+        return StreamTokenUser(user_id, session_id), auth[1].decode()
+
+    def authenticate_header(self, request):
+        return self.keyword
@@ -0,0 +1,52 @@
+from rest_framework.exceptions import ValidationError
+
+from .models import ViolationRecord
+
+VIOLATION_TYPES = [violation_type for violation_type, _ in ViolationRecord.VIOLATION_TYPES]
+
+
+def _float_param(params, name):
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise ValidationError({name: "Must be a number"})
+
+
+def filter_violations(queryset, params):
+    """
+    Narrow a ViolationRecord queryset by the review query parameters.
+
+    Parameters:
+        start, end: Keep violations with start <= timestamp < end (seconds)
+        type: Comma-separated violation types
+        min_confidence: Keep violations with at least this confidence
+
+    Combined with a session filter, the time range is served by the
+    (session, timestamp) index and the types by the (session, violation_type) index.
+
+    Raises:
+        ValidationError: If a parameter is malformed (a 400 response in views)
+    """
+    start = _float_param(params, 'start')
+    end = _float_param(params, 'end')
+    min_confidence = _float_param(params, 'min_confidence')
+
+    if start is not None:
+        queryset = queryset.filter(timestamp__gte=start)
+    if end is not None:
+        queryset = queryset.filter(timestamp__lt=end)
+    if min_confidence is not None:
+        queryset = queryset.filter(confidence__gte=min_confidence)
+
+    types = params.get('type')
+    if types:
+        types = [violation_type.strip() for violation_type in types.split(',') if violation_type.strip()]
+        unknown = sorted(set(types) - set(VIOLATION_TYPES))
+        if unknown:
+            raise ValidationError({'type': f"Unknown violation types: {', '.join(unknown)}"})
+        queryset = queryset.filter(violation_type__in=types)
+
+    return queryset
@@ -0,0 +1,302 @@
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import AnalysisJob
+from proctoring_system.utils.audio_analysis import AudioGateStats
+from proctoring_system.utils.change_gate import ChangeGateStats
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Jobs handed to this process's pool and not finished yet, and the ones of
+# those it is running; guarded by _jobs_lock
+_submitted = set()
+_running = set()
+_jobs_lock = threading.Lock()
+
+_monitor = None
+_monitor_lock = threading.Lock()
+
+
+def enqueue_analysis(session, video_file):
+    """
+    Store an uploaded video and queue it for analysis.
+
+    With the 'thread' backend the job is also handed to this process's worker
+    pool once the transaction commits; with the 'database' backend it waits for
+    a `manage.py run_analysis_worker` process to claim it.
+    """
+    job = AnalysisJob.objects.create(session=session, video_file=video_file)
+
+    if settings.PROCTORING_JOB_BACKEND == 'thread':
+        transaction.on_commit(lambda: submit_job(job.id))
+
+    return job
+
+
+def submit_job(job_id):
+    """
+    Hand a job to this process's pool ('thread' backend), unless it already has it.
+    """
+    with _jobs_lock:
+        if job_id in _submitted:
+            return False
+        _submitted.add(job_id)
+    _get_executor().submit(run_job, job_id)
+    return True
+
+
+def worker_id():
+    """
+    Identifies this process in AnalysisJob.worker_id.
+    """
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.PROCTORING_JOB_THREADS,
+                thread_name_prefix='analysis-job',
+            )
+        return _executor
+
+
+def heartbeat():
+    """
+    Refresh the heartbeat of the jobs running in this process.
+    """
+    with _jobs_lock:
+        running = list(_running)
+    if running:
+        AnalysisJob.objects.filter(id__in=running, status='running').update(heartbeat_at=timezone.now())
+
+
+def recover_jobs(orphan_after=None):
+    """
+    Queue again the running jobs whose process has died.
+
+    A process running jobs refreshes their heartbeat every
+    PROCTORING_JOB_HEARTBEAT_SECONDS (see JobMonitor), so a job whose heartbeat
+    is older than `orphan_after` was interrupted by a restart or crash,
+    however long ago it started.
+
+    Args:
+        orphan_after: Seconds without a heartbeat; PROCTORING_JOB_ORPHAN_SECONDS if None
+
+    Returns:
+        Number of jobs queued again
+    """
+    if orphan_after is None:
+        orphan_after = settings.PROCTORING_JOB_ORPHAN_SECONDS
+    cutoff = timezone.now() - timedelta(seconds=orphan_after)
+    with _jobs_lock:
+        running_here = list(_running)
+
+    # Jobs claimed before heartbeats were recorded fall back to their start time
+    orphaned = AnalysisJob.objects.filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff), status='running',
+    ).exclude(id__in=running_here)
+    recovered = orphaned.update(status='queued', started_at=None, heartbeat_at=None, worker_id='', progress=0)
+    if recovered:
+        logger.info("Requeued %d orphaned analysis job(s)", recovered)
+    return recovered
+
+
+def submit_queued_jobs():
+    """
+    Hand the queued jobs this process does not have yet to its pool ('thread' backend).
+
+    Picks up jobs queued by a process that has since restarted, and jobs
+    requeued by recover_jobs. Claiming is atomic, so a job submitted by
+    several processes still runs once.
+
+    Returns:
+        Number of jobs submitted
+    """
+    job_ids = AnalysisJob.objects.filter(status='queued').order_by('created_at', 'id').values_list('id', flat=True)
+    return sum(submit_job(job_id) for job_id in job_ids)
+
+
+class JobMonitor(threading.Thread):
+    """
+    Background thread keeping this process's jobs alive and recovering orphaned ones.
+
+    Every `interval` seconds it refreshes the heartbeat of the jobs running in
+    this process, queues again the jobs whose heartbeat has stopped, and with
+    `submit` hands queued jobs to this process's pool.
+
+    Args:
+        interval: Seconds between rounds
+        submit: Run queued jobs in this process ('thread' backend)
+    """
+
+    def __init__(self, interval, submit):
+        super().__init__(name='analysis-job-monitor', daemon=True)
+        self.interval = interval
+        self.submit = submit
+        self.stopped = threading.Event()
+
+    def run(self):
+        while True:
+            self.check()
+            if self.stopped.wait(self.interval):
+                return
+
+    def check(self):
+        close_old_connections()
+        try:
+            heartbeat()
+            recover_jobs()
+            if self.submit:
+                submit_queued_jobs()
+        except Exception:
+            logger.exception("Error in the analysis job monitor")
+        finally:
+            close_old_connections()
+
+    def stop(self):
+        self.stopped.set()
+
+
+def start_job_monitor(submit):
+    """
+    Start this process's JobMonitor, once.
+    """
+    global _monitor
+    with _monitor_lock:
+        if _monitor is None:
+            _monitor = JobMonitor(settings.PROCTORING_JOB_HEARTBEAT_SECONDS, submit)
+            _monitor.start()
+        return _monitor
+
+
+def claim_job(job_id=None):
+    """
+    Atomically move a queued job to 'running' and return it.
+
+    The conditional UPDATE only succeeds for one caller, so several worker
+    processes and threads can poll the same table without double-running a job.
+
+    Args:
+        job_id: Claim this job, or the oldest queued job if None
+
+    Returns:
+        The claimed AnalysisJob, or None if there was nothing to claim
+    """
+    queued = AnalysisJob.objects.filter(status='queued')
+    if job_id is not None:
+        candidates = queued.filter(id=job_id).values_list('id', flat=True)
+    else:
+        candidates = queued.order_by('created_at', 'id').values_list('id', flat=True)[:5]
+
+    for candidate_id in candidates:
+        now = timezone.now()
+        claimed = AnalysisJob.objects.filter(id=candidate_id, status='queued').update(
+            status='running', started_at=now, heartbeat_at=now, worker_id=worker_id(), progress=0
+        )
+        if claimed:
+            return AnalysisJob.objects.select_related('session').get(id=candidate_id)
+
+    return None
+
+
+def run_job(job_id=None):
+    """
+    Claim and run one analysis job.
+
+    Returns:
+        The finished AnalysisJob, or None if no job could be claimed
+    """
+    # Imported here to avoid a circular import with the views module
+    from .views import process_video
+
+    close_old_connections()
+    job = None
+    try:
+        job = claim_job(job_id)
+        if job is None:
+            return None
+        with _jobs_lock:
+            _running.add(job.id)
+
+        last_reported = [0.0]
+        gate_stats = ChangeGateStats()
+        audio_stats = AudioGateStats()
+
+        def report_progress(fraction):
+            # Throttle progress writes to whole percent steps
+            if fraction - last_reported[0] >= 0.01 or fraction >= 1.0:
+                last_reported[0] = fraction
+                AnalysisJob.objects.filter(id=job.id).update(progress=fraction)
+
+        try:
+            violations = process_video(
+                job.video_file.path, job.session, progress=report_progress, gate_stats=gate_stats,
+                audio_stats=audio_stats,
+            )
+        except Exception as e:
+            traceback.print_exc()
+            job.status = 'failed'
+            job.error = str(e)
+            update_fields = ['status', 'error', 'finished_at']
+        else:
+            job.status = 'completed'
+            job.progress = 1.0
+            job.violations_count = len(violations)
+            job.frames_analyzed = gate_stats.analyzed
+            job.frames_skipped = gate_stats.skipped
+            job.audio_skipped = audio_stats.skipped_fraction
+            update_fields = ['status', 'progress', 'violations_count', 'frames_analyzed', 'frames_skipped',
+                             'audio_skipped', 'finished_at']
+
+        job.finished_at = timezone.now()
+        job.save(update_fields=update_fields)
+        return job
+    finally:
+        with _jobs_lock:
+            _submitted.discard(job_id)
+            if job is not None:
+                _running.discard(job.id)
+        close_old_connections()
+
+
+def run_worker(poll_interval=2.0, once=False):
+    """
+    Run queued jobs until interrupted, sleeping `poll_interval` seconds when idle.
+
+    A JobMonitor keeps the heartbeat of the running job fresh and queues
+    again the jobs of workers that have died (see recover_jobs).
+
+    Args:
+        poll_interval: Seconds to wait between polls of an empty queue
+        once: Stop as soon as the queue is empty
+
+    Returns:
+        Number of jobs run
+    """
+    start_job_monitor(submit=False)
+    jobs_run = 0
+    while True:
+        job = run_job()
+        if job is not None:
+            jobs_run += 1
+            continue
+        if once:
+            return jobs_run
+        time.sleep(poll_interval)
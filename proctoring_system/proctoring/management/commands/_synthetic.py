@@ -0,0 +1,227 @@
+import cv2
+import numpy as np
+import soundfile as sf
+from django.core.management.base import CommandError
+
+try:
+    import av
+except ImportError:
+    av = None
+
+
+# Container extension and FourCC for the formats OpenCV can write. OpenCV's
+# writer always emits a key frame every 12 frames, which makes seeking cheap;
+# real webcam/H.264 recordings use far longer key frame intervals, so the
+# 'h264' format (written with PyAV, if installed) takes an explicit GOP size.
+OPENCV_FORMATS = {
+    'webm': ('webm', 'VP80'),
+    'mp4v': ('mp4', 'mp4v'),
+    'mjpg': ('avi', 'MJPG'),
+}
+
+
+def draw_synthetic_frame(frame, i):
+    """
+    Draw frame `i` of the synthetic test video: a moving block and a counter.
+    """
+    height, width = frame.shape[:2]
+    frame[:] = (40, 40, 40)
+    x = (i * 4) % (width - 80)
+    cv2.rectangle(frame, (x, 100), (x + 80, 180), (200, 200, 200), -1)
+    cv2.putText(frame, str(i), (20, 60), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (255, 255, 255), 2)
+    return frame
+
+
+def write_synthetic_video(path, seconds, fps=30, size=(640, 360), video_format='h264', gop=250):
+    """
+    Write a synthetic test video and return its path.
+    """
+    width, height = size
+    frame = np.zeros((height, width, 3), np.uint8)
+    frame_count = int(seconds * fps)
+
+    if video_format == 'h264':
+        if av is None:
+            raise CommandError("The 'h264' format needs PyAV (pip install av)")
+        path = f'{path}.mp4'
+        container = av.open(path, 'w')
+        stream = container.add_stream('libx264', rate=fps)
+        stream.width, stream.height = width, height
+        stream.pix_fmt = 'yuv420p'
+        stream.gop_size = gop
+        stream.codec_context.options = {'preset': 'ultrafast'}
+        for i in range(frame_count):
+            video_frame = av.VideoFrame.from_ndarray(draw_synthetic_frame(frame, i), format='bgr24')
+            for packet in stream.encode(video_frame):
+                container.mux(packet)
+        for packet in stream.encode():
+            container.mux(packet)
+        container.close()
+        return path
+
+    extension, fourcc = OPENCV_FORMATS[video_format]
+    path = f'{path}.{extension}'
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, size)
+    for i in range(frame_count):
+        writer.write(draw_synthetic_frame(frame, i))
+    writer.release()
+    return path
+
+
+def synthetic_webcam_frames(count, size=(640, 360), seed=0, activity=0.1):
+    """
+    Yield a mostly static synthetic webcam scene, one frame per second.
+
+    A seated figure in front of a plain wall, with sensor noise on every
+    frame. With probability `activity` per frame, an event starts and lasts
+    a few frames: the candidate leans aside, a bright phone-sized screen
+    appears, or the room lighting changes.
+    """
+    rng = np.random.default_rng(seed)
+    width, height = size
+    scene = np.zeros((height, width, 3), np.uint8)
+    scene[:] = (170, 180, 190)
+    event, event_left = None, 0
+
+    for _ in range(count):
+        if event_left == 0:
+            event = rng.choice(['lean', 'phone', 'lights']) if rng.random() < activity else None
+            event_left = int(rng.integers(2, 6)) if event is not None else 1
+            phone_at = (int(rng.integers(0, width - 60)), int(rng.integers(0, height - 100)))
+        event_left -= 1
+
+        frame = scene.copy()
+        shift = width // 5 if event == 'lean' else 0
+        cv2.ellipse(frame, (width // 2 + shift, height // 2), (width // 10, height // 4), 0, 0, 360,
+                    (120, 150, 200), -1)
+        cv2.rectangle(frame, (width // 2 + shift - width // 6, 3 * height // 4),
+                      (width // 2 + shift + width // 6, height), (90, 60, 50), -1)
+        if event == 'phone':
+            x, y = phone_at
+            cv2.rectangle(frame, (x, y), (x + 50, y + 90), (250, 250, 250), -1)
+        if event == 'lights':
+            frame = cv2.convertScaleAbs(frame, alpha=0.7)
+
+        noise = rng.normal(0, 3, frame.shape)
+        yield np.clip(frame + noise, 0, 255).astype(np.uint8)
+
+
+def synthetic_audio_segments(seconds, seed=0, activity=0.4):
+    """
+    Random schedule of (start, end, kind) segments for the synthetic exam audio:
+    silence, with talking, notification beeps and stretches of noise.
+
+    `activity` is the share of segments that are not silent.
+    """
+    rng = np.random.default_rng(seed)
+    lengths = {'silence': (10, 60), 'talk': (3, 20), 'beeps': (5, 15), 'noise': (30, 120)}
+    weights = [1 - activity, 0.75 * activity, 0.125 * activity, 0.125 * activity]
+    segments = []
+    t = 0.0
+    while t < seconds:
+        kind = rng.choice(list(lengths), p=weights)
+        end = min(seconds, t + rng.uniform(*lengths[kind]))
+        segments.append((t, end, kind))
+        t = end
+    return segments
+
+
+def synthetic_audio_blocks(seconds, sr=16000, block_seconds=60, seed=0, activity=0.4):
+    """
+    Yield the synthetic exam audio as float32 blocks, never holding all of it in memory.
+    """
+    segments = synthetic_audio_segments(seconds, seed, activity)
+    rng = np.random.default_rng(seed + 1)
+    block_size = int(block_seconds * sr)
+    total = int(seconds * sr)
+
+    for start in range(0, total, block_size):
+        n = min(block_size, total - start)
+        t = (start + np.arange(n)) / sr
+        y = rng.normal(0, 0.002, n)
+
+        for seg_start, seg_end, kind in segments:
+            if kind == 'silence' or seg_end <= t[0] or seg_start > t[-1]:
+                continue
+            mask = (t >= seg_start) & (t < seg_end)
+            tt = t[mask]
+            if kind == 'talk':
+                # Harmonics of a wandering pitch, modulated at a syllable rate
+                phase = 2 * np.pi * np.cumsum(150 + 30 * np.sin(2 * np.pi * 0.3 * tt)) / sr
+                voice = sum(np.sin(k * phase) / k for k in range(1, 6))
+                y[mask] += 0.15 * voice * (0.5 + 0.5 * np.sin(2 * np.pi * 4 * tt)) ** 2
+            elif kind == 'beeps':
+                y[mask] += 0.4 * np.sin(2 * np.pi * 1800 * tt) * ((tt - seg_start) % 1.0 < 0.08)
+            else:
+                y[mask] += rng.normal(0, 0.1, len(tt))
+
+        yield np.clip(y, -1, 1).astype(np.float32)
+
+
+def write_synthetic_audio(path, seconds, sr=16000, seed=0, activity=0.4):
+    """
+    Write the synthetic exam audio as a 16-bit WAV file and return its path.
+    """
+    path = f'{path}.wav'
+    with sf.SoundFile(path, 'w', samplerate=sr, channels=1, subtype='PCM_16') as f:
+        for block in synthetic_audio_blocks(seconds, sr, seed=seed, activity=activity):
+            f.write(block)
+    return path
+
+
+# A small Darknet YOLO network (five strided convolutions and one YOLO head
+# over the 80 COCO classes). With random weights it detects nothing useful,
+# but it has the shape and cost profile of a real tiny detector.
+SYNTHETIC_YOLO_CFG = """[net]
+batch=1
+width={size}
+height={size}
+channels=3
+{layers}
+[convolutional]
+size=1
+stride=1
+pad=1
+filters=255
+activation=linear
+
+[yolo]
+mask=0,1,2
+anchors=10,14, 23,27, 37,58
+classes=80
+num=3
+"""
+
+SYNTHETIC_YOLO_LAYER = """
+[convolutional]
+batch_normalize=1
+filters={filters}
+size=3
+stride=2
+pad=1
+activation=leaky
+"""
+
+
+def write_synthetic_yolo(path, input_size=320, channels=(16, 32, 64, 128, 256), seed=0):
+    """
+    Write a random-weight Darknet YOLO model and return the (weights, cfg) paths.
+    """
+    rng = np.random.default_rng(seed)
+    cfg_path, weights_path = f'{path}.cfg', f'{path}.weights'
+    layers = ''.join(SYNTHETIC_YOLO_LAYER.format(filters=filters) for filters in channels)
+    with open(cfg_path, 'w') as f:
+        f.write(SYNTHETIC_YOLO_CFG.format(size=input_size, layers=layers))
+
+    with open(weights_path, 'wb') as f:
+        # Header: version 0.2.0 and the number of images seen
+        f.write(np.array([0, 2, 0], np.int32).tobytes() + np.array([0], np.int64).tobytes())
+        for cin, cout in zip((3,) + channels[:-1], channels):
+            # Batch norm bias, scale, mean and variance, then the kernels
+            for values in (np.zeros(cout), np.ones(cout), np.zeros(cout), np.ones(cout)):
+                f.write(values.astype(np.float32).tobytes())
+            f.write(rng.normal(0, 0.1, (cout, cin, 3, 3)).astype(np.float32).tobytes())
+        f.write(np.zeros(255, np.float32).tobytes())
+        f.write(rng.normal(0, 0.05, (255, channels[-1], 1, 1)).astype(np.float32).tobytes())
+
+    return weights_path, cfg_path
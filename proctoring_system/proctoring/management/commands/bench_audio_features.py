@@ -0,0 +1,105 @@
+import statistics
+import time
+
+import librosa
+import numpy as np
+import soxr
+from django.core.management.base import BaseCommand, CommandError
+
+from proctoring_system.utils.audio_features import AudioFeatures
+
+from ._synthetic import synthetic_audio_blocks
+
+
+def librosa_features(y, sr):
+    """
+    The historical feature stack: every librosa call computes its own spectrogram.
+    """
+    return {
+        'centroid': librosa.feature.spectral_centroid(y=y, sr=sr)[0],
+        'bandwidth': librosa.feature.spectral_bandwidth(y=y, sr=sr)[0],
+        'contrast': librosa.feature.spectral_contrast(y=y, sr=sr),
+        'mfcc': librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13),
+        'onset': librosa.onset.onset_strength(y=y, sr=sr),
+    }
+
+
+def shared_features(y, sr):
+    features = AudioFeatures(y, sr)
+    return {
+        'centroid': features.centroid,
+        'bandwidth': features.bandwidth,
+        'contrast': features.contrast,
+        'mfcc': features.mfcc(13),
+        'onset': features.onset_strength,
+    }
+
+
+def rule_features(y, sr):
+    """
+    Only the features the audio rules use.
+    """
+    features = AudioFeatures(y, sr)
+    return features.contrast, features.onset_strength
+
+
+def median_time(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+class Command(BaseCommand):
+    help = "Check the shared-STFT audio features against librosa and benchmark them per window"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rates', type=int, nargs='+', default=[16000, 44100, 48000],
+                            help="Native sample rates to test")
+        parser.add_argument('--window', type=float, default=30.0, help="Window length in seconds")
+        parser.add_argument('--analysis-rate', type=int, default=16000,
+                            help="Rate to downsample to for the last row")
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--tolerance', type=float, default=1e-4,
+                            help="Largest allowed error relative to the feature's range")
+
+    def handle(self, *args, **options):
+        window = options['window']
+        repeat = options['repeat']
+
+        self.stdout.write(f"window {window:.0f} s, median of {repeat} runs")
+        self.stdout.write(f"{'rate':>6}  {'method':<28} {'ms/window':>10} {'speedup':>8}  max rel error")
+
+        for sr in options['rates']:
+            y = np.concatenate(list(synthetic_audio_blocks(window, sr, seed=sr)))
+
+            expected = librosa_features(y, sr)
+            actual = shared_features(y, sr)
+            errors = {}
+            for name, reference in expected.items():
+                scale = np.max(np.abs(reference)) or 1.0
+                errors[name] = float(np.max(np.abs(actual[name] - reference)) / scale)
+                if errors[name] > options['tolerance']:
+                    raise CommandError(f"{name} at {sr} Hz differs from librosa by {errors[name]:.2e}")
+            worst = max(errors, key=errors.get)
+
+            analysis_rate = options['analysis_rate']
+            methods = [
+                ('librosa, 5 features', lambda: librosa_features(y, sr), ''),
+                ('shared STFT, 5 features', lambda: shared_features(y, sr), f"{errors[worst]:.1e} ({worst})"),
+                ('shared STFT, rule features', lambda: rule_features(y, sr), ''),
+            ]
+            if analysis_rate != sr:
+                methods.append((
+                    f'resample to {analysis_rate}, rules',
+                    lambda: rule_features(soxr.resample(y, sr, analysis_rate), analysis_rate),
+                    '',
+                ))
+
+            baseline = None
+            for name, fn, note in methods:
+                elapsed = median_time(fn, repeat)
+                baseline = baseline or elapsed
+                self.stdout.write(f"{sr:>6}  {name:<28} {1000 * elapsed:>10.1f} {baseline / elapsed:>7.1f}x  {note}")
@@ -0,0 +1,102 @@
+import os
+import tempfile
+import time
+import tracemalloc
+
+import librosa
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from proctoring_system.utils.audio_analysis import AUDIO_WINDOW_SECONDS, AudioGateStats, analyze_audio
+
+from ._synthetic import write_synthetic_audio
+
+
+def analyze_whole_file(audio_path):
+    """
+    The historical path: load the whole recording and compute every feature over it at once.
+    """
+    y, sr = librosa.load(audio_path, sr=None)
+    librosa.feature.spectral_centroid(y=y, sr=sr)
+    librosa.feature.spectral_bandwidth(y=y, sr=sr)
+    spec_contrast = librosa.feature.spectral_contrast(y=y, sr=sr)[0]
+    librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13)
+    onset_env = librosa.onset.onset_strength(y=y, sr=sr)
+    peaks = librosa.util.peak_pick(onset_env, pre_max=3, post_max=3, pre_avg=3, post_avg=5, delta=0.5, wait=10)
+    np.std(spec_contrast)
+    np.percentile(np.abs(y), 5)
+    return len(peaks)
+
+
+def measure(fn):
+    """
+    Run `fn` twice and return (result, seconds, peak traced allocation in bytes).
+
+    Tracing allocations slows small-array code unevenly, so the time comes
+    from an untraced run and the peak from a second, traced one.
+    """
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+class Command(BaseCommand):
+    help = "Benchmark memory and throughput of windowed audio analysis on long synthetic recordings"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lengths', type=float, nargs='+', default=[600, 3600],
+                            help="Synthetic recording lengths in seconds")
+        parser.add_argument('--activity', type=float, nargs='+', default=[0.1, 0.4, 0.8],
+                            help="Share of non-silent segments in the synthetic recordings")
+        parser.add_argument('--sample-rate', type=int, default=16000)
+        parser.add_argument('--window', type=float, default=AUDIO_WINDOW_SECONDS,
+                            help="Analysis window in seconds")
+        parser.add_argument('--whole-file-limit', type=float, default=600,
+                            help="Also run the whole-file analysis on recordings up to this many seconds")
+
+    def handle(self, *args, **options):
+        sr = options['sample_rate']
+        window = options['window']
+
+        # Compile librosa's numba kernels before anything is timed
+        analyze_audio(np.random.default_rng(0).normal(0, 0.1, 2 * sr).astype(np.float32), sr=sr)
+        self.stdout.write(f"sample rate {sr} Hz, window {window:.0f} s "
+                          f"(peak = peak Python/NumPy allocation during the analysis)")
+        self.stdout.write(f"{'length':>8} {'activity':>9}  {'method':<10} {'seconds':>8} {'x realtime':>11} "
+                          f"{'peak MiB':>9} {'skipped':>8} {'violations':>11}")
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for seconds in options['lengths']:
+                for activity in options['activity']:
+                    path = write_synthetic_audio(
+                        os.path.join(tmpdir, f'synthetic_{int(seconds)}s'), seconds, sr, activity=activity
+                    )
+                    stats = AudioGateStats()
+
+                    def gated():
+                        stats.__init__()
+                        return len(analyze_audio(path, window_seconds=window, stats=stats))
+
+                    methods = [
+                        ('ungated', lambda: len(analyze_audio(path, window_seconds=window, gate=False)), None),
+                        ('gated', gated, stats),
+                    ]
+                    if seconds <= options['whole_file_limit']:
+                        methods.append(('whole file', lambda: analyze_whole_file(path), None))
+
+                    for name, fn, method_stats in methods:
+                        result, elapsed, peak = measure(fn)
+                        violations = result if name != 'whole file' else '-'
+                        skipped = f"{100 * method_stats.skipped_fraction:.0f}%" if method_stats else '-'
+                        self.stdout.write(
+                            f"{seconds:>7.0f}s {activity:>9.1f}  {name:<10} {elapsed:>8.2f} {seconds / elapsed:>11.0f} "
+                            f"{peak / 2 ** 20:>9.1f} {skipped:>8} {violations:>11}"
+                        )
+
+                    os.unlink(path)
@@ -0,0 +1,80 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from proctoring_system.utils.change_gate import ChangeGate
+from proctoring_system.utils.eye_tracking import GazeState
+from proctoring_system.utils.frame_context import StageTimings
+from proctoring_system.utils.frame_source import FrameSource
+from proctoring_system.utils.video_analysis import observe_frames, reduce_observations
+
+from ._synthetic import synthetic_webcam_frames
+
+
+def load_frames(options, activity):
+    if options['video']:
+        with FrameSource(options['video']) as frames:
+            return [frame for _, _, frame in frames][:options['frames']]
+    return list(synthetic_webcam_frames(options['frames'], (options['width'], options['height']), activity=activity))
+
+
+def run(frames, change_gate):
+    """
+    Analyze the frames one at a time, as live frames arrive, and return
+    (seconds, per-frame violation sets, timings).
+    """
+    timings = StageTimings()
+    gaze_state = GazeState()
+    per_frame = []
+
+    start = time.perf_counter()
+    for timestamp, frame in enumerate(frames):
+        observations = observe_frames([frame], [float(timestamp)], gaze_state.reference, timings,
+                                      change_gate=change_gate)
+        violations = reduce_observations(observations, gaze_state)
+        per_frame.append({(v['type'], v['description']) for v in violations})
+    return time.perf_counter() - start, per_frame, timings
+
+
+class Command(BaseCommand):
+    help = "Analyzer time saved by the change gate on mostly static webcam frames, and agreement with no gate"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--video', help="Sample frames (1 fps) from this video instead of synthetic frames")
+        parser.add_argument('--frames', type=int, default=300)
+        parser.add_argument('--activity', type=float, nargs='+', default=[0.02, 0.1, 0.3],
+                            help="Chance per synthetic frame that something in the scene changes")
+        parser.add_argument('--width', type=int, default=640)
+        parser.add_argument('--height', type=int, default=360)
+        parser.add_argument('--mean-threshold', type=float, default=3.0)
+        parser.add_argument('--area-threshold', type=float, default=0.002)
+        parser.add_argument('--max-reuse-seconds', type=float, default=10.0)
+
+    def handle(self, *args, **options):
+        gate_options = {
+            'mean_threshold': options['mean_threshold'],
+            'area_threshold': options['area_threshold'],
+            'max_reuse_seconds': options['max_reuse_seconds'],
+        }
+
+        self.stdout.write(f"{'activity':>8} {'frames':>7}  {'method':<8} {'ms/frame':>9} {'speedup':>8} "
+                          f"{'skipped':>8} {'gate ms':>8} {'agreement':>10}")
+        for activity in ([None] if options['video'] else options['activity']):
+            frames = load_frames(options, activity)
+            if not frames:
+                raise CommandError("No frames to analyze")
+
+            baseline, expected, _ = run(frames, None)
+            gate = ChangeGate(**gate_options)
+            elapsed, actual, timings = run(frames, gate)
+
+            agreement = sum(a == e for a, e in zip(actual, expected)) / len(frames)
+            gate_ms = 1000 * timings.totals['gate'] / len(frames)
+            label = 'video' if activity is None else f"{activity:.2f}"
+            skipped = f"{100 * gate.stats.skipped_fraction:.0f}%"
+            for name, seconds, skipped, extra in [
+                ('no gate', baseline, '-', ''),
+                ('gate', elapsed, skipped, f"{gate_ms:>8.3f} {100 * agreement:>9.1f}%"),
+            ]:
+                self.stdout.write(f"{label:>8} {len(frames):>7}  {name:<8} {1000 * seconds / len(frames):>9.2f} "
+                                  f"{baseline / seconds:>7.1f}x {skipped:>8} {extra}")
@@ -0,0 +1,82 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from proctoring_system.utils.face_ratios import mouth_aspect_ratio, ratio_events
+from proctoring_system.utils.lip_movement import MAR_RELEASE_THRESHOLD, MAR_THRESHOLD, MAR_TIME_CONSTANT
+
+
+def loop_mouth_aspect_ratio(landmarks):
+    """
+    The historical per-face loop: three np.linalg.norm calls per face.
+    """
+    ratios = np.empty(landmarks.shape[:2])
+    for i, frame in enumerate(landmarks):
+        for j, face in enumerate(frame):
+            mouth_points = face[48:68]
+            v1 = np.linalg.norm(mouth_points[2] - mouth_points[10])
+            v2 = np.linalg.norm(mouth_points[4] - mouth_points[8])
+            h = np.linalg.norm(mouth_points[0] - mouth_points[6])
+            ratios[i, j] = (v1 + v2) / (2.0 * h + 1e-6)
+    return ratios
+
+
+def synthetic_landmarks(frames, faces, rng):
+    """
+    Random face shapes: a fixed 68-point template, jittered, with the mouth opening and closing.
+    """
+    template = rng.uniform(0, 100, (68, 2)).astype(np.float32)
+    template[48], template[54] = (30, 70), (70, 70)  # mouth corners
+    landmarks = np.broadcast_to(template, (frames, faces, 68, 2)).copy()
+    landmarks += rng.normal(0, 0.5, landmarks.shape).astype(np.float32)
+    opening = 20 * rng.random((frames, faces, 1))
+    landmarks[:, :, [56, 58], 1] += opening
+    landmarks[:, :, [50, 52], 1] -= opening
+    return landmarks
+
+
+def synthetic_talking(seconds, fps, rng, bursts=20):
+    """
+    Mouth aspect ratio trace with talking bursts: fluttering open and shut around the threshold.
+    """
+    t = np.arange(0, seconds, 1 / fps)
+    mar = rng.normal(0.2, 0.05, len(t))
+    for start in rng.uniform(0, seconds - 10, bursts):
+        burst = (t >= start) & (t < start + rng.uniform(2, 8))
+        mar[burst] = 0.55 + 0.25 * np.sin(2 * np.pi * 4 * t[burst]) + rng.normal(0, 0.05, burst.sum())
+    return t, mar
+
+
+class Command(BaseCommand):
+    help = "Vectorized vs looped mouth aspect ratio, and talking bursts found with smoothing and hysteresis"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--frames', type=int, default=10000)
+        parser.add_argument('--faces', type=int, default=2)
+        parser.add_argument('--seconds', type=float, default=600, help="Length of the synthetic talking trace")
+        parser.add_argument('--fps', type=float, nargs='+', default=[1, 5, 10], help="Sampling rates of the trace")
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(0)
+        landmarks = synthetic_landmarks(options['frames'], options['faces'], rng)
+
+        start = time.perf_counter()
+        expected = loop_mouth_aspect_ratio(landmarks)
+        loop_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        actual = mouth_aspect_ratio(landmarks)
+        vector_seconds = time.perf_counter() - start
+
+        error = float(np.max(np.abs(actual - expected)))
+        if error > 1e-5:
+            raise CommandError(f"Vectorized MAR differs from the loop by {error:.2e}")
+        self.stdout.write(f"MAR of {options['frames']} frames x {options['faces']} faces: "
+                          f"loop {1000 * loop_seconds:.1f} ms, vectorized {1000 * vector_seconds:.2f} ms "
+                          f"({loop_seconds / vector_seconds:.0f}x), max difference {error:.1e}")
+
+        self.stdout.write(f"\n{'fps':>5} {'frames':>7} {'frames > threshold':>19} {'bursts':>7}")
+        for fps in options['fps']:
+            t, mar = synthetic_talking(options['seconds'], fps, np.random.default_rng(1))
+            events = ratio_events(t, mar, MAR_THRESHOLD, MAR_RELEASE_THRESHOLD, MAR_TIME_CONSTANT)
+            self.stdout.write(f"{fps:>5.0f} {len(t):>7} {int(np.sum(mar > MAR_THRESHOLD)):>19} {len(events):>7}")
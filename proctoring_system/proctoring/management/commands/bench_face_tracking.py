@@ -0,0 +1,97 @@
+import time
+
+import cv2
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from proctoring_system.utils.face_tracker import FaceTracker
+from proctoring_system.utils.frame_context import FrameContext, StageTimings
+
+from .bench_resolution import iou
+
+
+def moving_frames(image, count, size, amplitude=0.1, period=40, seed=0):
+    """
+    Frames of `image` drifting around a canvas, like a candidate shifting in their seat.
+    """
+    rng = np.random.default_rng(seed)
+    width, height = size
+    scale = min(width, height) / max(image.shape[:2]) * (1 - 2 * amplitude)
+    image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    for i in range(count):
+        dx = amplitude * width * np.sin(2 * np.pi * i / period)
+        dy = amplitude * height * np.sin(2 * np.pi * i / (1.7 * period))
+        x = (width - image.shape[1]) / 2 + dx
+        y = (height - image.shape[0]) / 2 + dy
+        transform = np.float32([[1, 0, x], [0, 1, y]])
+        frame = cv2.warpAffine(image, transform, size, borderValue=(170, 180, 190))
+        yield np.clip(frame + rng.normal(0, 3, frame.shape), 0, 255).astype(np.uint8)
+
+
+def run(frames, tracker):
+    timings = StageTimings()
+    faces = []
+    start = time.perf_counter()
+    for frame in frames:
+        faces.append(FrameContext(frame, timings, face_tracker=tracker).faces)
+    return time.perf_counter() - start, faces, timings
+
+
+def agreement(expected, actual):
+    """
+    Fraction of frames with the same face count, and mean IoU of each expected face's best match.
+    """
+    same_count = np.mean([len(e) == len(a) for e, a in zip(expected, actual)])
+    overlaps = [max((iou(e, a) for a in boxes), default=0.0) for faces, boxes in zip(expected, actual) for e in faces]
+    return same_count, np.mean(overlaps) if overlaps else 1.0
+
+
+class Command(BaseCommand):
+    help = "Face cost per frame with detection on every frame vs detection every K frames and tracking"
+
+    def add_arguments(self, parser):
+        source = parser.add_mutually_exclusive_group(required=True)
+        source.add_argument('--image', help="Photo with a face, moved around the frame")
+        source.add_argument('--video', help="Read consecutive frames from this video")
+        parser.add_argument('--frames', type=int, default=120)
+        parser.add_argument('--width', type=int, default=1280)
+        parser.add_argument('--height', type=int, default=720)
+        parser.add_argument('--intervals', type=int, nargs='+', default=[2, 5, 10],
+                            help="Frames between detections")
+
+    def handle(self, *args, **options):
+        if options['image']:
+            image = cv2.imread(options['image'])
+            if image is None:
+                raise CommandError(f"Could not read image: {options['image']}")
+            frames = list(moving_frames(image, options['frames'], (options['width'], options['height'])))
+        else:
+            cap = cv2.VideoCapture(options['video'])
+            frames = []
+            while len(frames) < options['frames']:
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                frames.append(frame)
+            cap.release()
+        if not frames:
+            raise CommandError("No frames to analyze")
+
+        # Load the cascade before timing
+        FrameContext(frames[0]).faces
+
+        baseline, expected, _ = run(frames, None)
+        self.stdout.write(f"{len(frames)} frames of {frames[0].shape[1]}x{frames[0].shape[0]}")
+        self.stdout.write(f"{'mode':<16} {'ms/frame':>9} {'speedup':>8} {'detected':>9} "
+                          f"{'same count':>11} {'mean IoU':>9}")
+        self.stdout.write(f"{'detect always':<16} {1000 * baseline / len(frames):>9.2f} {1.0:>7.1f}x "
+                          f"{100:>8}% {100:>10}% {1.0:>9.2f}")
+
+        for interval in options['intervals']:
+            tracker = FaceTracker(detect_interval=interval)
+            elapsed, actual, timings = run(frames, tracker)
+            same_count, mean_iou = agreement(expected, actual)
+            self.stdout.write(
+                f"{f'track, K={interval}':<16} {1000 * elapsed / len(frames):>9.2f} {baseline / elapsed:>7.1f}x "
+                f"{100 * tracker.detection_fraction:>8.0f}% {100 * same_count:>10.0f}% {mean_iou:>9.2f}"
+            )
@@ -0,0 +1,93 @@
+import base64
+import time
+
+import cv2
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from proctoring.authentication import make_stream_token
+from proctoring.models import ExamSession
+from proctoring.session_state import session_owners, stream_states
+
+from ._synthetic import draw_synthetic_frame
+
+PASSWORD = 'bench-frame-auth'
+
+
+def basic_client(user):
+    credentials = base64.b64encode(f"{user.username}:{PASSWORD}".encode()).decode()
+    return APIClient(HTTP_HOST='localhost', HTTP_AUTHORIZATION=f'Basic {credentials}')
+
+
+def session_client(user):
+    client = APIClient(HTTP_HOST='localhost')
+    client.force_login(user)
+    return client
+
+
+def token_client(user, session):
+    return APIClient(HTTP_HOST='localhost', HTTP_AUTHORIZATION=f'Stream {make_stream_token(session)}')
+
+
+class Command(BaseCommand):
+    help = "Requests per second at analyze-frame with Basic, session and stream token auth, with and without the session cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help="Requests per configuration")
+        parser.add_argument('--width', type=int, default=64, help="Frame width; small so auth overhead shows")
+        parser.add_argument('--height', type=int, default=48)
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username='bench-frame-auth').first()
+        if user is None:
+            user = User.objects.create_user('bench-frame-auth', password=PASSWORD)
+        session = ExamSession.objects.create(user=user)
+
+        frame = draw_synthetic_frame(np.zeros((options['height'], options['width'], 3), np.uint8), 0)
+        jpeg = cv2.imencode('.jpg', frame)[1].tobytes()
+        url = f"{reverse('analyze-frame')}?session_id={session.id}&timestamp=0"
+
+        configurations = [
+            ('basic', basic_client(user), False),
+            ('basic', basic_client(user), True),
+            ('session', session_client(user), False),
+            ('session', session_client(user), True),
+            ('token', token_client(user, session), False),
+            ('token', token_client(user, session), True),
+        ]
+        ttl = session_owners.ttl
+
+        self.stdout.write(f"{options['width']}x{options['height']} frames, {options['requests']} requests each")
+        self.stdout.write(f"{'auth':<8} {'cache':<6} {'req/s':>8} {'ms/req':>8} {'queries/req':>12}")
+        try:
+            with override_settings(PROCTORING_SCREENSHOTS=False):
+                for name, client, cached in configurations:
+                    session_owners.clear()
+                    session_owners.ttl = ttl if cached else 0
+                    # Warm up: first frame builds the stream state and loads the cascade
+                    response = client.post(url, jpeg, content_type='image/jpeg')
+                    if response.status_code != 200:
+                        self.stderr.write(f"{name}: HTTP {response.status_code} {response.content[:200]!r}")
+                        continue
+
+                    with CaptureQueriesContext(connection) as queries:
+                        start = time.perf_counter()
+                        for _ in range(options['requests']):
+                            client.post(url, jpeg, content_type='image/jpeg')
+                        elapsed = time.perf_counter() - start
+
+                    self.stdout.write(
+                        f"{name:<8} {'yes' if cached else 'no':<6} {options['requests'] / elapsed:>8.1f} "
+                        f"{1000 * elapsed / options['requests']:>8.2f} {len(queries) / options['requests']:>12.1f}"
+                    )
+        finally:
+            session_owners.ttl = ttl
+            session_owners.clear()
+            stream_states.discard(session.id)
+            session.delete()
+            user.delete()
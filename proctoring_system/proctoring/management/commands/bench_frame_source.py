@@ -0,0 +1,85 @@
+import os
+import tempfile
+import time
+
+import cv2
+from django.core.management.base import BaseCommand
+
+from proctoring_system.utils.frame_source import FrameSource, make_sampler
+
+from ._synthetic import OPENCV_FORMATS, av, write_synthetic_video
+
+
+def seek_loop(video_path):
+    """
+    The historical sampling loop: seek before every sampled frame.
+    """
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    sampled = 0
+
+    for frame_idx in range(0, frame_count, int(fps)):
+        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+        ret, frame = cap.read()
+        if not ret:
+            break
+        sampled += 1
+
+    cap.release()
+    return sampled
+
+
+def sequential_loop(video_path, policy, options):
+    sampler = make_sampler(policy, **options)
+    with FrameSource(video_path, sampler=sampler) as frames:
+        return sum(1 for _ in frames)
+
+
+class Command(BaseCommand):
+    help = "Benchmark sequential frame sampling against the per-second seek loop"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lengths', type=float, nargs='+', default=[10, 60, 300],
+                            help="Synthetic video lengths in seconds")
+        parser.add_argument('--fps', type=int, default=30)
+        parser.add_argument('--width', type=int, default=640)
+        parser.add_argument('--height', type=int, default=360)
+        parser.add_argument('--format', choices=['h264'] + sorted(OPENCV_FORMATS),
+                            default='h264' if av is not None else 'mp4v')
+        parser.add_argument('--gop', type=int, default=250,
+                            help="Key frame interval for the 'h264' format")
+
+    def handle(self, *args, **options):
+        policies = [
+            ('seek (baseline)', None, None),
+            ('fixed 1 fps', 'fixed', {'rate': 1.0}),
+            ('keyframe', 'keyframe', {}),
+            ('adaptive', 'adaptive', {}),
+        ]
+        size = (options['width'], options['height'])
+
+        self.stdout.write(f"format={options['format']} gop={options['gop']} size={size[0]}x{size[1]}")
+        self.stdout.write(f"{'length':>8}  {'method':<16} {'frames':>7} {'seconds':>9} {'speedup':>8}")
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for seconds in options['lengths']:
+                path = write_synthetic_video(
+                    os.path.join(tmpdir, f'synthetic_{int(seconds)}s'), seconds,
+                    options['fps'], size, options['format'], options['gop'],
+                )
+
+                baseline = None
+                for name, policy, policy_options in policies:
+                    start = time.perf_counter()
+                    if policy is None:
+                        sampled = seek_loop(path)
+                    else:
+                        sampled = sequential_loop(path, policy, policy_options)
+                    elapsed = time.perf_counter() - start
+
+                    if baseline is None:
+                        baseline = elapsed
+                    self.stdout.write(
+                        f"{seconds:>7.0f}s  {name:<16} {sampled:>7} {elapsed:>9.3f} {baseline / elapsed:>7.2f}x"
+                    )
@@ -0,0 +1,68 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from proctoring_system.utils.eye_tracking import observe_gaze
+from proctoring_system.utils.frame_context import FrameContext, StageTimings
+from proctoring_system.utils.frame_source import FrameSource
+from proctoring_system.utils.lip_movement import analyze_lip_movements
+from proctoring_system.utils.object_detection import detect_objects
+from proctoring_system.utils.video_analysis import analyze_frame_violations
+
+from ._synthetic import draw_synthetic_frame
+
+
+def load_frames(options):
+    if options['video']:
+        with FrameSource(options['video']) as frames:
+            return [frame for _, _, frame in frames][:options['frames']]
+
+    frame = np.zeros((options['height'], options['width'], 3), np.uint8)
+    return [draw_synthetic_frame(frame, i).copy() for i in range(options['frames'])]
+
+
+def analyze_separately(frame, timings):
+    """
+    Every analyzer builds its own context, as when each one did its own
+    grayscale conversion and face detection.
+    """
+    with timings.stage('eye'):
+        observe_gaze(frame, context=FrameContext(frame, timings))
+    with timings.stage('lip'):
+        analyze_lip_movements(frame, context=FrameContext(frame, timings))
+    with timings.stage('object'):
+        detect_objects(frame, context=FrameContext(frame, timings))
+
+
+def analyze_shared(frame, timings):
+    analyze_frame_violations(frame, 0, timings)
+
+
+class Command(BaseCommand):
+    help = "Per-stage timing of the frame analyzers with separate and shared frame contexts"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--video', help="Sample frames (1 fps) from this video instead of synthetic frames")
+        parser.add_argument('--frames', type=int, default=100)
+        parser.add_argument('--width', type=int, default=640)
+        parser.add_argument('--height', type=int, default=360)
+
+    def handle(self, *args, **options):
+        frames = load_frames(options)
+        if not frames:
+            raise CommandError("No frames to analyze")
+
+        for name, analyze in [('separate', analyze_separately), ('shared', analyze_shared)]:
+            timings = StageTimings()
+            start = time.perf_counter()
+            for frame in frames:
+                analyze(frame, timings)
+            elapsed = time.perf_counter() - start
+
+            self.stdout.write(f"\n{name}: {1000 * elapsed / len(frames):.2f} ms/frame over {len(frames)} frames")
+            self.stdout.write(f"  {'stage':<10} {'calls':>7} {'ms/frame':>9}")
+            for stage, stats in sorted(timings.report().items()):
+                self.stdout.write(
+                    f"  {stage:<10} {stats['count']:>7} {1000 * stats['seconds'] / len(frames):>9.3f}"
+                )
@@ -0,0 +1,107 @@
+import base64
+import json
+import statistics
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from rest_framework.request import Request
+
+from proctoring.views import decode_frame, read_frame_request
+
+from ._synthetic import draw_synthetic_frame
+
+URL = '/api/proctoring/analyze-frame'
+
+
+def build_requests(jpeg):
+    """
+    One request factory per upload format, all carrying the same JPEG frame.
+    """
+    factory = RequestFactory()
+    data_url = 'data:image/jpeg;base64,' + base64.b64encode(jpeg).decode()
+    json_body = json.dumps({"session_id": 1, "timestamp": 1.5, "frame": data_url})
+
+    multipart_body = encode_multipart(BOUNDARY, {
+        'session_id': '1',
+        'timestamp': '1.5',
+        'frame': SimpleUploadedFile('frame.jpg', jpeg, 'image/jpeg'),
+    })
+
+    return [
+        ('json', len(json_body), lambda: factory.post(URL, json_body, content_type='application/json')),
+        ('multipart', len(multipart_body),
+         lambda: factory.post(URL, multipart_body, content_type=f'{MULTIPART_CONTENT}; boundary={BOUNDARY}')),
+        ('raw', len(jpeg),
+         lambda: factory.post(f'{URL}?session_id=1&timestamp=1.5', jpeg, content_type='image/jpeg')),
+    ]
+
+
+def parse_upload(django_request):
+    """
+    The server-side work that differs between formats: get the encoded frame out of the body.
+    """
+    request = Request(django_request, parsers=[JSONParser(), FormParser(), MultiPartParser()])
+    return read_frame_request(request)[2]
+
+
+class Command(BaseCommand):
+    help = "Compare per-frame server overhead of base64 JSON, multipart and raw frame uploads"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--frames', type=int, default=300)
+        parser.add_argument('--image', help="Upload this image instead of a synthetic frame")
+        parser.add_argument('--width', type=int, default=1280)
+        parser.add_argument('--height', type=int, default=720)
+        parser.add_argument('--quality', type=int, default=85, help="JPEG quality")
+
+    def handle(self, *args, **options):
+        if options['image']:
+            image = cv2.imread(options['image'])
+            if image is None:
+                raise CommandError(f"Could not read image: {options['image']}")
+        else:
+            image = draw_synthetic_frame(np.zeros((options['height'], options['width'], 3), np.uint8), 0)
+            # Sensor-like noise, so the JPEG is as large as a real webcam frame
+            noise = np.random.default_rng(0).normal(0, 12, image.shape)
+            image = np.clip(image + noise, 0, 255).astype(np.uint8)
+
+        jpeg = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, options['quality']])[1].tobytes()
+        decoded = decode_frame(jpeg)
+
+        self.stdout.write(f"frame {image.shape[1]}x{image.shape[0]}, JPEG {len(jpeg)} bytes, {options['frames']} frames")
+        self.stdout.write(f"{'format':<10} {'body bytes':>11} {'parse us':>9} {'decode us':>10} "
+                          f"{'total us':>9} {'parse alloc KiB':>16}")
+
+        for name, body_size, make_request in build_requests(jpeg):
+            if not np.array_equal(decode_frame(parse_upload(make_request())), decoded):
+                raise CommandError(f"{name} upload decoded to a different frame")
+
+            parse_times = []
+            decode_times = []
+            for _ in range(options['frames']):
+                django_request = make_request()
+                start = time.perf_counter()
+                frame_buffer = parse_upload(django_request)
+                parsed = time.perf_counter()
+                decode_frame(frame_buffer)
+                parse_times.append(parsed - start)
+                decode_times.append(time.perf_counter() - parsed)
+            parse_median = statistics.median(parse_times)
+            decode_median = statistics.median(decode_times)
+
+            # Peak Python allocations while getting the encoded frame out of one request
+            django_request = make_request()
+            tracemalloc.start()
+            parse_upload(django_request)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            self.stdout.write(f"{name:<10} {body_size:>11} {1e6 * parse_median:>9.0f} {1e6 * decode_median:>10.0f} "
+                              f"{1e6 * (parse_median + decode_median):>9.0f} {peak / 1024:>16.0f}")
@@ -0,0 +1,82 @@
+import os
+import tempfile
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from proctoring_system.utils import model_registry
+from proctoring_system.utils.object_detection import detect_objects_batch, make_backend
+
+from ._synthetic import draw_synthetic_frame, write_synthetic_yolo
+
+
+def frames_per_second(backend, frames, batch_size, repeat):
+    """
+    Best throughput over `repeat` passes, feeding the frames `batch_size` at a time.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for i in range(0, len(frames), batch_size):
+            detect_objects_batch(frames[i:i + batch_size], backend=backend)
+        best = min(best, time.perf_counter() - start)
+    return len(frames) / best
+
+
+class Command(BaseCommand):
+    help = "Object detection throughput (frames per second) by backend and batch size"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', help="YOLO model to benchmark (ONNX, or Darknet weights with --config); "
+                                            "a random-weight tiny Darknet YOLO is generated if omitted")
+        parser.add_argument('--config', default='', help="Darknet .cfg of --model")
+        parser.add_argument('--engine', choices=['opencv', 'onnxruntime'], default='opencv')
+        parser.add_argument('--input-size', type=int, default=320, help="Network input size in pixels")
+        parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+        parser.add_argument('--frames', type=int, default=64)
+        parser.add_argument('--width', type=int, default=640)
+        parser.add_argument('--height', type=int, default=360)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        frame = np.zeros((options['height'], options['width'], 3), np.uint8)
+        frames = [draw_synthetic_frame(frame, i).copy() for i in range(options['frames'])]
+        repeat = options['repeat']
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            if options['model']:
+                model_registry.OBJECT_MODEL_PATH = options['model']
+                model_registry.OBJECT_MODEL_CONFIG = options['config']
+                model_name = os.path.basename(options['model'])
+            else:
+                weights, cfg = write_synthetic_yolo(os.path.join(tmpdir, 'yolo'), options['input_size'])
+                model_registry.OBJECT_MODEL_PATH, model_registry.OBJECT_MODEL_CONFIG = weights, cfg
+                model_name = 'synthetic tiny YOLO'
+
+            registry_name = 'object_detector_ort' if options['engine'] == 'onnxruntime' else 'object_detector'
+            try:
+                model_registry.registry.preload([registry_name])
+            except Exception as e:
+                raise CommandError(f"Could not load {model_name}: {e}")
+            load_seconds = model_registry.registry.stats()[registry_name]['load_seconds']
+
+            self.stdout.write(f"{len(frames)} frames of {options['width']}x{options['height']}, best of {repeat}; "
+                              f"{model_name} loaded once in {1000 * load_seconds:.0f} ms")
+            self.stdout.write(f"{'backend':<22} {'batch':>5} {'fps':>8} {'ms/frame':>9} {'vs batch 1':>11}")
+
+            contour = make_backend('contour')
+            fps = frames_per_second(contour, frames, 1, repeat)
+            self.stdout.write(f"{'contour':<22} {1:>5} {fps:>8.1f} {1000 / fps:>9.2f} {'':>11}")
+
+            baseline = None
+            for batch_size in options['batch_sizes']:
+                backend = make_backend('dnn', batch_size=batch_size, input_size=options['input_size'],
+                                       engine=options['engine'])
+                # The first pass at a new batch shape allocates the network's buffers
+                detect_objects_batch(frames[:batch_size], backend=backend)
+                fps = frames_per_second(backend, frames, batch_size, repeat)
+                baseline = baseline or fps
+                name = f"dnn ({options['engine']})"
+                self.stdout.write(f"{name:<22} {backend.batch_size:>5} {fps:>8.1f} {1000 / fps:>9.2f} "
+                                  f"{fps / baseline:>10.2f}x")
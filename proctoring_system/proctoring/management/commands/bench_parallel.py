@@ -0,0 +1,62 @@
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from proctoring_system.utils.change_gate import ChangeGateStats
+from proctoring_system.utils.video_analysis import analyze_video_file
+
+from ._synthetic import OPENCV_FORMATS, av, write_synthetic_video
+
+
+class Command(BaseCommand):
+    help = "Benchmark chunked video analysis with 1 to N worker processes, with the production PROCTORING_* settings"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=600, help="Synthetic video length")
+        parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--chunk-seconds', type=float, default=60)
+        parser.add_argument('--format', choices=['h264'] + sorted(OPENCV_FORMATS),
+                            default='h264' if av is not None else 'mp4v')
+        parser.add_argument('--video', help="Analyze this file instead of a synthetic video")
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = options['video'] or write_synthetic_video(
+                os.path.join(tmpdir, 'synthetic'), options['seconds'], video_format=options['format'],
+            )
+
+            self.stdout.write(f"{'workers':>7} {'seconds':>9} {'speedup':>8} {'violations':>11} {'analyzed':>9}")
+
+            baseline = None
+            serial_result = None
+            for workers in range(1, options['max_workers'] + 1):
+                gate_stats = ChangeGateStats()
+                start = time.perf_counter()
+                violations = analyze_video_file(
+                    path,
+                    workers=workers,
+                    chunk_seconds=options['chunk_seconds'],
+                    policy=settings.PROCTORING_SAMPLE_POLICY,
+                    sample_options=settings.PROCTORING_SAMPLE_OPTIONS,
+                    detector=settings.PROCTORING_OBJECT_DETECTOR,
+                    detector_options=settings.PROCTORING_OBJECT_DETECTOR_OPTIONS,
+                    gate_options=settings.PROCTORING_CHANGE_GATE,
+                    gate_stats=gate_stats,
+                    tracker_options=settings.PROCTORING_FACE_TRACKER,
+                    enrollment_seconds=settings.PROCTORING_ENROLLMENT_SECONDS,
+                    working_size=settings.PROCTORING_WORKING_SIZE,
+                )
+                elapsed = time.perf_counter() - start
+
+                result = (violations, gate_stats.analyzed)
+                if baseline is None:
+                    baseline = elapsed
+                    serial_result = result
+                elif result != serial_result:
+                    raise CommandError(f"Results with {workers} workers differ from the serial path")
+
+                self.stdout.write(f"{workers:>7} {elapsed:>9.3f} {baseline / elapsed:>7.2f}x {len(violations):>11} "
+                                  f"{gate_stats.analyzed:>9}")
@@ -0,0 +1,112 @@
+import time
+
+import cv2
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from proctoring_system.utils.eye_tracking import observe_gaze
+from proctoring_system.utils.frame_context import FrameContext, StageTimings
+from proctoring_system.utils.frame_source import FrameSource
+from proctoring_system.utils.lip_movement import analyze_lip_movements
+from proctoring_system.utils.object_detection import detect_objects
+
+from ._synthetic import synthetic_webcam_frames
+
+
+def load_frames(options, height):
+    """
+    The benchmark frames scaled to `height` pixels, keeping their aspect ratio.
+    """
+    if options['image']:
+        image = cv2.imread(options['image'])
+        if image is None:
+            raise CommandError(f"Could not read image: {options['image']}")
+        sources = [image]
+    elif options['video']:
+        with FrameSource(options['video']) as frames:
+            sources = [frame for _, _, frame in frames][:options['frames']]
+    else:
+        width = round(height * 16 / 9)
+        return list(synthetic_webcam_frames(options['frames'], (width, height), activity=0.3))
+
+    frames = []
+    for source in sources:
+        scale = height / source.shape[0]
+        size = (round(source.shape[1] * scale), height)
+        frames.append(cv2.resize(source, size, interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC))
+    return frames
+
+
+def analyze(frame, timings, working_size):
+    context = FrameContext(frame, timings, working_size=working_size)
+    with timings.stage('eye'):
+        observe_gaze(frame, context=context)
+    with timings.stage('lip'):
+        analyze_lip_movements(frame, context=context)
+    with timings.stage('object'):
+        objects = detect_objects(frame, context=context)
+    return context.faces, sorted(violation['description'] for violation in objects)
+
+
+def iou(a, b):
+    x0, y0 = np.maximum(a[:2], b[:2])
+    x1, y1 = np.minimum(a[:2] + a[2:], b[:2] + b[2:])
+    inter = max(0, x1 - x0) * max(0, y1 - y0)
+    return inter / (a[2] * a[3] + b[2] * b[3] - inter)
+
+
+def matched_faces(expected, actual, threshold=0.5):
+    """
+    Number of expected face boxes with an actual box overlapping at IoU >= threshold.
+    """
+    return sum(any(iou(e, a) >= threshold for a in actual) for e in expected)
+
+
+class Command(BaseCommand):
+    help = "Latency and detection agreement of full-resolution vs working-resolution frame analysis"
+
+    def add_arguments(self, parser):
+        source = parser.add_mutually_exclusive_group()
+        source.add_argument('--image', help="Photo with faces, scaled to each resolution")
+        source.add_argument('--video', help="Sample frames (1 fps) from this video")
+        parser.add_argument('--frames', type=int, default=30, help="Synthetic or video frames per resolution")
+        parser.add_argument('--heights', type=int, nargs='+', default=[360, 720, 1080])
+        parser.add_argument('--working-size', type=int, default=settings.PROCTORING_WORKING_SIZE or 640)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        working_size = options['working_size']
+        self.stdout.write(f"working size {working_size} px; faces match at IoU >= 0.5; kept = full-resolution "
+                          f"faces also found, new = faces full resolution did not find")
+        self.stdout.write(f"{'height':>6}  {'mode':<8} {'ms/frame':>9} {'speedup':>8} {'faces':>6} "
+                          f"{'kept':>6} {'new':>4} {'object agreement':>17}")
+
+        for height in options['heights']:
+            frames = load_frames(options, height)
+            if not frames:
+                raise CommandError("No frames to analyze")
+
+            results = {}
+            for mode, size in [('full', None), ('working', working_size)]:
+                best = float('inf')
+                for _ in range(repeat):
+                    timings = StageTimings()
+                    start = time.perf_counter()
+                    outputs = [analyze(frame, timings, size) for frame in frames]
+                    best = min(best, time.perf_counter() - start)
+                results[mode] = (best, outputs)
+
+            baseline, full = results['full']
+            for mode, (elapsed, outputs) in results.items():
+                faces = sum(len(f) for f, _ in outputs)
+                full_faces = sum(len(e) for e, _ in full)
+                kept = sum(matched_faces(e, a) for (e, _), (a, _) in zip(full, outputs))
+                new = faces - sum(matched_faces(a, e) for (e, _), (a, _) in zip(full, outputs))
+                kept = f"{100 * kept / full_faces:.0f}%" if full_faces else '-'
+                object_agreement = sum(e == a for (_, e), (_, a) in zip(full, outputs)) / len(frames)
+                self.stdout.write(
+                    f"{height:>6}  {mode:<8} {1000 * elapsed / len(frames):>9.2f} {baseline / elapsed:>7.1f}x "
+                    f"{faces:>6} {kept:>6} {new:>4} {100 * object_agreement:>16.0f}%"
+                )
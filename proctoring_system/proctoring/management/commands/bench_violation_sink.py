@@ -0,0 +1,53 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from proctoring.models import ExamSession, ViolationRecord
+from proctoring.sinks import ViolationSink
+
+
+def save_per_row(session, rows):
+    """
+    The historical write path: one save() per violation.
+    """
+    for i in range(rows):
+        vr = ViolationRecord(
+            session=session,
+            violation_type='eye',
+            timestamp=float(i),
+            description="Benchmark violation",
+            confidence=0.5
+        )
+        vr.save()
+
+
+def write_through_sink(session, rows):
+    with ViolationSink(session) as sink:
+        for i in range(rows):
+            sink.add('eye', float(i), "Benchmark violation", 0.5)
+
+
+class Command(BaseCommand):
+    help = "Benchmark ViolationRecord rows per second with per-row save() and the batched sink"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[100, 1000, 5000])
+
+    def handle(self, *args, **options):
+        user, _ = User.objects.get_or_create(username='bench-violation-sink')
+        session = ExamSession.objects.create(user=user)
+
+        self.stdout.write(f"{'rows':>6}  {'method':<10} {'seconds':>9} {'rows/s':>10}")
+        try:
+            for rows in options['rows']:
+                for name, write in [('save()', save_per_row), ('sink', write_through_sink)]:
+                    start = time.perf_counter()
+                    write(session, rows)
+                    elapsed = time.perf_counter() - start
+
+                    self.stdout.write(f"{rows:>6}  {name:<10} {elapsed:>9.3f} {rows / elapsed:>10.0f}")
+                    session.violations.all().delete()
+        finally:
+            session.delete()
+            user.delete()
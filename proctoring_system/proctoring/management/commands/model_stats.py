@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from proctoring_system.utils.model_registry import registry
+
+
+class Command(BaseCommand):
+    help = "Load the shared analysis models and report load time and memory"
+
+    def add_arguments(self, parser):
+        parser.add_argument('models', nargs='*', help="Model names (default: all registered models)")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'model':<20} {'seconds':>9} {'memory (MB)':>12}")
+
+        for name in options['models'] or registry.names():
+            try:
+                registry.get(name)
+            except Exception as e:
+                self.stdout.write(f"{name:<20} failed to load: {e}")
+                continue
+
+            stats = registry.stats()[name]
+            memory = stats['rss_bytes']
+            memory = f"{memory / 2**20:>12.1f}" if memory is not None else f"{'n/a':>12}"
+            self.stdout.write(f"{name:<20} {stats['load_seconds']:>9.3f} {memory}")
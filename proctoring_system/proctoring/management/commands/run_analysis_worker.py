@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from proctoring.jobs import run_worker
+
+
+class Command(BaseCommand):
+    help = "Run queued video analysis jobs from the database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help="Seconds to wait between polls when the queue is empty")
+        parser.add_argument('--once', action='store_true',
+                            help="Exit once the queue is empty instead of polling")
+
+    def handle(self, *args, **options):
+        jobs_run = run_worker(poll_interval=options['poll_interval'], once=options['once'])
+        self.stdout.write(f"Ran {jobs_run} analysis job(s)")
@@ -0,0 +1,90 @@
+import statistics
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections, connection
+
+from proctoring.models import ExamSession
+from proctoring.sinks import ViolationSink, get_violation_summary
+
+
+def write_frames(session, seconds, results):
+    """
+    Write violations the way live frames do until `seconds` have passed: one
+    small transaction per frame (the violation and its summary row), then a
+    read of the session total.
+    """
+    latencies = []
+    errors = 0
+    timestamp = 0.0
+    deadline = time.perf_counter() + seconds
+
+    try:
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                with ViolationSink(session) as sink:
+                    sink.add('eye', timestamp, "Stress test violation", 0.5)
+                get_violation_summary(session.id)
+            except OperationalError as e:
+                errors += 1
+                if errors == 1:
+                    print(f"Error in stress writer: {str(e)}")
+                continue
+            latencies.append(time.perf_counter() - start)
+            timestamp += 1.0
+    finally:
+        close_old_connections()
+        connection.close()
+
+    results.append((latencies, errors))
+
+
+class Command(BaseCommand):
+    help = ("Concurrent violation writers against the configured database. Compare SQLite (tuned, or stock with "
+            "PROCTORING_SQLITE_TUNING=0) with PostgreSQL (PROCTORING_DB_ENGINE=postgres)")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, nargs='+', default=[1, 4, 16], help="Concurrent writer threads")
+        parser.add_argument('--seconds', type=float, default=5.0, help="Duration of each run")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"engine: {connection.vendor}")
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                journal_mode = cursor.execute('PRAGMA journal_mode').fetchone()[0]
+                synchronous = cursor.execute('PRAGMA synchronous').fetchone()[0]
+            self.stdout.write(f"journal_mode={journal_mode} synchronous={synchronous} "
+                              f"transaction_mode={connection.transaction_mode}")
+
+        user, _ = User.objects.get_or_create(username='stress-db-writes')
+        self.stdout.write(f"\n{'writers':>7} {'writes/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'errors':>7}")
+        try:
+            for writers in options['writers']:
+                sessions = [ExamSession.objects.create(user=user) for _ in range(writers)]
+                results = []
+                threads = [
+                    threading.Thread(target=write_frames, args=(session, options['seconds'], results))
+                    for session in sessions
+                ]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+
+                latencies = sorted(latency for run, _ in results for latency in run)
+                errors = sum(run_errors for _, run_errors in results)
+                if latencies:
+                    p95 = latencies[int(0.95 * (len(latencies) - 1))]
+                    self.stdout.write(
+                        f"{writers:>7} {len(latencies) / options['seconds']:>9.0f} "
+                        f"{1000 * statistics.median(latencies):>8.2f} {1000 * p95:>8.2f} "
+                        f"{1000 * latencies[-1]:>8.1f} {errors:>7}"
+                    )
+                else:
+                    self.stdout.write(f"{writers:>7} {0:>9} {'-':>8} {'-':>8} {'-':>8} {errors:>7}")
+                ExamSession.objects.filter(id__in=[session.id for session in sessions]).delete()
+        finally:
+            user.delete()
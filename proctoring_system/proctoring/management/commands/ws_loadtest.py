@@ -0,0 +1,139 @@
+import asyncio
+import json
+import statistics
+import struct
+import time
+from importlib import import_module
+
+import cv2
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from proctoring.models import ExamSession
+
+from ._synthetic import draw_synthetic_frame
+
+try:
+    import websockets
+except ImportError:
+    websockets = None
+
+HEADER = struct.Struct('<Bd')
+KIND_FRAME = 1
+
+
+def login_session(user):
+    """
+    Create a Django session logged in as `user` and return its key.
+    """
+    store = import_module(settings.SESSION_ENGINE).SessionStore()
+    store[SESSION_KEY] = str(user.pk)
+    store[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+    store[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    store.create()
+    return store.session_key
+
+
+async def run_connection(url, session_key, frames, fps, duration):
+    """
+    Stream frames at `fps` for `duration` seconds and time every result.
+    """
+    sent_at = {}
+    latencies = []
+    stats = {"sent": 0, "analyzed": 0, "dropped": 0}
+    headers = {'Cookie': f'{settings.SESSION_COOKIE_NAME}={session_key}'}
+
+    async with websockets.connect(url, additional_headers=headers, max_size=None) as ws:
+        start = time.perf_counter()
+
+        async def sender():
+            i = 0
+            while time.perf_counter() - start < duration:
+                timestamp = time.perf_counter() - start
+                sent_at[timestamp] = time.perf_counter()
+                await ws.send(HEADER.pack(KIND_FRAME, timestamp) + frames[i % len(frames)])
+                stats["sent"] += 1
+                i += 1
+                await asyncio.sleep(max(0.0, start + i / fps - time.perf_counter()))
+
+        async def receiver():
+            async for message in ws:
+                result = json.loads(message)
+                if result.get('kind') == 'frame':
+                    latencies.append(time.perf_counter() - sent_at[result['timestamp']])
+                    stats["analyzed"] += 1
+                    stats["dropped"] = result['dropped_frames']
+
+        receiving = asyncio.create_task(receiver())
+        await sender()
+        # Give the server a moment to answer the last frame
+        await asyncio.sleep(1.0)
+        receiving.cancel()
+        elapsed = time.perf_counter() - start
+
+    stats["fps"] = stats["analyzed"] / elapsed
+    stats["latencies"] = latencies
+    return stats
+
+
+class Command(BaseCommand):
+    help = "Load-test the live proctoring WebSocket: analyzed frames per second and end-to-end latency"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='ws://127.0.0.1:8000', help="Base URL of the ASGI server")
+        parser.add_argument('--connections', type=int, default=4)
+        parser.add_argument('--fps', type=float, default=10, help="Frames sent per second per connection")
+        parser.add_argument('--duration', type=float, default=20, help="Seconds to stream")
+        parser.add_argument('--image', help="Send this image instead of synthetic frames")
+        parser.add_argument('--width', type=int, default=640)
+        parser.add_argument('--height', type=int, default=360)
+        parser.add_argument('--username', default='ws-loadtest')
+
+    def handle(self, *args, **options):
+        if websockets is None:
+            raise CommandError("The load test needs the websockets package (pip install websockets)")
+
+        if options['image']:
+            image = cv2.imread(options['image'])
+            if image is None:
+                raise CommandError(f"Could not read image: {options['image']}")
+            images = [image]
+        else:
+            frame = np.zeros((options['height'], options['width'], 3), np.uint8)
+            images = [draw_synthetic_frame(frame, i).copy() for i in range(30)]
+        frames = [cv2.imencode('.jpg', image)[1].tobytes() for image in images]
+
+        user, _ = User.objects.get_or_create(username=options['username'])
+        session_key = login_session(user)
+        targets = [
+            f"{options['url'].rstrip('/')}/ws/proctoring/{ExamSession.objects.create(user=user).id}/"
+            for _ in range(options['connections'])
+        ]
+
+        async def run_all():
+            return await asyncio.gather(*[
+                run_connection(url, session_key, frames, options['fps'], options['duration'])
+                for url in targets
+            ])
+
+        results = asyncio.run(run_all())
+
+        self.stdout.write(f"{'conn':>4} {'sent':>6} {'analyzed':>9} {'dropped':>8} {'fps':>7} "
+                          f"{'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+        all_latencies = []
+        for i, stats in enumerate(results):
+            latencies = sorted(stats['latencies']) or [float('nan')]
+            all_latencies.extend(stats['latencies'])
+            self.stdout.write(
+                f"{i:>4} {stats['sent']:>6} {stats['analyzed']:>9} {stats['dropped']:>8} {stats['fps']:>7.2f} "
+                f"{1000 * statistics.median(latencies):>8.1f} "
+                f"{1000 * latencies[int(0.95 * (len(latencies) - 1))]:>8.1f} {1000 * latencies[-1]:>8.1f}"
+            )
+
+        total_fps = sum(stats['fps'] for stats in results)
+        self.stdout.write(f"total analyzed fps: {total_fps:.2f}")
+        if all_latencies:
+            self.stdout.write(f"overall median latency: {1000 * statistics.median(all_latencies):.1f} ms")
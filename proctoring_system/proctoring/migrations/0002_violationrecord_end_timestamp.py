@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('proctoring', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='violationrecord',
+            name='end_timestamp',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Q
+
+VIOLATION_TYPES = ['eye', 'audio', 'object', 'lip', 'other']
+
+
+def build_summaries(apps, schema_editor):
+    ViolationRecord = apps.get_model('proctoring', 'ViolationRecord')
+    SessionViolationSummary = apps.get_model('proctoring', 'SessionViolationSummary')
+
+    counts = {f'{violation_type}_count': Count('id', filter=Q(violation_type=violation_type))
+              for violation_type in VIOLATION_TYPES}
+    rows = ViolationRecord.objects.values('session_id').annotate(
+        total=Count('id'), first_timestamp=Min('timestamp'), last_timestamp=Max('timestamp'), **counts
+    ).order_by()
+    SessionViolationSummary.objects.bulk_create(
+        [SessionViolationSummary(**row) for row in rows.iterator()], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('proctoring', '0003_analysisjob_frame_counts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SessionViolationSummary',
+            fields=[
+                ('session', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='violation_summary', serialize=False, to='proctoring.examsession')),
+                ('total', models.IntegerField(default=0)),
+                ('eye_count', models.IntegerField(default=0)),
+                ('audio_count', models.IntegerField(default=0)),
+                ('object_count', models.IntegerField(default=0)),
+                ('lip_count', models.IntegerField(default=0)),
+                ('other_count', models.IntegerField(default=0)),
+                ('first_timestamp', models.FloatField(blank=True, null=True)),
+                ('last_timestamp', models.FloatField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='violationrecord',
+            index=models.Index(fields=['session', 'timestamp'], name='violation_session_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='violationrecord',
+            index=models.Index(fields=['session', 'violation_type'], name='violation_session_type_idx'),
+        ),
+        migrations.RunPython(build_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('proctoring', '0005_analysisjob_heartbeat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analysisjob',
+            name='audio_skipped',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
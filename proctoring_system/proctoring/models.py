@@ -1,6 +1,22 @@
+from django.conf import settings
 from django.db import models
+from django.db.models import Value
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
 
+class ExamSessionQuerySet(models.QuerySet):
+    def with_violation_counts(self):
+        """
+        Annotate each session with `violations_count` and `<type>_violations_count`
+        for every violation type, read from its SessionViolationSummary in the
+        same query as the sessions.
+        """
+        counts = {
+            f'{violation_type}_violations_count': Coalesce(f'violation_summary__{violation_type}_count', Value(0))
+            for violation_type, _ in ViolationRecord.VIOLATION_TYPES
+        }
+        return self.annotate(violations_count=Coalesce('violation_summary__total', Value(0)), **counts)
+
 class ExamSession(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     start_time = models.DateTimeField(auto_now_add=True)
@@ -8,6 +24,8 @@ class ExamSession(models.Model):
     is_completed = models.BooleanField(default=False)
     video_file = models.FileField(upload_to='exam_videos/', null=True, blank=True)
     
+    objects = ExamSessionQuerySet.as_manager()
+    
     def __str__(self):
         return f"Exam Session {self.id} - {self.user.username}"
 
@@ -23,10 +41,71 @@ class ViolationRecord(models.Model):
     session = models.ForeignKey(ExamSession, on_delete=models.CASCADE, related_name='violations')
     violation_type = models.CharField(max_length=10, choices=VIOLATION_TYPES)
     timestamp = models.FloatField()  # Seconds from start of video
+    end_timestamp = models.FloatField(null=True, blank=True)  # End of a live violation event, if tracked
     description = models.TextField()
     confidence = models.FloatField()  # Confidence score from ML model
     screenshot = models.ImageField(upload_to='violation_screenshots/', null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            # A session's violations in video order, and its violations of one type
+            models.Index(fields=['session', 'timestamp'], name='violation_session_time_idx'),
+            models.Index(fields=['session', 'violation_type'], name='violation_session_type_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.get_violation_type_display()} at {self.timestamp}s"
+
+
+class SessionViolationSummary(models.Model):
+    """
+    Running totals of a session's violations, updated whenever violations are
+    inserted (see ViolationSink), so totals and eligibility are single-row reads.
+    """
+    session = models.OneToOneField(ExamSession, on_delete=models.CASCADE, primary_key=True,
+                                   related_name='violation_summary')
+    total = models.IntegerField(default=0)
+    eye_count = models.IntegerField(default=0)
+    audio_count = models.IntegerField(default=0)
+    object_count = models.IntegerField(default=0)
+    lip_count = models.IntegerField(default=0)
+    other_count = models.IntegerField(default=0)
+    first_timestamp = models.FloatField(null=True, blank=True)
+    last_timestamp = models.FloatField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    @property
+    def is_eligible(self):
+        return self.total <= settings.PROCTORING_ELIGIBLE_MAX_VIOLATIONS
+    
+    def __str__(self):
+        return f"Violation Summary - Session {self.session_id} ({self.total})"
+
+
+class AnalysisJob(models.Model):
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    
+    session = models.ForeignKey(ExamSession, on_delete=models.CASCADE, related_name='analysis_jobs')
+    video_file = models.FileField(upload_to='analysis_jobs/')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    progress = models.FloatField(default=0)  # Fraction of the video analyzed, 0 to 1
+    violations_count = models.IntegerField(null=True, blank=True)
+    frames_analyzed = models.IntegerField(null=True, blank=True)
+    frames_skipped = models.IntegerField(null=True, blank=True)  # Unchanged frames that reused earlier results
+    audio_skipped = models.FloatField(null=True, blank=True)  # Fraction of the audio the voice activity gate skipped
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Process running the job ("host:pid") and its latest sign of life, to requeue jobs whose process died
+    worker_id = models.CharField(max_length=100, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"Analysis Job {self.id} ({self.status}) - Session {self.session_id}"
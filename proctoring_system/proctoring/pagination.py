@@ -0,0 +1,23 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class SessionCursorPagination(CursorPagination):
+    """
+    Newest sessions first. Cursor pages cost the same however deep the client
+    pages, unlike OFFSET, and stay stable while new sessions are created.
+    """
+    ordering = '-id'
+    page_size = settings.PROCTORING_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.PROCTORING_MAX_PAGE_SIZE
+
+
+class ViolationCursorPagination(CursorPagination):
+    """
+    Violations in video order; `id` breaks ties between equal timestamps.
+    """
+    ordering = ('timestamp', 'id')
+    page_size = settings.PROCTORING_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.PROCTORING_MAX_PAGE_SIZE
@@ -0,0 +1,260 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections
+
+from .models import ViolationRecord
+
+# Violation types that have no picture to show
+NO_SCREENSHOT_TYPES = ('audio',)
+
+
+def encode_screenshot(frame, quality=80, max_width=640):
+    """
+    JPEG-encode a BGR frame, shrunk to at most `max_width` pixels wide.
+
+    Returns:
+        The JPEG bytes
+    """
+    height, width = frame.shape[:2]
+    if max_width and width > max_width:
+        size = (max_width, max(1, round(height * max_width / width)))
+        frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+    ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+    if not ok:
+        raise ValueError("Could not encode screenshot")
+    return buffer.tobytes()
+
+
+class ScreenshotWriter:
+    """
+    Encode violation screenshots and save them to storage in a thread pool.
+
+    `submit` only hands the frame to a worker thread, so the caller (a live
+    frame request or an analysis job) never waits for the JPEG encoding or
+    the file write. At most `max_queue` screenshots wait or run at a time;
+    a live submit beyond that is dropped and counted rather than queued, so
+    a slow disk can't stall analysis. Each file is saved through the
+    ViolationRecord.screenshot field's storage (MEDIA_ROOT by default) and
+    its name written to the record with a single UPDATE.
+
+    Args:
+        threads: Encoding threads
+        max_queue: Screenshots waiting or being encoded before new ones are dropped
+        quality: JPEG quality, 0-100
+        max_width: Width in pixels screenshots are shrunk to, None keeps the frame size
+    """
+
+    def __init__(self, threads=1, max_queue=32, quality=80, max_width=640):
+        self.threads = threads
+        self.max_queue = max_queue
+        self.quality = quality
+        self.max_width = max_width
+        self._slots = threading.BoundedSemaphore(max_queue)
+        self._executor = None
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self.pending = 0
+        self.submitted = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        # Seconds spent encoding, and from submit to saved, of recent screenshots
+        self.encode_seconds = deque(maxlen=1000)
+        self.total_seconds = deque(maxlen=1000)
+
+    def submit(self, record, frame, block=False):
+        """
+        Queue a screenshot of `frame` for a saved ViolationRecord.
+
+        The frame must not be modified afterwards. With `block` the call waits
+        for a free queue slot instead of dropping the screenshot.
+
+        Returns:
+            True if the screenshot was queued, False if it was dropped
+        """
+        if record.pk is None or frame is None:
+            return False
+
+        if not self._slots.acquire(blocking=block):
+            with self._lock:
+                self.dropped += 1
+            return False
+
+        with self._lock:
+            self.pending += 1
+            self.submitted += 1
+        try:
+            self._get_executor().submit(self._write, record.pk, frame, time.perf_counter())
+        except Exception:
+            self._done()
+            raise
+        return True
+
+    def wait(self, timeout=None):
+        """
+        Wait until every queued screenshot has been written.
+
+        Returns:
+            True if the queue drained, False on timeout
+        """
+        with self._idle:
+            return self._idle.wait_for(lambda: self.pending == 0, timeout)
+
+    def stats(self):
+        """
+        Queue depth, counters and encode latency in milliseconds.
+        """
+        with self._lock:
+            return {
+                "queue_depth": self.pending,
+                "max_queue": self.max_queue,
+                "submitted": self.submitted,
+                "dropped": self.dropped,
+                "written": self.written,
+                "failed": self.failed,
+                "encode_ms": latency_summary(self.encode_seconds),
+                "total_ms": latency_summary(self.total_seconds),
+            }
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='screenshot')
+            return self._executor
+
+    def _write(self, record_id, frame, submitted_at):
+        close_old_connections()
+        try:
+            start = time.perf_counter()
+            data = encode_screenshot(frame, self.quality, self.max_width)
+            encoded = time.perf_counter()
+
+            field = ViolationRecord._meta.get_field('screenshot')
+            name = field.generate_filename(None, f"violation_{record_id}.jpg")
+            name = field.storage.save(name, ContentFile(data))
+            ViolationRecord.objects.filter(id=record_id).update(screenshot=name)
+
+            with self._lock:
+                self.written += 1
+                self.encode_seconds.append(encoded - start)
+                self.total_seconds.append(time.perf_counter() - submitted_at)
+        except Exception as e:
+            print(f"Error writing violation screenshot: {str(e)}")
+            with self._lock:
+                self.failed += 1
+        finally:
+            close_old_connections()
+            self._done()
+
+    def _done(self):
+        with self._idle:
+            self.pending -= 1
+            self._idle.notify_all()
+        self._slots.release()
+
+
+def latency_summary(seconds):
+    """
+    Mean, 95th percentile and maximum of a sequence of durations, in milliseconds.
+    """
+    if not seconds:
+        return {"count": 0, "mean": None, "p95": None, "max": None}
+    ms = 1000 * np.asarray(seconds)
+    return {
+        "count": len(ms),
+        "mean": round(float(ms.mean()), 3),
+        "p95": round(float(np.percentile(ms, 95)), 3),
+        "max": round(float(ms.max()), 3),
+    }
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def screenshot_writer():
+    """
+    The process-wide ScreenshotWriter configured in settings, or None if screenshots are disabled.
+    """
+    global _writer
+    if not settings.PROCTORING_SCREENSHOTS:
+        return None
+    with _writer_lock:
+        if _writer is None:
+            _writer = ScreenshotWriter(
+                threads=settings.PROCTORING_SCREENSHOT_THREADS,
+                max_queue=settings.PROCTORING_SCREENSHOT_QUEUE,
+                quality=settings.PROCTORING_SCREENSHOT_QUALITY,
+                max_width=settings.PROCTORING_SCREENSHOT_MAX_WIDTH,
+            )
+        return _writer
+
+
+def capture_live_screenshots(records, frame):
+    """
+    Queue a screenshot of the current frame for newly opened live violation events.
+
+    Records are only created when an event opens, so each event window gets
+    one screenshot rather than one per frame.
+    """
+    writer = screenshot_writer()
+    if writer is None or frame is None:
+        return
+    for record in records:
+        if record.violation_type not in NO_SCREENSHOT_TYPES:
+            writer.submit(record, frame)
+
+
+def first_of_each_event(records, gap):
+    """
+    The first record of every event: runs of records with the same type and
+    description no more than `gap` seconds apart.
+    """
+    firsts = []
+    last_seen = {}
+    for record in sorted(records, key=lambda r: r.timestamp):
+        key = (record.violation_type, record.description)
+        previous = last_seen.get(key)
+        if previous is None or record.timestamp - previous > gap:
+            firsts.append(record)
+        last_seen[key] = record.end_timestamp if record.end_timestamp is not None else record.timestamp
+    return firsts
+
+
+def capture_video_screenshots(records, frames):
+    """
+    Queue screenshots for the violations found in an uploaded video, one per event.
+
+    The frames were kept by the analysis during its forward pass (see
+    EventFrames in video_analysis), so the video is not read again. Runs in
+    the analysis job, so it waits for queue slots instead of dropping
+    screenshots.
+
+    Args:
+        records: The saved ViolationRecords of the video's frame violations
+        frames: The kept event frame of each record, None where there is none
+
+    Returns:
+        Number of screenshots queued
+    """
+    writer = screenshot_writer()
+    if writer is None:
+        return 0
+
+    frame_of = {record.pk: frame for record, frame in zip(records, frames)}
+    records = [record for record in records if record.violation_type not in NO_SCREENSHOT_TYPES]
+
+    queued = 0
+    for record in first_of_each_event(records, settings.PROCTORING_EVENT_GAP_SECONDS):
+        frame = frame_of.get(record.pk)
+        if frame is not None:
+            queued += writer.submit(record, frame, block=True)
+    return queued
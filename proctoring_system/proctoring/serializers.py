@@ -1,17 +1,41 @@
 from rest_framework import serializers
-from .models import ExamSession, ViolationRecord
+from .models import AnalysisJob, ExamSession, ViolationRecord
+from .sinks import get_violation_summary
 
 class ViolationRecordSerializer(serializers.ModelSerializer):
     class Meta:
         model = ViolationRecord
-        fields = ['id', 'violation_type', 'timestamp', 'description', 'confidence', 'screenshot', 'created_at']
+        fields = ['id', 'violation_type', 'timestamp', 'end_timestamp', 'description', 'confidence', 'screenshot', 'created_at']
 
 class ExamSessionSerializer(serializers.ModelSerializer):
     violations_count = serializers.SerializerMethodField()
+    violation_counts = serializers.SerializerMethodField()
     
     class Meta:
         model = ExamSession
-        fields = ['id', 'start_time', 'end_time', 'is_completed', 'video_file', 'violations_count']
+        fields = ['id', 'start_time', 'end_time', 'is_completed', 'video_file', 'violations_count', 'violation_counts']
+    
+    # Counts come from ExamSession.objects.with_violation_counts(); sessions
+    # without the annotations (e.g. just created) fall back to reading the summary row
     
     def get_violations_count(self, obj):
-        return obj.violations.count()
\ No newline at end of file
+        if hasattr(obj, 'violations_count'):
+            return obj.violations_count
+        return get_violation_summary(obj.pk).total
+    
+    def get_violation_counts(self, obj):
+        if hasattr(obj, 'violations_count'):
+            return {
+                violation_type: getattr(obj, f'{violation_type}_violations_count')
+                for violation_type, _ in ViolationRecord.VIOLATION_TYPES
+            }
+        summary = get_violation_summary(obj.pk)
+        return {
+            violation_type: getattr(summary, f'{violation_type}_count')
+            for violation_type, _ in ViolationRecord.VIOLATION_TYPES
+        }
+
+class AnalysisJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AnalysisJob
+        fields = ['id', 'session', 'status', 'progress', 'violations_count', 'frames_analyzed', 'frames_skipped', 'audio_skipped', 'error', 'created_at', 'started_at', 'finished_at']
@@ -0,0 +1,253 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .models import ExamSession, ViolationRecord
+from .screenshots import capture_live_screenshots
+from .sinks import ViolationSink
+from proctoring_system.utils.change_gate import make_change_gate
+from proctoring_system.utils.event_tracker import EventTracker
+from proctoring_system.utils.face_tracker import make_face_tracker
+from proctoring_system.utils.lip_movement import LipState
+from proctoring_system.utils.eye_tracking import GazeState
+
+
+class SessionStreamState:
+    """
+    Analyzer state for one live exam session.
+
+    Frames of the same session are analyzed under `lock`, so the rolling
+    windows and timers see them one at a time.
+    """
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.lock = threading.Lock()
+        self.gaze = GazeState()
+        self.lip = LipState()
+        # Reuses the last results while the webcam image does not change
+        self.change_gate = make_change_gate(settings.PROCTORING_CHANGE_GATE)
+        self.face_tracker = make_face_tracker(settings.PROCTORING_FACE_TRACKER)
+        self.events = EventTracker(
+            gap=settings.PROCTORING_EVENT_GAP_SECONDS,
+            window=settings.PROCTORING_EVENT_WINDOW_SECONDS,
+            min_hits=settings.PROCTORING_EVENT_MIN_HITS,
+        )
+        # ViolationRecord id of each open event, by event key
+        self.record_ids = {}
+        self.last_seen = time.monotonic()
+
+
+class SessionStateStore:
+    """
+    Bounded in-memory store of SessionStreamState, one per live session.
+
+    States unused for `ttl` seconds are evicted, and the least recently used
+    state is evicted when more than `max_sessions` are held. Evicted states are
+    passed to `on_evict` so their open events can be closed.
+
+    The store is per process; deployments with several web workers should
+    route a session's frames to the same worker.
+    """
+
+    def __init__(self, max_sessions=10000, ttl=300, on_evict=None):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        """
+        Return the state for a session, creating it if needed.
+        """
+        now = time.monotonic()
+        with self._lock:
+            state = self._states.get(session_id)
+            if state is None:
+                state = SessionStreamState(session_id)
+                self._states[session_id] = state
+            else:
+                self._states.move_to_end(session_id)
+            state.last_seen = now
+            evicted = self._evict(now)
+
+        self._notify(evicted)
+        return state
+
+    def discard(self, session_id):
+        """
+        Drop a session's state, e.g. when the exam is completed.
+        """
+        with self._lock:
+            state = self._states.pop(session_id, None)
+        self._notify([state] if state is not None else [])
+
+    def __len__(self):
+        return len(self._states)
+
+    def _evict(self, now):
+        evicted = []
+        # Oldest first, so expired states are always at the front
+        while self._states:
+            session_id, state = next(iter(self._states.items()))
+            if now - state.last_seen <= self.ttl and len(self._states) <= self.max_sessions:
+                break
+            del self._states[session_id]
+            evicted.append(state)
+        return evicted
+
+    def _notify(self, evicted):
+        if self.on_evict is not None:
+            for state in evicted:
+                self.on_evict(state)
+
+
+class SessionOwnershipCache:
+    """
+    Short-lived, bounded per-process cache of which user owns which ExamSession.
+
+    Live frame requests look up their session on every frame; a cache hit
+    skips that query. Entries expire after `ttl` seconds and the least
+    recently used entry is evicted beyond `max_entries`. `invalidate` drops a
+    session when it is completed or deleted in this process; other processes
+    see the change once their entry expires, so `ttl` bounds how stale an
+    entry can be. A `ttl` of 0 disables the cache.
+    """
+
+    def __init__(self, max_entries=10000, ttl=30):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, session_id, user_id):
+        """
+        Return the cached ExamSession if `user_id` owns it, else None.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None and now - entry[1] < self.ttl and entry[0].user_id == user_id:
+                self._entries.move_to_end(session_id)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            return None
+
+    def put(self, session):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[session.id] = (session, time.monotonic())
+            self._entries.move_to_end(session.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, session_id):
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+session_owners = SessionOwnershipCache(
+    max_entries=settings.PROCTORING_SESSION_CACHE_SIZE,
+    ttl=settings.PROCTORING_SESSION_CACHE_TTL,
+)
+
+
+def get_owned_session(session_id, user_id):
+    """
+    The ExamSession `session_id` if `user_id` owns it, else None, from the cache when possible.
+
+    Only found sessions are cached, so a session created a moment ago is never
+    reported missing.
+    """
+    try:
+        session_id = int(session_id)
+    except (TypeError, ValueError):
+        return None
+
+    session = session_owners.get(session_id, user_id)
+    if session is None:
+        session = ExamSession.objects.filter(id=session_id, user_id=user_id).first()
+        if session is not None:
+            session_owners.put(session)
+    return session
+
+
+def end_session_stream(session_id):
+    """
+    Forget a completed or deleted session: close its open events and drop it from the ownership cache.
+    """
+    session_owners.invalidate(session_id)
+    stream_states.discard(session_id)
+
+
+def close_events(state, events):
+    """
+    Record the end time and peak confidence of closed events.
+    """
+    for event in events:
+        record_id = state.record_ids.pop(event['key'], None)
+        if record_id is not None:
+            ViolationRecord.objects.filter(id=record_id).update(
+                end_timestamp=event['end'], confidence=event['confidence']
+            )
+
+
+def _close_evicted(state):
+    with state.lock:
+        close_events(state, state.events.close_all())
+
+
+stream_states = SessionStateStore(
+    max_sessions=settings.PROCTORING_STREAM_MAX_SESSIONS,
+    ttl=settings.PROCTORING_STREAM_STATE_TTL,
+    on_evict=_close_evicted,
+)
+
+
+def record_stream_violations(state, session, timestamp, violations, frame=None):
+    """
+    Turn one frame's detections into at most one ViolationRecord per event.
+
+    New events are written when they open, with `timestamp` set to the start
+    of the event; events that have ended get their `end_timestamp` filled in.
+    Must be called with `state.lock` held.
+
+    Args:
+        state: The session's SessionStreamState
+        session: The ExamSession
+        timestamp: Timestamp of the frame in seconds
+        violations: Detections of the frame with type, description and confidence
+        frame: The analyzed frame, screenshotted in the background for newly opened events
+
+    Returns:
+        List of ViolationRecords created for newly opened events
+    """
+    opened, closed = state.events.update(timestamp, violations)
+
+    sink = ViolationSink(session)
+    records = [
+        sink.add(event['type'], event['start'], event['description'], event['confidence'])
+        for event in opened
+    ]
+    sink.flush()
+
+    for event, vr in zip(opened, records):
+        state.record_ids[event['key']] = vr.id
+
+    close_events(state, closed)
+    capture_live_screenshots(records, frame)
+    return records
@@ -0,0 +1,133 @@
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce, Greatest, Least
+
+from .models import SessionViolationSummary, ViolationRecord
+
+
+class ViolationSink:
+    """
+    Collect violations for one session in memory and write them in batches.
+
+    Analyzers add violations as they find them; `flush` inserts everything
+    pending with `bulk_create` inside a single transaction, instead of one
+    INSERT (and on SQLite one transaction) per violation. The session's
+    SessionViolationSummary is updated in the same transaction.
+
+    Usage:
+        with ViolationSink(session) as sink:
+            sink.add('eye', 12.0, "Looking away from screen", 0.8)
+        records = sink.records
+    """
+
+    def __init__(self, session, batch_size=None):
+        self.session = session
+        self.batch_size = batch_size or settings.PROCTORING_VIOLATION_BATCH_SIZE
+        self.pending = []
+        self.records = []
+
+    def add(self, violation_type, timestamp, description, confidence, end_timestamp=None):
+        """
+        Queue a violation and return its (not yet saved) ViolationRecord.
+        """
+        vr = ViolationRecord(
+            session=self.session,
+            violation_type=violation_type,
+            timestamp=timestamp,
+            end_timestamp=end_timestamp,
+            description=description,
+            confidence=confidence
+        )
+        self.pending.append(vr)
+        return vr
+
+    def extend(self, violations, violation_type=None):
+        """
+        Queue analyzer output dicts, taking the type from each dict unless given.
+
+        Returns:
+            List of the queued ViolationRecords
+        """
+        return [
+            self.add(
+                violation_type or violation['type'],
+                violation['timestamp'],
+                violation['description'],
+                violation['confidence'],
+                violation.get('end_timestamp'),
+            )
+            for violation in violations
+        ]
+
+    def flush(self):
+        """
+        Insert all pending violations in one transaction.
+
+        Returns:
+            List of every ViolationRecord written through this sink
+        """
+        if self.pending:
+            with transaction.atomic():
+                ViolationRecord.objects.bulk_create(self.pending, batch_size=self.batch_size)
+                update_violation_summary(self.session.pk, self.pending)
+            self.records.extend(self.pending)
+            self.pending = []
+        return self.records
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.flush()
+
+
+def update_violation_summary(session_id, records):
+    """
+    Add newly inserted violations to their session's SessionViolationSummary.
+
+    The summary row is created if missing (ignoring a concurrent insert) and
+    then incremented with a single UPDATE of F() expressions, so concurrent
+    writers for the same session do not lose counts.
+    """
+    if not records:
+        return
+
+    counts = Counter(record.violation_type for record in records)
+    first = min(record.timestamp for record in records)
+    last = max(record.timestamp for record in records)
+
+    SessionViolationSummary.objects.bulk_create([SessionViolationSummary(session_id=session_id)],
+                                                ignore_conflicts=True)
+    updates = {
+        f'{violation_type}_count': F(f'{violation_type}_count') + counts[violation_type]
+        for violation_type, _ in ViolationRecord.VIOLATION_TYPES
+        if counts[violation_type]
+    }
+    SessionViolationSummary.objects.filter(session_id=session_id).update(
+        total=F('total') + len(records),
+        first_timestamp=Least(Coalesce('first_timestamp', Value(first)), Value(first)),
+        last_timestamp=Greatest(Coalesce('last_timestamp', Value(last)), Value(last)),
+        **updates,
+    )
+
+
+def get_violation_summary(session_id):
+    """
+    The session's SessionViolationSummary, or an unsaved empty one if it has no violations yet.
+    """
+    summary = SessionViolationSummary.objects.filter(session_id=session_id).first()
+    return summary or SessionViolationSummary(session_id=session_id)
+
+
+def rebuild_violation_summary(session_id):
+    """
+    Recount a session's summary from its ViolationRecords, e.g. after records were deleted.
+    """
+    with transaction.atomic():
+        SessionViolationSummary.objects.filter(session_id=session_id).delete()
+        records = ViolationRecord.objects.filter(session_id=session_id).only('violation_type', 'timestamp')
+        update_violation_summary(session_id, list(records))
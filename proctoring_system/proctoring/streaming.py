@@ -0,0 +1,300 @@
+"""
+WebSocket endpoint for live proctoring, served directly by the ASGI app.
+
+Clients connect to /ws/proctoring/<session_id>/ with their Django session
+cookie and send binary messages. Browser connections must come from an
+origin in ALLOWED_HOSTS or CSRF_TRUSTED_ORIGINS, so other sites cannot open
+a stream with a visitor's cookie.
+
+    byte 0      message kind: 1 = JPEG/PNG frame, 2 = 16-bit mono PCM audio
+    bytes 1-8   timestamp in seconds (little-endian float64)
+    bytes 9-    payload
+
+The PCM sample rate is taken from the `sample_rate` query parameter. Frames
+are analyzed newest-first: if the analyzer falls behind, a frame waiting for
+analysis is replaced by the next one to arrive and counted as dropped. Audio
+chunks are kept in a short bounded queue. After each analysis the server sends
+a JSON text message with the new violations. A completed session is refused at
+the handshake, and a stream whose session is completed meanwhile is closed,
+both with code 4409.
+"""
+import asyncio
+import json
+import re
+import struct
+from collections import deque
+from fnmatch import fnmatchcase
+from http.cookies import SimpleCookie
+from importlib import import_module
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlsplit
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.db import close_old_connections
+from django.http.request import split_domain_port, validate_host
+
+from .models import ExamSession
+from .serializers import ViolationRecordSerializer
+from .session_state import get_owned_session, record_stream_violations, stream_states
+from .views import analyze_frame_data, decode_frame
+from proctoring_system.utils.audio_analysis import analyze_audio
+
+STREAM_PATH = re.compile(r'^/ws/proctoring/(?P<session_id>\d+)/$')
+
+HEADER = struct.Struct('<Bd')
+KIND_FRAME = 1
+KIND_AUDIO = 2
+
+
+class SessionClosed(Exception):
+    """
+    The stream's session was completed or deleted after the connection opened.
+    """
+
+
+def origin_allowed(origin):
+    """
+    Whether a WebSocket handshake's Origin may use the visitor's session cookie.
+
+    Allowed are origins listed in CSRF_TRUSTED_ORIGINS (with `*.` subdomain
+    wildcards, as for CSRF) and origins whose host is in ALLOWED_HOSTS. A
+    missing Origin is allowed: browsers always send one, so only non-browser
+    clients, which hold their own cookie, omit it.
+    """
+    if origin is None:
+        return True
+    if any(fnmatchcase(origin, trusted) for trusted in settings.CSRF_TRUSTED_ORIGINS):
+        return True
+
+    allowed_hosts = settings.ALLOWED_HOSTS
+    if settings.DEBUG and not allowed_hosts:
+        # Same default as Django's request host validation
+        allowed_hosts = ['.localhost', '127.0.0.1', '[::1]']
+    host, _ = split_domain_port(urlsplit(origin).netloc)
+    return bool(host) and validate_host(host, allowed_hosts)
+
+
+def authenticate_session(session_key, session_id):
+    """
+    Return the ExamSession if the Django session's user owns it, else None.
+    """
+    if not session_key:
+        return None
+    store = import_module(settings.SESSION_ENGINE).SessionStore(session_key)
+    user = get_user(SimpleNamespace(session=store))
+    if not user.is_authenticated:
+        return None
+    return ExamSession.objects.filter(id=session_id, user=user).first()
+
+
+def analyze_message(session, kind, timestamp, payload, sample_rate):
+    """
+    Analyze one frame or audio chunk and record the violation events it opens.
+
+    Runs in a worker thread outside any request, so stale database
+    connections are closed before and after, as Django does around requests.
+
+    Raises:
+        SessionClosed: If the session has been completed or deleted
+    """
+    close_old_connections()
+    try:
+        # Ownership is cached briefly per process and dropped when the session is completed here
+        session = get_owned_session(session.id, session.user_id)
+        if session is None:
+            raise SessionClosed("Invalid session ID")
+        if session.is_completed:
+            raise SessionClosed("Session is completed")
+
+        # Fetched per message so a long-lived connection keeps its state from
+        # expiring (and its open events from being closed and reopened)
+        state = stream_states.get(session.id)
+        detections = []
+        frame = None
+
+        if kind == KIND_FRAME:
+            frame = decode_frame(payload)
+            if frame is not None:
+                detections.extend(analyze_frame_data(frame, state, timestamp))
+
+        elif kind == KIND_AUDIO:
+            for violation in analyze_audio(payload, timestamp, sr=sample_rate,
+                                           analysis_rate=settings.PROCTORING_AUDIO_ANALYSIS_RATE,
+                                           gate=settings.PROCTORING_AUDIO_VAD):
+                detections.append({
+                    "type": 'audio',
+                    "description": violation['description'],
+                    "confidence": violation['confidence']
+                })
+
+        with state.lock:
+            violations = record_stream_violations(state, session, timestamp, detections, frame=frame)
+        return ViolationRecordSerializer(violations, many=True).data
+    finally:
+        close_old_connections()
+
+
+class StreamConnection:
+    """
+    One WebSocket connection: a receive loop and an analysis loop.
+
+    The receive loop never waits for analysis, so a slow analyzer only ever
+    has the newest frame waiting for it.
+    """
+
+    def __init__(self, scope, receive, send, session_id):
+        self.scope = scope
+        self.receive = receive
+        self.send = send
+        self.session_id = session_id
+        self.sample_rate = None
+        self.pending_frame = None
+        self.pending_audio = deque(maxlen=settings.PROCTORING_STREAM_AUDIO_QUEUE)
+        self.wakeup = asyncio.Event()
+        self.closed = False
+        self.dropped_frames = 0
+
+    def session_key(self):
+        for name, value in self.scope.get('headers', []):
+            if name == b'cookie':
+                cookie = SimpleCookie(value.decode('latin-1'))
+                if settings.SESSION_COOKIE_NAME in cookie:
+                    return cookie[settings.SESSION_COOKIE_NAME].value
+        return None
+
+    def header(self, name):
+        for header, value in self.scope.get('headers', []):
+            if header == name:
+                return value.decode('latin-1')
+        return None
+
+    def read_sample_rate(self):
+        """
+        PCM sample rate from the query string, or None if it is not a positive integer.
+        """
+        query = parse_qs(self.scope.get('query_string', b'').decode('latin-1'))
+        try:
+            sample_rate = int(query.get('sample_rate', [settings.PROCTORING_STREAM_SAMPLE_RATE])[0])
+        except ValueError:
+            return None
+        return sample_rate if sample_rate > 0 else None
+
+    async def run(self):
+        message = await self.receive()
+        if message['type'] != 'websocket.connect':
+            return
+
+        if not origin_allowed(self.header(b'origin')):
+            await self.send({'type': 'websocket.close', 'code': 4403})
+            return
+
+        self.sample_rate = self.read_sample_rate()
+        if self.sample_rate is None:
+            await self.send({'type': 'websocket.close', 'code': 4400})
+            return
+
+        session = await sync_to_async(authenticate_session)(self.session_key(), self.session_id)
+        if session is None:
+            await self.send({'type': 'websocket.close', 'code': 4403})
+            return
+        if session.is_completed:
+            await self.send({'type': 'websocket.close', 'code': 4409})
+            return
+
+        await self.send({'type': 'websocket.accept'})
+        analyzer = asyncio.create_task(self.analyze_loop(session))
+
+        try:
+            while True:
+                message = await self.receive()
+                if message['type'] == 'websocket.disconnect':
+                    break
+                if message['type'] == 'websocket.receive' and message.get('bytes'):
+                    self.enqueue(message['bytes'])
+        finally:
+            self.closed = True
+            self.wakeup.set()
+            await analyzer
+
+    def enqueue(self, data):
+        if len(data) <= HEADER.size:
+            return
+        kind, timestamp = HEADER.unpack_from(data)
+
+        if kind == KIND_FRAME:
+            # Keep only the newest frame; an unanalyzed older one is stale
+            if self.pending_frame is not None:
+                self.dropped_frames += 1
+            self.pending_frame = (timestamp, data[HEADER.size:])
+        elif kind == KIND_AUDIO:
+            self.pending_audio.append((timestamp, data[HEADER.size:]))
+        else:
+            return
+
+        self.wakeup.set()
+
+    async def analyze_loop(self, session):
+        analyze = sync_to_async(analyze_message, thread_sensitive=False)
+
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+
+            while not self.closed and (self.pending_audio or self.pending_frame is not None):
+                if self.pending_audio:
+                    kind = KIND_AUDIO
+                    timestamp, payload = self.pending_audio.popleft()
+                else:
+                    kind = KIND_FRAME
+                    timestamp, payload = self.pending_frame
+                    self.pending_frame = None
+
+                try:
+                    violations = await analyze(session, kind, timestamp, payload, self.sample_rate)
+                except SessionClosed as e:
+                    await self.send_json({"type": 'error', "timestamp": timestamp, "error": str(e)})
+                    await self.close(4409)
+                    return
+                except Exception as e:
+                    await self.send_json({"type": 'error', "timestamp": timestamp, "error": str(e)})
+                    continue
+
+                await self.send_json({
+                    "type": 'result',
+                    "kind": 'frame' if kind == KIND_FRAME else 'audio',
+                    "timestamp": timestamp,
+                    "violations": violations,
+                    "dropped_frames": self.dropped_frames,
+                })
+
+            if self.closed:
+                return
+
+    async def send_json(self, data):
+        try:
+            await self.send({'type': 'websocket.send', 'text': json.dumps(data)})
+        except Exception:
+            # The client went away mid-analysis
+            self.closed = True
+
+    async def close(self, code):
+        self.closed = True
+        try:
+            await self.send({'type': 'websocket.close', 'code': code})
+        except Exception:
+            pass
+
+
+async def websocket_application(scope, receive, send):
+    """
+    ASGI application for WebSocket connections.
+    """
+    match = STREAM_PATH.match(scope['path'])
+    if match is None:
+        await receive()
+        await send({'type': 'websocket.close', 'code': 4404})
+        return
+
+    await StreamConnection(scope, receive, send, int(match.group('session_id'))).run()
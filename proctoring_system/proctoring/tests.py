@@ -1,3 +1,1269 @@
-from django.test import TestCase
+import asyncio
+import base64
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
 
-# Create your tests here.
+import av
+import cv2
+import librosa
+import numpy as np
+import soundfile as sf
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from . import jobs
+from .jobs import claim_job, heartbeat, recover_jobs, worker_id
+from .models import AnalysisJob, ExamSession, ViolationRecord
+from .session_state import SessionStateStore, session_owners, stream_states
+from .sinks import ViolationSink, get_violation_summary, rebuild_violation_summary
+from .streaming import (
+    HEADER, KIND_AUDIO, KIND_FRAME, SessionClosed, StreamConnection, analyze_message, origin_allowed,
+    websocket_application,
+)
+from .views import read_frame_request
+from proctoring_system.utils.audio_analysis import (
+    AudioGateStats, analyze_audio, detect_voice_activity, iter_windows, load_audio, open_audio_stream,
+)
+from proctoring_system.utils.audio_features import AudioFeatures
+from proctoring_system.utils.change_gate import ChangeGate, ChangeGateStats
+from proctoring_system.utils.event_tracker import EventTracker
+from proctoring_system.utils.eye_tracking import GazeObservation, GazeState
+from proctoring_system.utils.face_ratios import (
+    RatioHysteresis, mouth_aspect_ratio, stack_landmarks,
+)
+from proctoring_system.utils.face_tracker import FaceTracker
+from proctoring_system.utils.frame_context import FrameContext
+from proctoring_system.utils.frame_source import FrameSource, make_sampler
+from proctoring_system.utils.model_registry import ModelRegistry
+from proctoring_system.utils import model_registry
+from proctoring_system.utils.object_detection import COCO_CLASSES, ContourBackend, DnnBackend, decode_yolo_output
+from proctoring_system.utils.video_analysis import (
+    EventFrames, analyze_video_file, analyze_video_range, count_reused, merge_bursts, reduce_observations,
+)
+
+# Queries per page, whatever the page size: the page of rows (counts are
+# joined in from the summary table, and cursor pagination needs no COUNT)
+SESSION_PAGE_QUERIES = 1
+VIOLATION_PAGE_QUERIES = 1
+
+
+class ListQueryCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('student', password='secret')
+        types = [violation_type for violation_type, _ in ViolationRecord.VIOLATION_TYPES]
+        cls.sessions = ExamSession.objects.bulk_create([ExamSession(user=cls.user) for _ in range(30)])
+        for session in cls.sessions:
+            with ViolationSink(session) as sink:
+                for i in range(len(types) + 2):
+                    sink.add(types[i % len(types)], float(i), "test", 0.5)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_session_list_query_budget(self):
+        for page_size in (5, 25):
+            with self.assertNumQueries(SESSION_PAGE_QUERIES):
+                response = self.client.get(reverse('session-list-create'), {'page_size': page_size})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), page_size)
+
+    def test_session_list_counts(self):
+        response = self.client.get(reverse('session-list-create'), {'page_size': 1})
+        session = response.data['results'][0]
+        self.assertEqual(session['violations_count'], 7)
+        self.assertEqual(session['violation_counts'], {'eye': 2, 'audio': 2, 'object': 1, 'lip': 1, 'other': 1})
+
+    def test_session_list_next_page_query_budget(self):
+        first = self.client.get(reverse('session-list-create'), {'page_size': 10})
+        with self.assertNumQueries(SESSION_PAGE_QUERIES):
+            second = self.client.get(first.data['next'])
+
+        first_ids = [session['id'] for session in first.data['results']]
+        second_ids = [session['id'] for session in second.data['results']]
+        self.assertEqual(len(second_ids), 10)
+        self.assertTrue(min(first_ids) > max(second_ids))
+
+    def test_created_session_counts(self):
+        response = self.client.post(reverse('session-list-create'), {})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['violations_count'], 0)
+        self.assertEqual(set(response.data['violation_counts'].values()), {0})
+
+    def test_violation_list_query_budget(self):
+        session = self.sessions[0]
+        for page_size in (2, 7):
+            with self.assertNumQueries(VIOLATION_PAGE_QUERIES):
+                response = self.client.get(reverse('violation-list'), {'session': session.id, 'page_size': page_size})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), page_size)
+
+    def test_violation_list_pages_in_timestamp_order(self):
+        url = reverse('violation-list')
+        response = self.client.get(url, {'page_size': 40})
+        timestamps = []
+        while True:
+            timestamps.extend(violation['timestamp'] for violation in response.data['results'])
+            if response.data['next'] is None:
+                break
+            with self.assertNumQueries(VIOLATION_PAGE_QUERIES):
+                response = self.client.get(response.data['next'])
+
+        self.assertEqual(len(timestamps), ViolationRecord.objects.count())
+        self.assertEqual(timestamps, sorted(timestamps))
+
+
+class ViolationSummaryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('student', password='secret')
+        self.session = ExamSession.objects.create(user=self.user)
+
+    def test_summary_follows_inserts(self):
+        self.assertEqual(get_violation_summary(self.session.id).total, 0)
+
+        with ViolationSink(self.session) as sink:
+            sink.add('eye', 12.0, "Looking away", 0.8)
+            sink.add('lip', 3.5, "Talking", 0.6)
+        with ViolationSink(self.session) as sink:
+            sink.add('eye', 40.0, "Looking away", 0.8)
+
+        summary = get_violation_summary(self.session.id)
+        self.assertEqual((summary.total, summary.eye_count, summary.lip_count, summary.audio_count), (3, 2, 1, 0))
+        self.assertEqual((summary.first_timestamp, summary.last_timestamp), (3.5, 40.0))
+        self.assertTrue(summary.is_eligible)
+
+    def test_eligibility(self):
+        with ViolationSink(self.session) as sink:
+            for i in range(6):
+                sink.add('object', float(i), "Phone", 0.9)
+        self.assertFalse(get_violation_summary(self.session.id).is_eligible)
+
+    def test_rebuild_after_delete(self):
+        with ViolationSink(self.session) as sink:
+            for i in range(4):
+                sink.add('audio', float(i), "Voices", 0.7)
+        ViolationRecord.objects.filter(session=self.session, timestamp__lt=2).delete()
+
+        rebuild_violation_summary(self.session.id)
+        summary = get_violation_summary(self.session.id)
+        self.assertEqual((summary.total, summary.audio_count, summary.first_timestamp), (2, 2, 2.0))
+
+
+@override_settings(PROCTORING_SCREENSHOTS=False)
+class FrameAuthenticationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('student', password='secret')
+        self.session = ExamSession.objects.create(user=self.user)
+        self.client = APIClient()
+        self.frame = cv2.imencode('.jpg', np.zeros((48, 64, 3), np.uint8))[1].tobytes()
+        session_owners.clear()
+
+    def post_frame(self, session_id, **headers):
+        return self.client.post(f"{reverse('analyze-frame')}?session_id={session_id}&timestamp=1",
+                                self.frame, content_type='image/jpeg', **headers)
+
+    def stream_token(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.post(reverse('session-stream-token', args=[self.session.id]))
+        self.client.force_authenticate(None)
+        return response.data['token']
+
+    def test_ownership_is_cached(self):
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.post_frame(self.session.id).status_code, 200)
+        with self.assertNumQueries(1):  # the violation summary; no session lookup
+            self.assertEqual(self.post_frame(self.session.id).status_code, 200)
+
+    def test_other_users_session_is_rejected(self):
+        other = User.objects.create_user('other', password='secret')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.post_frame(self.session.id).status_code, 404)
+
+    def test_stream_token_skips_authentication(self):
+        token = self.stream_token()
+        self.assertEqual(self.post_frame(self.session.id, HTTP_AUTHORIZATION=f'Stream {token}').status_code, 200)
+        with self.assertNumQueries(1):
+            response = self.post_frame(self.session.id, HTTP_AUTHORIZATION=f'Stream {token}')
+        self.assertEqual(response.status_code, 200)
+
+    def test_stream_token_is_bound_to_its_session(self):
+        token = self.stream_token()
+        other = ExamSession.objects.create(user=self.user)
+        self.assertEqual(self.post_frame(other.id, HTTP_AUTHORIZATION=f'Stream {token}').status_code, 403)
+        self.assertEqual(self.post_frame(self.session.id, HTTP_AUTHORIZATION=f'Stream {token}x').status_code, 401)
+
+    def test_completing_session_invalidates_cache(self):
+        token = self.stream_token()
+        self.assertEqual(self.post_frame(self.session.id, HTTP_AUTHORIZATION=f'Stream {token}').status_code, 200)
+
+        self.client.force_authenticate(self.user)
+        self.client.patch(reverse('session-detail', args=[self.session.id]), {'is_completed': True})
+        self.client.force_authenticate(None)
+        self.assertEqual(self.post_frame(self.session.id, HTTP_AUTHORIZATION=f'Stream {token}').status_code, 403)
+
+
+@override_settings(PROCTORING_SCREENSHOTS=False)
+class FrameRequestTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('student', password='secret')
+        self.session = ExamSession.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.frame = cv2.imencode('.jpg', np.zeros((48, 64, 3), np.uint8))[1].tobytes()
+
+    def tearDown(self):
+        stream_states.discard(self.session.id)
+
+    def post_json(self, timestamp):
+        body = {
+            "session_id": self.session.id,
+            "timestamp": timestamp,
+            "frame": "data:image/jpeg;base64," + base64.b64encode(self.frame).decode(),
+        }
+        return self.client.post(reverse('analyze-frame'), json.dumps(body), content_type='application/json')
+
+    def test_json_string_timestamp(self):
+        self.assertEqual(self.post_json("10").status_code, 200)
+        self.assertEqual(self.post_json("11.5").status_code, 200)
+
+    def test_json_bad_timestamp(self):
+        self.assertEqual(self.post_json("soon").status_code, 400)
+        self.assertEqual(self.post_json(None).status_code, 400)
+        self.assertEqual(self.post_json("nan").status_code, 400)
+
+    def post_raw(self, timestamp):
+        url = reverse('analyze-frame') + f'?session_id={self.session.id}&timestamp={timestamp}'
+        return self.client.generic('POST', url, self.frame, content_type='image/jpeg')
+
+    def post_multipart(self, timestamp):
+        frame = SimpleUploadedFile('frame.jpg', self.frame, content_type='image/jpeg')
+        body = {"session_id": self.session.id, "timestamp": timestamp, "frame": frame}
+        return self.client.post(reverse('analyze-frame'), body, format='multipart')
+
+    def read(self, request):
+        request = Request(request, parsers=[MultiPartParser(), FormParser(), JSONParser()])
+        return read_frame_request(request)
+
+    def test_raw_frame(self):
+        self.assertEqual(self.post_raw(12).status_code, 200)
+
+        request = APIRequestFactory().generic(
+            'POST', f'/?session_id={self.session.id}&timestamp=12.5', self.frame, content_type='image/jpeg',
+        )
+        session_id, timestamp, frame_buffer, audio_bytes = self.read(request)
+        self.assertEqual((session_id, timestamp, audio_bytes), (str(self.session.id), 12.5, None))
+        self.assertEqual(bytes(frame_buffer), self.frame)
+
+    def test_raw_bad_timestamp(self):
+        self.assertEqual(self.post_raw('soon').status_code, 400)
+        self.assertEqual(self.post_raw('inf').status_code, 400)
+
+    def test_multipart_frame(self):
+        self.assertEqual(self.post_multipart(13).status_code, 200)
+
+        audio = SimpleUploadedFile('audio.webm', b'audio-bytes')
+        frame = SimpleUploadedFile('frame.jpg', self.frame, content_type='image/jpeg')
+        request = APIRequestFactory().post(
+            '/', {"session_id": self.session.id, "timestamp": "13.5", "frame": frame, "audio": audio},
+            format='multipart',
+        )
+        session_id, timestamp, frame_buffer, audio_bytes = self.read(request)
+        self.assertEqual((session_id, timestamp, audio_bytes), (str(self.session.id), 13.5, b'audio-bytes'))
+        self.assertEqual(bytes(frame_buffer), self.frame)
+
+    def test_multipart_bad_timestamp(self):
+        self.assertEqual(self.post_multipart('soon').status_code, 400)
+
+
+class ViolationFilterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reviewer', password='secret')
+        cls.session = ExamSession.objects.create(user=cls.user)
+        with ViolationSink(cls.session) as sink:
+            sink.add('eye', 1.0, "Looking away", 0.4)
+            sink.add('eye', 4.0, "Looking away", 0.9)
+            sink.add('audio', 12.0, "Voices", 0.7)
+            sink.add('object', 15.0, "Phone", 0.95)
+            sink.add('eye', 31.0, "Looking away", 0.6)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def violations(self, **params):
+        response = self.client.get(reverse('violation-list'), dict(params, session=self.session.id))
+        self.assertEqual(response.status_code, 200)
+        return [(violation['violation_type'], violation['timestamp']) for violation in response.data['results']]
+
+    def test_time_range(self):
+        self.assertEqual(self.violations(start=4, end=15), [('eye', 4.0), ('audio', 12.0)])
+
+    def test_type_and_confidence(self):
+        self.assertEqual(self.violations(type='eye,object', min_confidence=0.6),
+                         [('eye', 4.0), ('object', 15.0), ('eye', 31.0)])
+
+    def test_invalid_filters(self):
+        for params in ({'type': 'eye,gaze'}, {'start': 'soon'}):
+            response = self.client.get(reverse('violation-list'), dict(params, session=self.session.id))
+            self.assertEqual(response.status_code, 400)
+
+    def test_timeline(self):
+        with self.assertNumQueries(2):  # session exists, grouped counts
+            response = self.client.get(reverse('session-timeline', args=[self.session.id]), {'bucket': 10})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['t'], [0.0, 10.0, 30.0])
+        self.assertEqual(response.data['total'], [2, 2, 1])
+        self.assertEqual(response.data['counts']['eye'], [2, 0, 1])
+        self.assertEqual(response.data['counts']['audio'], [0, 1, 0])
+        self.assertEqual(response.data['max_confidence'], [0.9, 0.95, 0.6])
+
+    def test_timeline_filters(self):
+        response = self.client.get(reverse('session-timeline', args=[self.session.id]),
+                                   {'bucket': 5, 'type': 'eye', 'start': 2})
+        self.assertEqual(response.data['t'], [0.0, 30.0])
+        self.assertEqual(response.data['total'], [1, 1])
+        self.assertEqual(self.client.get(reverse('session-timeline', args=[self.session.id]),
+                                         {'bucket': 0}).status_code, 400)
+
+    def test_other_users_session_is_hidden(self):
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user('other', password='secret'))
+        self.assertEqual(other.get(reverse('session-timeline', args=[self.session.id])).status_code, 404)
+        response = other.get(reverse('violation-list'), {'session': self.session.id})
+        self.assertEqual(response.data['results'], [])
+
+    def test_timeline_rejects_infinite_bucket(self):
+        for bucket in ('inf', 'nan', '-1'):
+            response = self.client.get(reverse('session-timeline', args=[self.session.id]), {'bucket': bucket})
+            self.assertEqual(response.status_code, 400)
+
+
+class StreamHandshakeTests(TransactionTestCase):
+    def stream(self, path='/ws/proctoring/1/', headers=(), query=b'', messages=()):
+        """
+        Run one connection: connect, the given messages, then a disconnect once the server has answered them.
+        """
+        sent = []
+        pending = [{'type': 'websocket.connect'}] + [{'type': 'websocket.receive', 'bytes': data} for data in messages]
+        answers = len(messages)
+
+        async def receive():
+            if pending:
+                return pending.pop(0)
+            while sum(message['type'] != 'websocket.accept' for message in sent) < answers:
+                await asyncio.sleep(0.01)
+            return {'type': 'websocket.disconnect'}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {'type': 'websocket', 'path': path, 'headers': list(headers), 'query_string': query}
+        async_to_sync(websocket_application)(scope, receive, send)
+        return sent
+
+    def handshake(self, headers=(), query=b''):
+        return self.stream(headers=headers, query=query)[0]
+
+    def session_stream(self, session, *messages):
+        self.client.force_login(session.user)
+        cookie = f'{settings.SESSION_COOKIE_NAME}={self.client.cookies[settings.SESSION_COOKIE_NAME].value}'
+        return self.stream(f'/ws/proctoring/{session.id}/', [(b'cookie', cookie.encode())], messages=messages)
+
+    def setUp(self):
+        self.session = ExamSession.objects.create(user=User.objects.create_user('student', password='secret'))
+
+    def tearDown(self):
+        stream_states.discard(self.session.id)
+        session_owners.clear()
+
+    @override_settings(ALLOWED_HOSTS=['exam.example.com'], CSRF_TRUSTED_ORIGINS=['https://*.example.org'])
+    def test_origin(self):
+        self.assertTrue(origin_allowed('https://exam.example.com'))
+        self.assertTrue(origin_allowed('https://review.example.org'))
+        self.assertTrue(origin_allowed(None))
+        self.assertFalse(origin_allowed('https://evil.example.net'))
+        self.assertFalse(origin_allowed('null'))
+
+    @override_settings(ALLOWED_HOSTS=['exam.example.com'])
+    def test_cross_site_handshake_is_closed(self):
+        message = self.handshake(headers=[(b'origin', b'https://evil.example.net')])
+        self.assertEqual(message, {'type': 'websocket.close', 'code': 4403})
+
+    def test_bad_sample_rate_is_closed(self):
+        self.assertEqual(self.handshake(query=b'sample_rate=fast')['code'], 4400)
+        self.assertEqual(self.handshake(query=b'sample_rate=0')['code'], 4400)
+
+    def test_messages_keep_state_alive(self):
+        state = stream_states.get(self.session.id)
+        state.last_seen -= 10 * stream_states.ttl
+
+        analyze_message(self.session, KIND_AUDIO, 1.0, np.zeros(1600, np.int16).tobytes(), 16000)
+        self.assertGreater(state.last_seen, time.monotonic() - stream_states.ttl)
+
+    def test_stream_analyzes_audio(self):
+        sent = self.session_stream(self.session, HEADER.pack(KIND_AUDIO, 1.0) + np.zeros(1600, np.int16).tobytes())
+        self.assertEqual(sent[0], {'type': 'websocket.accept'})
+        result = json.loads(sent[1]['text'])
+        self.assertEqual((result['type'], result['kind'], result['violations']), ('result', 'audio', []))
+
+    def test_completed_session_is_refused(self):
+        self.session.is_completed = True
+        self.session.save()
+        self.assertEqual(self.session_stream(self.session), [{'type': 'websocket.close', 'code': 4409}])
+
+    def test_session_completed_mid_stream_rejects_messages(self):
+        # Cached as in progress, then completed through the API, which drops the cache entry
+        analyze_message(self.session, KIND_AUDIO, 1.0, np.zeros(1600, np.int16).tobytes(), 16000)
+        self.client.force_login(self.session.user)
+        self.client.patch(reverse('session-detail', args=[self.session.id]), {'is_completed': True},
+                          content_type='application/json')
+
+        with self.assertRaisesMessage(SessionClosed, "Session is completed"):
+            analyze_message(self.session, KIND_AUDIO, 2.0, np.zeros(1600, np.int16).tobytes(), 16000)
+
+    def test_stream_is_closed_when_session_completes(self):
+        ExamSession.objects.filter(id=self.session.id).update(is_completed=True)
+        session = ExamSession.objects.get(id=self.session.id)
+        session.is_completed = False  # as seen at the handshake
+
+        frame = cv2.imencode('.jpg', np.zeros((48, 64, 3), np.uint8))[1].tobytes()
+        connection = StreamConnection({'type': 'websocket', 'headers': []}, None, None, session.id)
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        async def run():
+            connection.send = send
+            connection.sample_rate = 16000
+            connection.enqueue(HEADER.pack(KIND_FRAME, 1.0) + frame)
+            await connection.analyze_loop(session)
+
+        async_to_sync(run)()
+        self.assertEqual(json.loads(sent[0]['text'])['error'], "Session is completed")
+        self.assertEqual(sent[1], {'type': 'websocket.close', 'code': 4409})
+        self.assertFalse(ViolationRecord.objects.filter(session=session).exists())
+
+
+class SessionStateStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.evicted = []
+        self.store = SessionStateStore(max_sessions=2, ttl=60, on_evict=lambda state: self.evicted.append(state.session_id))
+
+    def test_expired_states_are_evicted(self):
+        state = self.store.get(1)
+        state.last_seen -= 61
+        self.store.get(2)
+        self.assertEqual(self.evicted, [1])
+        self.assertIsNot(self.store.get(1), state)
+
+    def test_least_recently_used_is_evicted(self):
+        self.store.get(1)
+        self.store.get(2)
+        self.store.get(1)
+        self.store.get(3)
+        self.assertEqual(self.evicted, [2])
+        self.assertEqual(len(self.store), 2)
+
+    def test_discard(self):
+        self.store.get(1)
+        self.store.discard(1)
+        self.store.discard(1)
+        self.assertEqual(self.evicted, [1])
+        self.assertEqual(len(self.store), 0)
+
+
+class GazeStateTests(SimpleTestCase):
+    def feed(self, gaze, observations):
+        return [
+            [violation['kind'] for violation in gaze.update(observation, float(t))]
+            for t, observation in enumerate(observations)
+        ]
+
+    def test_look_away_timer(self):
+        gaze = GazeState(look_away_threshold=3)
+        kinds = self.feed(gaze, [GazeObservation(0)] * 5 + [GazeObservation(1)] + [GazeObservation(0)] * 3)
+        self.assertEqual(kinds, [[], [], [], ['look_away'], ['look_away'], [], [], [], []])
+
+        # A face resets the timer; the violation carries the look-away start
+        self.assertEqual(gaze.look_away_start, 6.0)
+        violation, = gaze.update(GazeObservation(0), 9.0)
+        self.assertEqual(violation['start'], 6.0)
+        self.assertEqual(violation['description'], "Looking away from screen for 3 seconds")
+
+    def test_enrolls_first_single_face(self):
+        gaze = GazeState()
+        encoding = np.arange(16, dtype=np.float32)
+        kinds = self.feed(gaze, [
+            GazeObservation(1),
+            GazeObservation(2),
+            GazeObservation(1, encoding=encoding),
+            GazeObservation(1, encoding=-encoding),
+        ])
+
+        self.assertEqual(kinds, [[], ['multiple_faces'], [], []])
+        self.assertEqual(gaze.enrolled_at, 2.0)
+        np.testing.assert_allclose(gaze.reference[0] @ gaze.reference[0], 1.0, rtol=1e-5)
+        self.assertGreater(float(gaze.reference[0] @ np.arange(16)), 0)
+
+    def test_face_mismatch(self):
+        gaze = GazeState(match_threshold=0.6)
+        gaze.enroll(np.arange(16, dtype=np.float32), 2.0)
+
+        kinds = self.feed(gaze, [
+            GazeObservation(1, match_scores=np.array([0.1])),
+            GazeObservation(1, match_scores=np.array([0.1])),
+            GazeObservation(1, match_scores=np.array([0.1])),
+            GazeObservation(1, match_scores=np.array([0.9])),
+            GazeObservation(2, match_scores=np.array([0.2, 0.8])),
+            GazeObservation(2, match_scores=np.array([0.2, 0.3])),
+        ])
+
+        # Frames before the enrollment are not compared; any matching face clears it
+        self.assertEqual(kinds, [
+            [], [], ['face_mismatch'], [], ['multiple_faces'], ['multiple_faces', 'face_mismatch'],
+        ])
+        violation, = gaze.update(GazeObservation(1, match_scores=np.array([0.1])), 6.0)
+        self.assertEqual(violation['confidence'], 0.9)
+
+
+class EventTrackerTests(SimpleTestCase):
+    def hit(self, description="Talking detected", kind=None, violation_type='lip'):
+        violation = {"type": violation_type, "description": description, "confidence": 0.5}
+        if kind is not None:
+            violation['kind'] = kind
+        return [violation]
+
+    def test_min_hits_opens_one_event(self):
+        tracker = EventTracker(gap=5, window=10, min_hits={'lip': 3})
+        self.assertEqual(tracker.update(0, self.hit()), ([], []))
+        self.assertEqual(tracker.update(1, self.hit()), ([], []))
+        opened, _ = tracker.update(2, self.hit())
+        self.assertEqual([(event['start'], event['hits']) for event in opened], [(0, 3)])
+        self.assertEqual(tracker.update(3, self.hit()), ([], []))
+
+    def test_hits_outside_window_do_not_count(self):
+        tracker = EventTracker(gap=5, window=10, min_hits={'lip': 2})
+        tracker.update(0, self.hit())
+        self.assertEqual(tracker.update(11, self.hit()), ([], []))
+
+    def test_gap_closes_event(self):
+        tracker = EventTracker(gap=5, window=10)
+        tracker.update(0, self.hit())
+        tracker.update(4, self.hit())
+        self.assertEqual(tracker.update(9, []), ([], []))
+        _, closed = tracker.update(9.5, [])
+        self.assertEqual([(event['start'], event['end'], event['hits']) for event in closed], [(0, 4, 2)])
+        opened, _ = tracker.update(10, self.hit())
+        self.assertEqual(len(opened), 1)
+
+    def test_look_away_event_spans_the_look_away(self):
+        gaze = GazeState(look_away_threshold=20)
+        tracker = EventTracker(gap=5, window=10)
+        opened = []
+        for t in range(0, 31):
+            opened.extend(tracker.update(float(t), [
+                dict(violation, type='eye') for violation in gaze.update(GazeObservation(0), float(t))
+            ])[0])
+        gaze.update(GazeObservation(1), 31.0)
+        _, closed = tracker.update(40.0, [])
+
+        self.assertEqual(len(opened), 1)
+        self.assertEqual(closed, opened)
+        self.assertEqual((opened[0]['start'], opened[0]['end'], opened[0]['hits']), (0.0, 30.0, 11))
+        self.assertEqual(opened[0]['description'], "Looking away from screen for 20 seconds")
+
+    def test_changing_descriptions_of_one_kind_are_one_event(self):
+        tracker = EventTracker(gap=5, window=10)
+        opened, _ = tracker.update(0, self.hit("Multiple faces detected (2)", 'multiple_faces', 'eye'))
+        self.assertEqual(tracker.update(1, self.hit("Multiple faces detected (3)", 'multiple_faces', 'eye')), ([], []))
+        self.assertEqual(opened[0]['description'], "Multiple faces detected (2)")
+        self.assertEqual(opened[0]['hits'], 2)
+
+        closed = tracker.close_all()
+        self.assertEqual(closed, opened)
+        self.assertEqual(tracker.open_events, {})
+
+
+class JobRecoveryTests(TestCase):
+    def setUp(self):
+        session = ExamSession.objects.create(user=User.objects.create_user('student', password='secret'))
+        self.job = AnalysisJob.objects.create(session=session, video_file='analysis_jobs/exam.mp4')
+        claim_job(self.job.id)
+
+    def beat(self, seconds_ago, started_seconds_ago=None):
+        now = timezone.now()
+        AnalysisJob.objects.filter(id=self.job.id).update(
+            heartbeat_at=now - timedelta(seconds=seconds_ago),
+            started_at=now - timedelta(seconds=started_seconds_ago or seconds_ago),
+        )
+
+    def test_claim_records_the_worker(self):
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, 'running')
+        self.assertEqual(self.job.worker_id, worker_id())
+        self.assertIsNotNone(self.job.heartbeat_at)
+
+    def test_orphaned_job_is_queued_again(self):
+        self.beat(600)
+        with self.assertLogs('proctoring.jobs', 'INFO'):
+            self.assertEqual(recover_jobs(orphan_after=120), 1)
+        self.job.refresh_from_db()
+        self.assertEqual((self.job.status, self.job.started_at, self.job.worker_id, self.job.progress),
+                         ('queued', None, '', 0))
+
+    def test_long_job_with_heartbeat_is_kept(self):
+        self.beat(10, started_seconds_ago=3 * 3600)
+        self.assertEqual(recover_jobs(orphan_after=120), 0)
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, 'running')
+
+    def test_heartbeat_refreshes_jobs_running_here(self):
+        self.beat(600)
+        jobs._running.add(self.job.id)
+        try:
+            heartbeat()
+        finally:
+            jobs._running.discard(self.job.id)
+        self.assertEqual(recover_jobs(orphan_after=120), 0)
+
+
+class EventFramesTests(SimpleTestCase):
+    def observations(self, face_counts):
+        return [
+            {"timestamp": float(t), "gaze": GazeObservation(count), "mouth": None, "violations": []}
+            for t, count in enumerate(face_counts)
+        ]
+
+    def test_keeps_first_frame_of_each_event(self):
+        observations = self.observations([1, 0, 0, 0, 1, 1, 1, 1, 1, 1, 1, 0, 0])
+        frames = [np.full((4, 8, 3), t, np.uint8) for t in range(len(observations))]
+        EventFrames(max_width=4, gap=5).keep(frames, observations)
+
+        kept = [(observation['timestamp'], observation['frame_kinds']) for observation in observations
+                if 'frame' in observation]
+        self.assertEqual(kept, [(1.0, ['look_away']), (11.0, ['look_away'])])
+        self.assertEqual(observations[1]['frame'].shape, (2, 4, 3))
+
+    def test_violations_get_their_event_frame(self):
+        observations = self.observations([0] * 5)
+        EventFrames(gap=5).keep([np.full((4, 8, 3), t, np.uint8) for t in range(5)], observations)
+
+        violations = reduce_observations(observations, GazeState(look_away_threshold=3))
+        self.assertEqual([violation['timestamp'] for violation in violations], [3.0, 4.0])
+        self.assertEqual([violation['frame'][0, 0, 0] for violation in violations], [0, 0])
+
+
+def write_boundary_video(path, seconds=30, fps=10):
+    """
+    A faceless exam video with a phone held up from 8 s to 13 s, across the 10 s chunk boundary.
+
+    With no face, the look-away that starts at 0 s is reported from 20 s on,
+    so its event spans every chunk boundary.
+    """
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), fps, (320, 180))
+    for i in range(seconds * fps):
+        frame = np.full((180, 320, 3), 120, np.uint8)
+        # A moving block, so the change gate analyzes frames throughout
+        x = 10 + 4 * (i % 60)
+        frame[140:170, x:x + 20] = 60
+        if 8 * fps <= i < 13 * fps:
+            frame[40:80, 120:200] = 255
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+class ParallelVideoAnalysisTests(TestCase):
+    def analyze(self, path, workers):
+        gate_stats = ChangeGateStats()
+        violations = analyze_video_file(
+            path,
+            workers=workers,
+            chunk_seconds=10,
+            policy=settings.PROCTORING_SAMPLE_POLICY,
+            sample_options=settings.PROCTORING_SAMPLE_OPTIONS,
+            detector=settings.PROCTORING_OBJECT_DETECTOR,
+            detector_options=settings.PROCTORING_OBJECT_DETECTOR_OPTIONS,
+            gate_options=settings.PROCTORING_CHANGE_GATE,
+            gate_stats=gate_stats,
+            tracker_options=settings.PROCTORING_FACE_TRACKER,
+            enrollment_seconds=settings.PROCTORING_ENROLLMENT_SECONDS,
+            working_size=settings.PROCTORING_WORKING_SIZE,
+            event_frames={
+                'max_width': settings.PROCTORING_SCREENSHOT_MAX_WIDTH,
+                'gap': settings.PROCTORING_EVENT_GAP_SECONDS,
+            },
+        )
+        frames = [violation.pop('frame', None) for violation in violations]
+
+        # Written the way process_video writes them
+        session = ExamSession.objects.create(user=self.user)
+        with ViolationSink(session) as sink:
+            sink.extend(violations)
+        records = list(
+            ViolationRecord.objects.filter(session=session).order_by('id').values_list(
+                'violation_type', 'timestamp', 'end_timestamp', 'description', 'confidence',
+            )
+        )
+        return records, frames, gate_stats.analyzed
+
+    def assertSameFrames(self, frames, expected):
+        self.assertEqual([frame is None for frame in frames], [frame is None for frame in expected])
+        for frame, expected_frame in zip(frames, expected):
+            if expected_frame is not None:
+                np.testing.assert_array_equal(frame, expected_frame)
+
+    def test_parallel_matches_serial(self):
+        self.user = User.objects.create_user('student', password='secret')
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = write_boundary_video(os.path.join(tmpdir, 'exam.avi'))
+            serial_records, serial_frames, serial_analyzed = self.analyze(path, 1)
+            records, frames, analyzed = self.analyze(path, 2)
+
+        # The look-away event and the phone sightings both cross the 10 s boundary
+        self.assertIn(('eye', 0.0, 29.0, "Looking away from screen for 20 seconds", 0.7), serial_records)
+        phone = [record[1] for record in serial_records if record[3] == "Suspicious object detected: cell phone"]
+        self.assertEqual(phone, [8.0, 9.0, 10.0, 11.0, 12.0])
+
+        self.assertEqual((records, analyzed), (serial_records, serial_analyzed))
+        # Event frames are kept afresh in every chunk, in the serial path too
+        self.assertSameFrames(frames, serial_frames)
+        kept = [record[1] for record, frame in zip(serial_records, serial_frames) if frame is not None]
+        self.assertIn(8.0, kept)
+        self.assertIn(10.0, kept)
+
+
+class BrightBoxDetector:
+    """
+    Stands in for the face tracker: "detects" the bright box on the working image.
+    """
+
+    def update(self, context):
+        return [cv2.boundingRect(cv2.findNonZero((context.small_gray > 128).astype(np.uint8)))]
+
+
+class FrameContextTests(SimpleTestCase):
+    def setUp(self):
+        self.frame = np.zeros((720, 1280, 3), np.uint8)
+        self.frame[200:280, 400:560] = 255
+
+    def test_to_frame_scales_working_boxes(self):
+        context = FrameContext(self.frame, working_size=640)
+        self.assertEqual(context.scale, 0.5)
+        self.assertEqual(context.small.shape, (360, 640, 3))
+        np.testing.assert_array_equal(context.to_frame([[10, 20, 30, 41]]), [[20, 40, 60, 82]])
+
+        context = FrameContext(self.frame, working_size=None)
+        self.assertEqual(context.scale, 1.0)
+        self.assertIs(context.small, self.frame)
+        np.testing.assert_array_equal(context.to_frame([[10, 20, 30, 41]]), [[10, 20, 30, 41]])
+
+    def test_detections_map_to_full_frame(self):
+        for working_size in (320, 640, None):
+            context = FrameContext(self.frame, working_size=working_size, face_tracker=BrightBoxDetector())
+            np.testing.assert_array_equal(context.faces, [[400, 200, 160, 80]])
+
+            phones = [
+                result for result in ContourBackend().detect_batch([self.frame], [context])[0]
+                if result['class'] == 'cell phone'
+            ]
+            self.assertEqual(len(phones), 1)
+            np.testing.assert_allclose(phones[0]['bbox'], [400, 200, 160, 80], atol=8)
+
+
+def yolo_rows(*boxes):
+    """
+    YOLOv5 output rows for (cx, cy, w, h, objectness, class id, class score) boxes, in input pixels.
+    """
+    rows = np.zeros((len(boxes), 5 + len(COCO_CLASSES)), np.float32)
+    for row, (cx, cy, w, h, objectness, class_id, score) in zip(rows, boxes):
+        row[:5] = cx, cy, w, h, objectness
+        row[5 + class_id] = score
+    return rows
+
+
+PHONE, PERSON = COCO_CLASSES.index('cell phone'), COCO_CLASSES.index('person')
+
+
+class FixedBatchNet:
+    """
+    Stands in for a network exported with a batch size of 1.
+    """
+
+    def __init__(self, output):
+        self.output = output
+        self.batches = []
+
+    def setInput(self, blob):
+        self.blob = blob
+
+    def forward(self):
+        self.batches.append(len(self.blob))
+        if len(self.blob) != 1:
+            raise cv2.error("Fixed batch size")
+        return self.output[None]
+
+
+class ObjectDetectionTests(SimpleTestCase):
+    def setUp(self):
+        self.rows = yolo_rows(
+            (100, 100, 40, 20, 0.9, PHONE, 0.9),
+            (102, 100, 40, 20, 0.9, PHONE, 0.8),  # overlaps the first phone
+            (100, 100, 40, 20, 0.6, PERSON, 1.0),  # same box, another class
+            (250, 250, 40, 20, 0.1, PHONE, 0.9),  # below the score threshold
+        )
+        # Input pixels scale by 2 horizontally and 1.5 vertically
+        self.expected = [
+            {"class": "cell phone", "confidence": 0.81, "bbox": [160, 135, 80, 30]},
+            {"class": "person", "confidence": 0.6, "bbox": [160, 135, 80, 30]},
+        ]
+
+    def test_decode_yolov5_output(self):
+        detections = decode_yolo_output(self.rows, (480, 640, 3), 320, COCO_CLASSES, layout='yolov5')
+        self.assertEqual(detections, self.expected)
+
+    def test_decode_yolov8_output(self):
+        # Channels first, with the objectness folded into the class scores
+        output = np.delete(self.rows, 4, axis=1)
+        output[:, 4:] *= self.rows[:, 4:5]
+        detections = decode_yolo_output(output.T, (480, 640, 3), 320, COCO_CLASSES, layout='yolov8')
+        self.assertEqual(detections, self.expected)
+
+    def test_fixed_batch_model_falls_back_per_call(self):
+        net = FixedBatchNet(self.rows)
+        model_registry.registry.register('object_detector', lambda: net)
+        self.addCleanup(model_registry.registry.register, 'object_detector', model_registry._load_object_detector)
+
+        backend = DnnBackend(batch_size=4, input_size=320, layout='yolov5')
+        frames = [np.zeros((480, 640, 3), np.uint8)] * 3
+        self.assertEqual(backend.detect_batch(frames), [self.expected] * 3)
+        self.assertEqual(net.batches, [3, 1, 1, 1])
+        self.assertEqual(backend.batch_size, 4)
+
+
+class ChangeGateTests(SimpleTestCase):
+    def setUp(self):
+        self.frame = np.full((360, 640, 3), 100, np.uint8)
+
+    def decide(self, gate, frames):
+        return [gate.should_analyze(frame, float(t)) for t, frame in enumerate(frames)]
+
+    def test_identical_frames_are_skipped(self):
+        gate = ChangeGate()
+        self.assertEqual(self.decide(gate, [self.frame] * 4), [True, False, False, False])
+        self.assertEqual((gate.stats.frames, gate.stats.skipped, gate.stats.analyzed), (4, 3, 1))
+        self.assertEqual(gate.stats.skipped_fraction, 0.75)
+
+    def test_changed_frame_passes(self):
+        brighter = self.frame + np.uint8(10)
+        # A phone-sized object: too small to move the mean, but enough changed pixels
+        phone = self.frame.copy()
+        phone[100:140, 300:340] = 255
+
+        gate = ChangeGate()
+        self.assertEqual(self.decide(gate, [self.frame, brighter, brighter, phone, phone]),
+                         [True, True, False, True, False])
+        self.assertEqual((gate.stats.analyzed, gate.stats.skipped), (3, 2))
+
+    def test_drift_is_measured_from_the_last_analyzed_frame(self):
+        frames = [self.frame + np.uint8(2 * i) for i in range(5)]
+        self.assertEqual(self.decide(ChangeGate(), frames), [True, False, True, False, True])
+
+    def test_results_expire(self):
+        gate = ChangeGate(max_reuse_seconds=2.0)
+        self.assertEqual(self.decide(gate, [self.frame] * 5), [True, False, True, False, True])
+
+    def test_restart_analyzes_again(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'exam.avi')
+            writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 10, (160, 120))
+            for _ in range(60):
+                writer.write(np.full((120, 160, 3), 100, np.uint8))
+            writer.release()
+
+            observations = analyze_video_range(
+                path, sample_options={'rate': 1.0}, gate_options={}, restart_frames=[0, 30],
+            )
+
+        self.assertEqual([observation.get('reused', False) for observation in observations],
+                         [False, True, True, False, True, True])
+        stats = ChangeGateStats()
+        count_reused(observations, stats)
+        self.assertEqual((stats.analyzed, stats.skipped), (2, 4))
+
+
+class StubDetectorContext(FrameContext):
+    """
+    A FrameContext whose face detector reports a known box and counts its calls.
+    """
+
+    def __init__(self, frame, box, detections, face_tracker=None):
+        super().__init__(frame, working_size=None, face_tracker=face_tracker)
+        self.box = box
+        self.detections = detections
+
+    def detect_faces(self):
+        self.detections.append(self.box)
+        return np.array([self.box], np.int32)
+
+
+class FaceTrackerTests(SimpleTestCase):
+    def setUp(self):
+        # A textured 64x64 "face" on a plain background, moving 4 px right per frame
+        self.face = np.random.default_rng(0).integers(0, 255, (64, 64, 3), dtype=np.uint8)
+
+    def frame(self, x, y=100):
+        frame = np.full((360, 640, 3), 120, np.uint8)
+        frame[y:y + 64, x:x + 64] = self.face
+        return frame
+
+    def test_detects_every_interval_and_tracks_between(self):
+        tracker = FaceTracker(detect_interval=5)
+        detections = []
+        faces = []
+        for i in range(12):
+            box = (200 + 4 * i, 100, 64, 64)
+            faces.append(StubDetectorContext(self.frame(box[0]), box, detections, tracker).faces.tolist())
+
+        # Detection on frames 0, 5 and 10; template matching follows the face in between
+        self.assertEqual([box[0] for box in detections], [200, 220, 240])
+        self.assertEqual(faces, [[[200 + 4 * i, 100, 64, 64]] for i in range(12)])
+        self.assertEqual((tracker.detections, tracker.tracked), (3, 9))
+
+    def test_lost_face_is_detected_again(self):
+        tracker = FaceTracker(detect_interval=5)
+        detections = []
+        StubDetectorContext(self.frame(200), (200, 100, 64, 64), detections, tracker).faces
+        StubDetectorContext(self.frame(204), (204, 100, 64, 64), detections, tracker).faces
+        # The face jumps beyond the search margin, so tracking loses it
+        faces = StubDetectorContext(self.frame(400), (400, 100, 64, 64), detections, tracker).faces
+
+        self.assertEqual(faces.tolist(), [[400, 100, 64, 64]])
+        self.assertEqual(len(detections), 2)
+        self.assertEqual((tracker.detections, tracker.tracked), (2, 1))
+
+
+class FrameSourceTests(SimpleTestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        # 8 s at 10 fps: a static scene for 4 s, then a new brightness every frame
+        self.path = os.path.join(tmpdir.name, 'exam.avi')
+        writer = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*'MJPG'), 10, (64, 48))
+        for i in range(80):
+            writer.write(np.full((48, 64, 3), 100 if i < 40 else i * 37 % 256, np.uint8))
+        writer.release()
+
+    def sample(self, policy, start_frame=0, end_frame=None, **options):
+        with FrameSource(self.path, make_sampler(policy, **options), start_frame, end_frame) as source:
+            return list(source)
+
+    def test_fixed_rate(self):
+        frames = self.sample('fixed', rate=1.0)
+        self.assertEqual([idx for idx, _, _ in frames], list(range(0, 80, 10)))
+        self.assertEqual([timestamp for _, timestamp, _ in frames], [float(s) for s in range(8)])
+
+        frames = self.sample('fixed', rate=2.0)
+        self.assertEqual([idx for idx, _, _ in frames], list(range(0, 80, 5)))
+
+    def test_range_keeps_absolute_indices(self):
+        frames = self.sample('fixed', 15, 35, rate=1.0)
+        self.assertEqual([(idx, timestamp) for idx, timestamp, _ in frames], [(20, 2.0), (30, 3.0)])
+
+    def test_keyframe_honours_min_interval(self):
+        # Every MJPG frame is a key frame, so min_interval alone spaces them
+        frames = self.sample('keyframe', min_interval=0.5)
+        self.assertEqual([idx for idx, _, _ in frames], list(range(0, 80, 5)))
+
+    def test_adaptive_backs_off_on_static_scene(self):
+        frames = self.sample('adaptive', min_rate=0.5, max_rate=4.0)
+        self.assertEqual(
+            [idx for idx, _, _ in frames],
+            [0, 2, 6, 14, 30, 50] + list(range(52, 80, 2)),
+        )
+
+    def test_retrieved_frames_match_sequential_read(self):
+        capture = cv2.VideoCapture(self.path)
+        decoded = []
+        while True:
+            ret, frame = capture.read()
+            if not ret:
+                break
+            decoded.append(frame)
+        capture.release()
+
+        frames = self.sample('fixed', rate=2.0)
+        for idx, _, frame in frames:
+            np.testing.assert_array_equal(frame, decoded[idx])
+
+
+def face_landmarks():
+    """
+    68 landmarks with a mouth of MAR 0.3.
+    """
+    points = np.zeros((68, 2), np.float32)
+    points[[48, 54, 50, 58, 52, 56]] = [(0, 0), (10, 0), (3, -2), (3, 2), (7, -1), (7, 1)]
+    return points
+
+
+class FaceRatioTests(SimpleTestCase):
+    def test_mouth_aspect_ratio(self):
+        self.assertAlmostEqual(float(mouth_aspect_ratio(face_landmarks())), 0.3, places=5)
+
+    def test_padded_faces_are_nan(self):
+        stacked = stack_landmarks([[face_landmarks(), face_landmarks()], None])
+        ratios = mouth_aspect_ratio(stacked)
+        self.assertEqual(ratios.shape, (2, 2))
+        np.testing.assert_allclose(ratios[0], [0.3, 0.3], rtol=1e-5)
+        self.assertTrue(np.isnan(ratios[1]).all())
+
+    def test_hysteresis_switches_on_and_off(self):
+        hysteresis = RatioHysteresis(0.5, 0.4, time_constant=0)
+        states = [hysteresis.update(value, t)[0] for t, value in enumerate([0.45, 0.55, 0.45, 0.35, 0.45, 0.6])]
+        self.assertEqual(states, [False, True, True, False, False, True])
+        self.assertEqual(hysteresis.update(None, 6), (False, None))
+
+    def test_smoothing_does_not_depend_on_rate(self):
+        slow = RatioHysteresis(0.5, 0.4, time_constant=1.0)
+        fast = RatioHysteresis(0.5, 0.4, time_constant=1.0)
+        slow.update(0.0, 0.0)
+        fast.update(0.0, 0.0)
+        fast.update(1.0, 0.5)
+        self.assertAlmostEqual(slow.update(1.0, 1.0)[1], fast.update(1.0, 1.0)[1])
+
+
+class MergeBurstsTests(SimpleTestCase):
+    def test_bursts_become_one_violation(self):
+        talking = "Significant lip movement detected (possibly talking)"
+        violations = [
+            {"type": 'lip', "timestamp": 1.0, "description": talking, "confidence": 0.6, "start": 1.0},
+            {"type": 'eye', "timestamp": 2.0, "description": "Multiple faces detected (2)", "confidence": 0.8},
+            {"type": 'lip', "timestamp": 2.0, "description": talking, "confidence": 0.9, "start": 1.0},
+            {"type": 'lip', "timestamp": 3.0, "description": talking, "confidence": 0.7, "start": 1.0},
+            {"type": 'lip', "timestamp": 6.0, "description": talking, "confidence": 0.5, "start": 6.0},
+        ]
+        merged = merge_bursts(violations)
+        self.assertEqual(
+            [(violation['type'], violation['timestamp'], violation.get('end_timestamp'), violation['confidence'])
+             for violation in merged],
+            [('lip', 1.0, 3.0, 0.9), ('eye', 2.0, None, 0.8), ('lip', 6.0, 6.0, 0.5)],
+        )
+
+
+class ModelRegistryTests(SimpleTestCase):
+    def instances(self, registry, name):
+        seen = []
+
+        def borrow():
+            with registry.use(name) as model:
+                seen.append(model)
+                seen.append(registry.get(name))
+
+        threads = [threading.Thread(target=borrow) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return seen
+
+    def test_shared_model(self):
+        registry = ModelRegistry()
+        registry.register('model', object)
+        self.assertEqual(len({id(model) for model in self.instances(registry, 'model')}), 1)
+
+    def test_per_thread_model(self):
+        registry = ModelRegistry()
+        registry.register('model', object, per_thread=True)
+        first, again, second, second_again = self.instances(registry, 'model')
+        self.assertIs(first, again)
+        self.assertIs(second, second_again)
+        self.assertIsNot(first, second)
+        self.assertFalse(registry.is_loaded('model'))
+        self.assertIn('model', registry.stats())
+
+
+class AudioFeaturesTests(SimpleTestCase):
+    def signal(self, sr, seconds=2.0, seed=0):
+        rng = np.random.default_rng(seed)
+        t = np.arange(int(sr * seconds)) / sr
+        tones = 0.3 * np.sin(2 * np.pi * 440 * t) + 0.2 * np.sin(2 * np.pi * 1250 * t) * (t > seconds / 2)
+        return (tones + 0.05 * rng.standard_normal(len(t))).astype(np.float32)
+
+    def test_features_match_librosa(self):
+        for sr in (16000, 22050, 44100):
+            with self.subTest(sr=sr):
+                y = self.signal(sr)
+                features = AudioFeatures(y, sr)
+                np.testing.assert_allclose(features.centroid, librosa.feature.spectral_centroid(y=y, sr=sr)[0],
+                                           rtol=1e-4)
+                np.testing.assert_allclose(features.bandwidth, librosa.feature.spectral_bandwidth(y=y, sr=sr)[0],
+                                           rtol=1e-4)
+                np.testing.assert_allclose(features.contrast, librosa.feature.spectral_contrast(y=y, sr=sr),
+                                           rtol=1e-4, atol=1e-3)
+                np.testing.assert_allclose(features.onset_strength, librosa.onset.onset_strength(y=y, sr=sr),
+                                           rtol=1e-4, atol=1e-4)
+                np.testing.assert_allclose(features.mfcc(13), librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13),
+                                           rtol=1e-4, atol=1e-3)
+
+
+def silence_and_tone(sr, seconds=6):
+    """
+    Silence with a 440 Hz tone from 2 s to 4 s.
+    """
+    t = np.arange(int(sr * seconds)) / sr
+    return (0.5 * np.sin(2 * np.pi * 440 * t) * ((t >= 2) & (t < 4))).astype(np.float32)
+
+
+def write_exam_video_with_audio(path, sr=16000, seconds=6, fps=10):
+    """
+    A static MJPEG video with a PCM soundtrack of silence_and_tone, in Matroska.
+    """
+    samples = (silence_and_tone(sr, seconds) * 32767).astype(np.int16)
+    with av.open(path, 'w') as container:
+        video = container.add_stream('mjpeg', rate=fps)
+        video.width, video.height, video.pix_fmt = 160, 120, 'yuvj420p'
+        audio = container.add_stream('pcm_s16le', rate=sr)
+        audio.layout = 'mono'
+
+        frame = av.VideoFrame.from_ndarray(np.full((120, 160, 3), 120, np.uint8), format='bgr24')
+        for _ in range(seconds * fps):
+            container.mux(video.encode(frame))
+        for start in range(0, len(samples), sr // 10):
+            audio_frame = av.AudioFrame.from_ndarray(samples[None, start:start + sr // 10], format='s16',
+                                                     layout='mono')
+            audio_frame.sample_rate = sr
+            container.mux(audio.encode(audio_frame))
+        container.mux(video.encode())
+        container.mux(audio.encode())
+    return path
+
+
+class AudioDecodeTests(SimpleTestCase):
+    def setUp(self):
+        t = np.arange(22050) / 22050
+        self.samples = (0.5 * np.sin(2 * np.pi * 440 * t) * 32767).astype(np.int16)
+
+    def test_wav_bytes(self):
+        # Stereo, with the right channel silent, is averaged to mono
+        buffer = io.BytesIO()
+        sf.write(buffer, np.stack([self.samples, np.zeros_like(self.samples)], axis=1), 22050,
+                 format='WAV', subtype='PCM_16')
+
+        y, sr = load_audio(buffer.getvalue())
+        self.assertEqual((sr, y.dtype, len(y)), (22050, np.float32, 22050))
+        np.testing.assert_allclose(y, self.samples / 65536.0, atol=1e-6)
+
+    def test_pcm16_bytes(self):
+        y, sr = load_audio(self.samples.astype('<i2').tobytes(), sr=22050)
+        self.assertEqual((sr, y.dtype), (22050, np.float32))
+        np.testing.assert_array_equal(y, self.samples / np.float32(32768.0))
+
+    def test_container_libsndfile_cannot_read(self):
+        # Matroska goes through the PyAV fallback
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = write_exam_video_with_audio(os.path.join(tmpdir, 'exam.mkv'), seconds=3)
+            with open(path, 'rb') as f:
+                y, sr = load_audio(f.read())
+
+        self.assertEqual((sr, y.dtype, len(y)), (16000, np.float32, 48000))
+        np.testing.assert_allclose(y, silence_and_tone(16000, seconds=3), atol=1e-4)
+
+
+class AudioStreamTests(SimpleTestCase):
+    def test_windows_from_uneven_blocks(self):
+        samples = np.arange(25, dtype=np.float32)
+        blocks = np.split(samples, [7, 10, 20])
+
+        windows = list(iter_windows(blocks, 6))
+        self.assertEqual([len(window) for window in windows], [6, 6, 6, 6, 1])
+        # Consecutive, non-overlapping windows: each starts one window after the last
+        self.assertEqual([window[0] for window in windows], [0, 6, 12, 18, 24])
+        np.testing.assert_array_equal(np.concatenate(windows), samples)
+
+        # No empty window after an exact multiple
+        self.assertEqual([len(window) for window in iter_windows(np.split(samples[:24], 3), 6)], [6] * 4)
+
+    def test_stream_wav_file(self):
+        sr = 16000
+        y = silence_and_tone(sr, seconds=3)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'exam.wav')
+            sf.write(path, y, sr, subtype='PCM_16')
+
+            stream_sr, blocks = open_audio_stream(path, block_seconds=0.25)
+            blocks = list(blocks)
+            resampled_sr, resampled = open_audio_stream(path, sr=8000, block_seconds=0.25)
+            resampled = np.concatenate(list(resampled))
+            windows = list(iter_windows(open_audio_stream(path, block_seconds=0.25)[1], int(1.25 * sr)))
+
+        self.assertEqual(stream_sr, sr)
+        self.assertEqual([len(block) for block in blocks], [4000] * 12)
+        np.testing.assert_allclose(np.concatenate(blocks), y, atol=1e-4)
+
+        self.assertEqual(resampled_sr, 8000)
+        self.assertEqual(len(resampled), 24000)
+
+        # 3 s in 1.25 s windows: two whole windows and a 0.5 s remainder
+        self.assertEqual([len(window) for window in windows], [20000, 20000, 8000])
+
+    def test_stream_video_soundtrack(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = write_exam_video_with_audio(os.path.join(tmpdir, 'exam.mkv'), seconds=3)
+            sr, blocks = open_audio_stream(path, sr=16000)
+            windows = list(iter_windows(blocks, 16000))
+
+        self.assertEqual(sr, 16000)
+        self.assertEqual([len(window) for window in windows], [16000] * 3)
+        np.testing.assert_allclose(np.concatenate(windows), silence_and_tone(16000, seconds=3), atol=1e-4)
+
+
+class AudioGateTests(SimpleTestCase):
+    def test_voice_activity_segments(self):
+        sr = 16000
+        # Active segments are extended by the 13-frame (0.26 s) hangover on each side
+        self.assertEqual(detect_voice_activity(silence_and_tone(sr), sr), [
+            (0, 27840, 'silence'),
+            (27840, 68160, 'speech'),
+            (68160, 96000, 'silence'),
+        ])
+
+    def test_skipped_fraction(self):
+        stats = AudioGateStats()
+        analyze_audio(silence_and_tone(16000), sr=16000, stats=stats)
+        self.assertAlmostEqual(stats.total_seconds, 6.0)
+        self.assertAlmostEqual(stats.seconds['speech'], 2.52)
+        self.assertAlmostEqual(stats.skipped_fraction, 3.48 / 6.0)
+
+
+class AnalysisJobResultTests(TransactionTestCase):
+    def test_job_records_skipped_audio(self):
+        session = ExamSession.objects.create(user=User.objects.create_user('student', password='secret'))
+        with tempfile.TemporaryDirectory() as media_root:
+            os.makedirs(os.path.join(media_root, 'analysis_jobs'))
+            write_exam_video_with_audio(os.path.join(media_root, 'analysis_jobs', 'exam.mkv'))
+            job = AnalysisJob.objects.create(session=session, video_file='analysis_jobs/exam.mkv')
+
+            with override_settings(MEDIA_ROOT=media_root, PROCTORING_VIDEO_WORKERS=1,
+                                   PROCTORING_SCREENSHOTS=False):
+                job = jobs.run_job(job.id)
+
+        self.assertEqual(job.status, 'completed')
+        job.refresh_from_db()
+        self.assertAlmostEqual(job.audio_skipped, 3.48 / 6.0)
+        self.assertEqual(job.frames_analyzed + job.frames_skipped, 6)
@@ -1,53 +1,92 @@
+from django.conf import settings
+from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.db.models import Count, F, Max
+from django.db.models.functions import Floor
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from rest_framework import generics
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import ValidationError
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.settings import api_settings
 import json
+import math
 import cv2
 import numpy as np
 import base64
-import tempfile
-import os
 
-from .models import ExamSession, ViolationRecord
-from .serializers import ExamSessionSerializer, ViolationRecordSerializer
-from proctoring_system.utils.eye_tracking import analyze_eye_movements
+from .authentication import StreamTokenAuthentication, make_stream_token
+from .filters import VIOLATION_TYPES, filter_violations
+from .jobs import enqueue_analysis
+from .models import AnalysisJob, ExamSession, ViolationRecord
+from .pagination import SessionCursorPagination, ViolationCursorPagination
+from .screenshots import capture_video_screenshots, screenshot_writer
+from .serializers import AnalysisJobSerializer, ExamSessionSerializer, ViolationRecordSerializer
+from .session_state import end_session_stream, get_owned_session, record_stream_violations, stream_states
+from .sinks import ViolationSink, get_violation_summary
 from proctoring_system.utils.audio_analysis import analyze_audio
-from proctoring_system.utils.object_detection import detect_objects
-from proctoring_system.utils.lip_movement import analyze_lip_movements
+from proctoring_system.utils.object_detection import make_backend
+from proctoring_system.utils.video_analysis import analyze_frame_violations, analyze_video_file
 
 class ExamSessionListCreate(generics.ListCreateAPIView):
-    queryset = ExamSession.objects.all()
+    queryset = ExamSession.objects.with_violation_counts()
     serializer_class = ExamSessionSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = SessionCursorPagination
     
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
 class ExamSessionDetail(generics.RetrieveUpdateDestroyAPIView):
-    queryset = ExamSession.objects.all()
+    queryset = ExamSession.objects.with_violation_counts()
     serializer_class = ExamSessionSerializer
     permission_classes = [IsAuthenticated]
+    
+    def perform_update(self, serializer):
+        session = serializer.save()
+        if session.is_completed:
+            # Close any open live violation events for the finished exam
+            end_session_stream(session.id)
+    
+    def perform_destroy(self, instance):
+        end_session_stream(instance.id)
+        instance.delete()
 
 class ViolationList(generics.ListAPIView):
     serializer_class = ViolationRecordSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = ViolationCursorPagination
     
     def get_queryset(self):
+        violations = ViolationRecord.objects.filter(session__user=self.request.user)
         session_id = self.request.query_params.get('session', None)
         if session_id is not None:
-            return ViolationRecord.objects.filter(session_id=session_id)
-        return ViolationRecord.objects.filter(session__user=self.request.user)
+            violations = violations.filter(session_id=session_id)
+        # Narrow by ?start=&end=&type=&min_confidence= (see filter_violations)
+        return filter_violations(violations, self.request.query_params)
+
+class AnalysisJobDetail(generics.RetrieveAPIView):
+    serializer_class = AnalysisJobSerializer
+    permission_classes = [IsAuthenticated]
+    
+    def get_queryset(self):
+        return AnalysisJob.objects.filter(session__user=self.request.user)
+
+class SessionAnalysisJobList(generics.ListAPIView):
+    serializer_class = AnalysisJobSerializer
+    permission_classes = [IsAuthenticated]
+    
+    def get_queryset(self):
+        return AnalysisJob.objects.filter(session_id=self.kwargs['pk'], session__user=self.request.user)
 
 @csrf_exempt
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def analyze_video(request):
     """
-    Endpoint to analyze uploaded video files for proctoring
+    Endpoint to queue an uploaded video file for proctoring analysis
     """
     try:
         if 'video_file' not in request.FILES:
@@ -56,12 +95,6 @@ def analyze_video(request):
         video_file = request.FILES['video_file']
         session_id = request.data.get('session_id')
         
-        # Save the video temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as temp_video:
-            for chunk in video_file.chunks():
-                temp_video.write(chunk)
-            temp_video_path = temp_video.name
-        
         # Create or get exam session
         if session_id:
             try:
@@ -70,191 +103,363 @@ def analyze_video(request):
                 return Response({"error": "Invalid session ID"}, status=status.HTTP_404_NOT_FOUND)
         else:
             session = ExamSession.objects.create(user=request.user)
-            session.video_file = video_file
-            session.save()
         
-        # Process the video file
-        violations = process_video(temp_video_path, session)
+        # Store the upload and queue the analysis; it runs outside this request
+        job = enqueue_analysis(session, video_file)
         
-        # Clean up the temporary file
-        os.unlink(temp_video_path)
+        if not session.video_file:
+            session.video_file = job.video_file.name
+            session.save(update_fields=['video_file'])
         
-        # Return the analysis results
         return Response({
+            "job_id": job.id,
             "session_id": session.id,
-            "violations_count": len(violations),
-            "violations": ViolationRecordSerializer(violations, many=True).data,
-            "is_eligible": len(violations) < 6
-        })
+            "status": job.status
+        }, status=status.HTTP_202_ACCEPTED)
     
     except Exception as e:
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def stream_token(request, pk):
+    """
+    Endpoint issuing a signed token for sending a session's live frames
+    
+    Frame requests with `Authorization: Stream <token>` skip session/Basic authentication.
+    """
+    session = get_owned_session(pk, request.user.id)
+    if session is None:
+        return Response({"error": "Invalid session ID"}, status=status.HTTP_404_NOT_FOUND)
+    if session.is_completed:
+        return Response({"error": "Session is completed"}, status=status.HTTP_409_CONFLICT)
+    
+    return Response({
+        "session_id": session.id,
+        "token": make_stream_token(session),
+        "expires_in": settings.PROCTORING_STREAM_TOKEN_MAX_AGE
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def session_timeline(request, pk):
+    """
+    Endpoint returning a session's violations counted per time bucket, as columnar arrays
+    
+    Accepts the violation list filters (start, end, type, min_confidence) and `bucket`, the
+    bucket width in seconds. Only buckets with violations are listed: `t` holds their start
+    times, and `total`, `max_confidence` and each type in `counts` hold one value per bucket.
+    Violations are counted in the bucket of their start timestamp.
+    """
+    try:
+        bucket = float(request.query_params.get('bucket', settings.PROCTORING_TIMELINE_BUCKET_SECONDS))
+    except ValueError:
+        return Response({"error": "Invalid bucket width"}, status=status.HTTP_400_BAD_REQUEST)
+    if not (math.isfinite(bucket) and bucket > 0):
+        return Response({"error": "Invalid bucket width"}, status=status.HTTP_400_BAD_REQUEST)
+    
+    if not ExamSession.objects.filter(id=pk, user=request.user).exists():
+        return Response({"error": "Invalid session ID"}, status=status.HTTP_404_NOT_FOUND)
+    
+    # One grouped query; rows are (bucket, type) pairs, not violations
+    violations = filter_violations(ViolationRecord.objects.filter(session_id=pk), request.query_params)
+    rows = (
+        violations.annotate(bucket=Floor(F('timestamp') / bucket))
+        .values('bucket', 'violation_type')
+        .annotate(count=Count('id'), max_confidence=Max('confidence'))
+        .order_by('bucket')
+    )
+    
+    return Response(dict(timeline_columns(rows, bucket), session_id=pk))
+
+def timeline_columns(rows, bucket):
+    """
+    Pivot (bucket, violation_type, count, max_confidence) rows into one array per column
+    """
+    positions = {}
+    timeline = {
+        "bucket_seconds": bucket,
+        "t": [],
+        "total": [],
+        "max_confidence": [],
+        "counts": {violation_type: [] for violation_type in VIOLATION_TYPES},
+    }
+    
+    for row in rows:
+        i = positions.get(row['bucket'])
+        if i is None:
+            i = positions[row['bucket']] = len(timeline['t'])
+            timeline['t'].append(row['bucket'] * bucket)
+            timeline['total'].append(0)
+            timeline['max_confidence'].append(0.0)
+            for counts in timeline['counts'].values():
+                counts.append(0)
+        
+        timeline['counts'][row['violation_type']][i] += row['count']
+        timeline['total'][i] += row['count']
+        timeline['max_confidence'][i] = round(max(timeline['max_confidence'][i], row['max_confidence']), 3)
+    
+    return timeline
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def analysis_job_result(request, pk):
+    """
+    Endpoint to fetch the analysis results of a finished job
+    """
+    try:
+        job = AnalysisJob.objects.select_related('session').get(id=pk, session__user=request.user)
+    except AnalysisJob.DoesNotExist:
+        return Response({"error": "Invalid job ID"}, status=status.HTTP_404_NOT_FOUND)
+    
+    if job.status != 'completed':
+        return Response(AnalysisJobSerializer(job).data, status=status.HTTP_409_CONFLICT)
+    
+    violations = ViolationRecord.objects.filter(session=job.session)
+    summary = get_violation_summary(job.session_id)
+    return Response({
+        "job_id": job.id,
+        "session_id": job.session_id,
+        "violations_count": summary.total,
+        "violations": ViolationRecordSerializer(violations, many=True).data,
+        "is_eligible": summary.is_eligible
+    })
+
+# Content types accepted as a bare encoded frame in the request body
+RAW_FRAME_TYPES = ('image/jpeg', 'image/png', 'application/octet-stream')
+
+def upload_buffer(upload):
+    """
+    Return the bytes of an uploaded file, without copying when it is held in memory
+    """
+    if isinstance(upload, InMemoryUploadedFile):
+        return upload.file.getbuffer()
+    return upload.read()
+
+def read_timestamp(value):
+    """
+    Timestamp of a frame request in seconds, from a number or a numeric string
+    
+    Raises:
+        ValidationError: If it is not a finite number (a 400 response)
+    """
+    try:
+        timestamp = float(value)
+    except (TypeError, ValueError):
+        raise ValidationError({"timestamp": "Must be a number"})
+    if not math.isfinite(timestamp):
+        raise ValidationError({"timestamp": "Must be a number"})
+    return timestamp
+
+def read_frame_request(request):
+    """
+    Read the session, timestamp, encoded frame and audio of an analyze-frame request.
+    
+    Three body formats are accepted:
+        - A raw JPEG/PNG body, with session_id and timestamp in the query string
+        - multipart/form-data with a `frame` file, an optional `audio` file and
+          session_id/timestamp fields
+        - The original JSON body with base64 data URLs in `frame` and `audio`
+    
+    The raw and multipart frames are returned as buffers over the request data,
+    so they can be decoded without an intermediate copy.
+    
+    Returns:
+        Tuple of (session_id, timestamp, frame buffer or None, audio bytes or None)
+    
+    Raises:
+        ValidationError: If the timestamp is not a number
+    """
+    content_type = request.content_type.split(';')[0].strip().lower()
+    
+    if content_type in RAW_FRAME_TYPES:
+        params = request.query_params
+        return params.get('session_id'), read_timestamp(params.get('timestamp', 0)), request.body, None
+    
+    if content_type == 'multipart/form-data':
+        frame_file = request.FILES.get('frame')
+        audio_file = request.FILES.get('audio')
+        return (
+            request.data.get('session_id'),
+            read_timestamp(request.data.get('timestamp', 0)),
+            upload_buffer(frame_file) if frame_file else None,
+            audio_file.read() if audio_file else None,
+        )
+    
+    data = json.loads(request.body)
+    frame_data = data.get('frame')  # Base64 encoded image
+    audio_data = data.get('audio')  # Base64 encoded audio chunk
+    return (
+        data.get('session_id'),
+        read_timestamp(data.get('timestamp', 0)),
+        base64.b64decode(frame_data.split(',')[1]) if frame_data else None,
+        base64.b64decode(audio_data.split(',')[1]) if audio_data else None,
+    )
+
+def decode_frame(buffer):
+    """
+    Decode an encoded image straight from a bytes-like buffer
+    """
+    return cv2.imdecode(np.frombuffer(buffer, np.uint8), cv2.IMREAD_COLOR)
+
 @csrf_exempt
 @api_view(['POST'])
+@authentication_classes([StreamTokenAuthentication, *api_settings.DEFAULT_AUTHENTICATION_CLASSES])
 @permission_classes([IsAuthenticated])
 def analyze_frame(request):
     """
     Endpoint to analyze a single frame from webcam
+    
+    Accepts a raw image body, a multipart upload or base64 JSON (see read_frame_request).
+    Besides the usual authentication, accepts `Authorization: Stream <token>` with a
+    token from the stream-token endpoint, which needs no database lookups.
     """
     try:
-        data = json.loads(request.body)
-        session_id = data.get('session_id')
-        frame_data = data.get('frame')  # Base64 encoded image
-        timestamp = data.get('timestamp', 0)
-        audio_data = data.get('audio')  # Base64 encoded audio chunk
+        session_id, timestamp, frame_buffer, audio_bytes = read_frame_request(request)
         
-        # Get or create session
+        # A stream token is bound to one session, which must still be in progress
+        token_session_id = getattr(request.user, 'stream_session_id', None)
+        if token_session_id is not None:
+            if session_id and str(session_id) != str(token_session_id):
+                return Response({"error": "Stream token is for another session"}, status=status.HTTP_403_FORBIDDEN)
+            session_id = token_session_id
+        
+        # Get or create session; ownership is cached briefly per process
         if session_id:
-            try:
-                session = ExamSession.objects.get(id=session_id, user=request.user)
-            except ExamSession.DoesNotExist:
+            session = get_owned_session(session_id, request.user.id)
+            if session is None:
                 return Response({"error": "Invalid session ID"}, status=status.HTTP_404_NOT_FOUND)
+            if token_session_id is not None and session.is_completed:
+                return Response({"error": "Session is completed"}, status=status.HTTP_403_FORBIDDEN)
         else:
             session = ExamSession.objects.create(user=request.user)
         
-        violations = []
+        detections = []
+        frame = None
+        state = stream_states.get(session.id)
         
         # Process video frame
-        if frame_data:
-            # Convert base64 to image
-            img_data = base64.b64decode(frame_data.split(',')[1])
-            nparr = np.frombuffer(img_data, np.uint8)
-            frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        if frame_buffer is not None:
+            frame = decode_frame(frame_buffer)
+            if frame is None:
+                return Response({"error": "Could not decode frame"}, status=status.HTTP_400_BAD_REQUEST)
             
             # Analyze the frame
-            violations.extend(analyze_frame_data(frame, session, timestamp))
+            detections.extend(analyze_frame_data(frame, state, timestamp))
         
-        # Process audio data
-        if audio_data:
-            # Convert base64 to audio
-            audio_bytes = base64.b64decode(audio_data.split(',')[1])
-            
-            # Save temporarily
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as temp_audio:
-                temp_audio.write(audio_bytes)
-                temp_audio_path = temp_audio.name
-            
-            # Analyze audio
-            audio_violations = analyze_audio(temp_audio_path, timestamp)
+        # Process audio data straight from memory
+        if audio_bytes:
+            audio_violations = analyze_audio(
+                audio_bytes, timestamp,
+                analysis_rate=settings.PROCTORING_AUDIO_ANALYSIS_RATE,
+                gate=settings.PROCTORING_AUDIO_VAD,
+            )
             for violation in audio_violations:
-                vr = ViolationRecord(
-                    session=session,
-                    violation_type='audio',
-                    timestamp=timestamp,
-                    description=violation['description'],
-                    confidence=violation['confidence']
-                )
-                vr.save()
-                violations.append(vr)
-            
-            # Clean up
-            os.unlink(temp_audio_path)
+                detections.append({
+                    "type": 'audio',
+                    "description": violation['description'],
+                    "confidence": violation['confidence']
+                })
+        
+        # Repeated detections are merged into events; only new events are written
+        with state.lock:
+            violations = record_stream_violations(state, session, timestamp, detections, frame=frame)
         
         return Response({
             "session_id": session.id,
             "violations_detected": len(violations) > 0,
             "violations": ViolationRecordSerializer(violations, many=True).data,
-            "total_violations": ViolationRecord.objects.filter(session=session).count()
+            "total_violations": get_violation_summary(session.id).total
         })
     
+    except ValidationError as e:
+        return Response({"error": e.detail}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-def process_video(video_path, session):
+def process_video(video_path, session, progress=None, gate_stats=None, audio_stats=None):
     """
     Process the entire video file and detect violations
-    """
-    violations = []
-    
-    # Open the video file
-    cap = cv2.VideoCapture(video_path)
     
-    # Get video properties
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    Frames skipped by the change gate are counted in `gate_stats` (a ChangeGateStats), and audio
+    skipped by the voice activity gate in `audio_stats` (an AudioGateStats), if given
+    """
+    # Analyze sampled frames, in parallel chunks when more than one worker is configured
+    frame_violations = analyze_video_file(
+        video_path,
+        workers=settings.PROCTORING_VIDEO_WORKERS,
+        chunk_seconds=settings.PROCTORING_VIDEO_CHUNK_SECONDS,
+        policy=settings.PROCTORING_SAMPLE_POLICY,
+        sample_options=settings.PROCTORING_SAMPLE_OPTIONS,
+        progress=progress,
+        detector=settings.PROCTORING_OBJECT_DETECTOR,
+        detector_options=settings.PROCTORING_OBJECT_DETECTOR_OPTIONS,
+        gate_options=settings.PROCTORING_CHANGE_GATE,
+        gate_stats=gate_stats,
+        tracker_options=settings.PROCTORING_FACE_TRACKER,
+        enrollment_seconds=settings.PROCTORING_ENROLLMENT_SECONDS,
+        working_size=settings.PROCTORING_WORKING_SIZE,
+        # Frames that open violation events are kept during the pass for screenshots
+        event_frames={
+            'max_width': settings.PROCTORING_SCREENSHOT_MAX_WIDTH,
+            'gap': settings.PROCTORING_EVENT_GAP_SECONDS,
+        } if settings.PROCTORING_SCREENSHOTS else None,
+    )
     
-    # Process frames at regular intervals (not every frame for efficiency)
-    sample_interval = int(fps)  # Process one frame per second
+    # Also analyze audio, decoded from the video a window at a time
+    audio_violations = analyze_audio(
+        video_path, 0,
+        window_seconds=settings.PROCTORING_AUDIO_WINDOW_SECONDS,
+        analysis_rate=settings.PROCTORING_AUDIO_ANALYSIS_RATE,
+        gate=settings.PROCTORING_AUDIO_VAD,
+        stats=audio_stats,
+    )
     
-    for frame_idx in range(0, frame_count, sample_interval):
-        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
-        ret, frame = cap.read()
-        
-        if not ret:
-            break
-        
-        # Calculate timestamp in seconds
-        timestamp = frame_idx / fps
-        
-        # Analyze the current frame
-        frame_violations = analyze_frame_data(frame, session, timestamp)
-        violations.extend(frame_violations)
-    
-    # Also analyze audio
-    audio_violations = analyze_audio(video_path, 0)
-    for violation in audio_violations:
-        vr = ViolationRecord(
-            session=session,
-            violation_type='audio',
-            timestamp=violation['timestamp'],
-            description=violation['description'],
-            confidence=violation['confidence']
-        )
-        vr.save()
-        violations.append(vr)
+    # Write all violations in one transaction once the analysis has finished
+    sink = ViolationSink(session)
+    frame_records = sink.extend(frame_violations)
+    sink.extend(audio_violations, violation_type='audio')
+    records = sink.flush()
     
-    # Clean up
-    cap.release()
+    # One screenshot per violation event, from the frames kept during the analysis, encoded in the background
+    capture_video_screenshots(frame_records, [violation.get('frame') for violation in frame_violations])
     
-    return violations
+    return records
+
+_object_backend = None
 
-def analyze_frame_data(frame, session, timestamp):
+def object_backend():
     """
-    Analyze a single frame for potential violations
+    The configured object detector backend, built once per process for live frames
     """
-    violations = []
-    
-    # Detect eye movements
-    eye_violations = analyze_eye_movements(frame)
-    for violation in eye_violations:
-        vr = ViolationRecord(
-            session=session,
-            violation_type='eye',
-            timestamp=timestamp,
-            description=violation['description'],
-            confidence=violation['confidence']
+    global _object_backend
+    if _object_backend is None:
+        _object_backend = make_backend(
+            settings.PROCTORING_OBJECT_DETECTOR, **settings.PROCTORING_OBJECT_DETECTOR_OPTIONS
         )
-        vr.save()
-        violations.append(vr)
-    
-    # Detect lip movements
-    lip_violations = analyze_lip_movements(frame)
-    for violation in lip_violations:
-        vr = ViolationRecord(
-            session=session,
-            violation_type='lip',
-            timestamp=timestamp,
-            description=violation['description'],
-            confidence=violation['confidence']
-        )
-        vr.save()
-        violations.append(vr)
-    
-    # Detect objects
-    object_violations = detect_objects(frame)
-    for violation in object_violations:
-        vr = ViolationRecord(
-            session=session,
-            violation_type='object',
-            timestamp=timestamp,
-            description=violation['description'],
-            confidence=violation['confidence']
+    return _object_backend
+
+def analyze_frame_data(frame, state, timestamp):
+    """
+    Analyze a single live frame against the session's stream state (gaze timers, reference face)
+    """
+    with state.lock:
+        return analyze_frame_violations(
+            frame, timestamp, gaze_state=state.gaze, object_backend=object_backend(),
+            change_gate=state.change_gate, face_tracker=state.face_tracker, lip_state=state.lip,
+            working_size=settings.PROCTORING_WORKING_SIZE,
         )
-        vr.save()
-        violations.append(vr)
-    
-    return violations
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def screenshot_metrics(request):
+    """
+    Endpoint reporting the screenshot writer's queue depth, counters and encode latency
+    """
+    writer = screenshot_writer()
+    if writer is None:
+        return Response({"enabled": False})
+    return Response(dict(writer.stats(), enabled=True))
 
 from django.shortcuts import render
 
@@ -2,6 +2,7 @@
 ASGI config for proctoring_system project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+WebSocket connections are served by ``proctoring.streaming``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
@@ -12,5 +13,20 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'proctoring_system.settings')
+# Server processes run the analysis job monitor (see PROCTORING_JOB_MONITOR)
+os.environ.setdefault('PROCTORING_JOB_MONITOR', '1')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up, since it uses the ORM
+from proctoring.streaming import websocket_application  # noqa: E402
+
+
+async def application(scope, receive, send):
+    """
+    Route WebSocket connections to the live proctoring stream, everything else to Django.
+    """
+    if scope['type'] == 'websocket':
+        await websocket_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
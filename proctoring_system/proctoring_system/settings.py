@@ -77,12 +77,54 @@ WSGI_APPLICATION = 'proctoring_system.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# PROCTORING_DB_ENGINE=postgres uses PostgreSQL (needs psycopg 3, and
+# psycopg_pool for PROCTORING_DB_POOL_SIZE); otherwise SQLite is tuned for
+# a single node: WAL lets readers run alongside the writer, writers wait up
+# to PROCTORING_DB_TIMEOUT seconds for the lock instead of failing with
+# "database is locked", and IMMEDIATE transactions take the write lock up
+# front so two writers never deadlock upgrading a read lock.
+PROCTORING_DB_ENGINE = os.environ.get('PROCTORING_DB_ENGINE', 'sqlite')
+PROCTORING_DB_TIMEOUT = float(os.environ.get('PROCTORING_DB_TIMEOUT', 20))
+
+if PROCTORING_DB_ENGINE == 'postgres':
+    # Connections per process held in the pool; 0 keeps one persistent connection per thread instead
+    PROCTORING_DB_POOL_SIZE = int(os.environ.get('PROCTORING_DB_POOL_SIZE', 0))
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('PROCTORING_DB_NAME', 'proctoring'),
+            'USER': os.environ.get('PROCTORING_DB_USER', 'proctoring'),
+            'PASSWORD': os.environ.get('PROCTORING_DB_PASSWORD', ''),
+            'HOST': os.environ.get('PROCTORING_DB_HOST', 'localhost'),
+            'PORT': os.environ.get('PROCTORING_DB_PORT', '5432'),
+            'CONN_MAX_AGE': 0 if PROCTORING_DB_POOL_SIZE else int(os.environ.get('PROCTORING_DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'connect_timeout': int(PROCTORING_DB_TIMEOUT),
+            },
+        }
     }
-}
+    if PROCTORING_DB_POOL_SIZE:
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': min(2, PROCTORING_DB_POOL_SIZE),
+            'max_size': PROCTORING_DB_POOL_SIZE,
+            'timeout': PROCTORING_DB_TIMEOUT,
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('PROCTORING_DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                'timeout': PROCTORING_DB_TIMEOUT,
+                'transaction_mode': 'IMMEDIATE',
+                'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+            },
+        }
+    }
+    if os.environ.get('PROCTORING_SQLITE_TUNING', '1') == '0':
+        # Stock SQLite settings, for comparison in `manage.py stress_db_writes`
+        DATABASES['default']['OPTIONS'] = {}
 
 
 # Password validation
@@ -141,4 +183,109 @@ REST_FRAMEWORK = {
         'rest_framework.authentication.SessionAuthentication',
         'rest_framework.authentication.BasicAuthentication',
     ],
-}
\ No newline at end of file
+}
+
+# Proctoring analysis pipeline
+
+# Frame sampling policy for uploaded videos: 'fixed', 'keyframe' or 'adaptive'
+PROCTORING_SAMPLE_POLICY = 'fixed'
+PROCTORING_SAMPLE_OPTIONS = {'rate': 1.0}  # Keyword arguments for the sampler
+
+# Worker processes for uploaded video analysis, and the length of each chunk
+PROCTORING_VIDEO_WORKERS = os.cpu_count() or 1
+PROCTORING_VIDEO_CHUNK_SECONDS = 60
+# Seconds from the start of an uploaded video searched for the candidate's
+# reference face before the analysis (None searches the whole video). Without
+# a single-face frame in that span, the video gets no face-mismatch checks
+PROCTORING_ENROLLMENT_SECONDS = 30
+
+# Object detector backend: 'contour' (heuristic, no model) or 'dnn' (YOLO model
+# from the PROCTORING_OBJECT_MODEL environment variable, run in batches)
+PROCTORING_OBJECT_DETECTOR = os.environ.get('PROCTORING_OBJECT_DETECTOR', 'contour')
+PROCTORING_OBJECT_DETECTOR_OPTIONS = {}  # e.g. {'batch_size': 8, 'input_size': 640, 'engine': 'onnxruntime'}
+
+# Longest side, in pixels, of the copy of each frame the face and object
+# detectors run on (0 runs them at full resolution). Boxes are mapped back to
+# the full frame, and landmarks and face crops use the full frame.
+PROCTORING_WORKING_SIZE = int(os.environ.get('PROCTORING_WORKING_SIZE', 640)) or None
+
+# Frames that look like the last analyzed frame reuse its results (ChangeGate
+# keyword arguments; None analyzes every frame). Thresholds are gray levels
+# of a 64x36 thumbnail. Uploaded videos restart the gate (and the face
+# tracker below) at every PROCTORING_VIDEO_CHUNK_SECONDS boundary, in the
+# serial path too, so results do not depend on the number of workers.
+PROCTORING_CHANGE_GATE = {
+    'mean_threshold': 3.0,  # mean difference that counts as a change
+    'pixel_threshold': 20,  # difference that counts a thumbnail pixel as changed...
+    'area_threshold': 0.002,  # ...and the fraction of changed pixels that counts as a change
+    'max_reuse_seconds': 10.0,  # re-analyze at least this often
+}
+
+# Faces are detected every `detect_interval` analyzed frames (or when one is
+# lost) and followed by template matching in between (FaceTracker keyword
+# arguments; None detects on every frame)
+PROCTORING_FACE_TRACKER = {
+    'detect_interval': 5,
+    'min_score': 0.6,  # match score below which a face is lost
+}
+
+# Recorded audio is analyzed in windows of this many seconds, each with its own verdict
+PROCTORING_AUDIO_WINDOW_SECONDS = 30.0
+# Audio is resampled to this rate before feature extraction (None keeps the
+# native rate). Spectral contrast needs at least 12800 Hz.
+PROCTORING_AUDIO_ANALYSIS_RATE = 16000
+# Skip the spectral analysis on silent audio (energy / zero-crossing voice activity gate)
+PROCTORING_AUDIO_VAD = True
+
+# Where queued video analysis jobs run: 'thread' runs them in a pool inside the
+# web process, 'database' leaves them for `manage.py run_analysis_worker`
+PROCTORING_JOB_BACKEND = os.environ.get('PROCTORING_JOB_BACKEND', 'thread')
+PROCTORING_JOB_THREADS = 2
+# Processes running jobs refresh their heartbeat this often; a running job
+# without one for PROCTORING_JOB_ORPHAN_SECONDS lost its process and is queued again
+PROCTORING_JOB_HEARTBEAT_SECONDS = 30
+PROCTORING_JOB_ORPHAN_SECONDS = 120
+# Start the job monitor (heartbeats, recovery and, for the 'thread' backend,
+# running queued jobs) in this process. wsgi.py and asgi.py turn it on, so
+# tests and management commands never start it
+PROCTORING_JOB_MONITOR = os.environ.get('PROCTORING_JOB_MONITOR', '0') == '1'
+
+# Cursor pagination of the session and violation lists (?page_size= up to the maximum)
+PROCTORING_PAGE_SIZE = 50
+PROCTORING_MAX_PAGE_SIZE = 500
+
+# Default bucket width in seconds of the session timeline endpoint
+PROCTORING_TIMELINE_BUCKET_SECONDS = 10
+
+# Sessions with more violations than this are not eligible
+PROCTORING_ELIGIBLE_MAX_VIOLATIONS = 5
+
+# Maximum rows per INSERT when flushing buffered violations
+PROCTORING_VIOLATION_BATCH_SIZE = 500
+
+# Live frame analysis keeps per-session state in memory (per process)
+PROCTORING_STREAM_MAX_SESSIONS = 10000
+PROCTORING_STREAM_STATE_TTL = 300  # seconds without frames before a session's state is dropped
+
+# Which user owns which session is cached per process for live frame requests
+PROCTORING_SESSION_CACHE_SIZE = 10000
+PROCTORING_SESSION_CACHE_TTL = 30  # seconds; bounds how long other processes may miss a completed session
+# Lifetime in seconds of the signed stream tokens accepted by analyze-frame instead of full authentication
+PROCTORING_STREAM_TOKEN_MAX_AGE = 4 * 60 * 60
+
+# Repeated detections are merged into one violation per event
+PROCTORING_EVENT_GAP_SECONDS = 5.0  # an event ends after this long without a detection
+PROCTORING_EVENT_WINDOW_SECONDS = 10.0
+PROCTORING_EVENT_MIN_HITS = {'lip': 2}  # detections within the window needed to open an event
+
+# Violation screenshots: one JPEG per violation event, encoded in background
+# threads and saved under MEDIA_ROOT/violation_screenshots/
+PROCTORING_SCREENSHOTS = True
+PROCTORING_SCREENSHOT_QUALITY = 80  # JPEG quality, 0-100
+PROCTORING_SCREENSHOT_MAX_WIDTH = 640  # screenshots are shrunk to at most this width (None keeps the frame size)
+PROCTORING_SCREENSHOT_THREADS = 1
+PROCTORING_SCREENSHOT_QUEUE = 32  # live screenshots waiting to be encoded before new ones are dropped
+
+# WebSocket stream (/ws/proctoring/<session_id>/, served by asgi.py)
+PROCTORING_STREAM_SAMPLE_RATE = 16000  # default PCM sample rate of audio chunks
+PROCTORING_STREAM_AUDIO_QUEUE = 8  # audio chunks waiting for analysis before the oldest is dropped
@@ -14,16 +14,24 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
+from django.conf.urls.static import static
 from django.urls import path
 from proctoring import views
 from proctoring.views import index
 urlpatterns = [
     path('sessions/', views.ExamSessionListCreate.as_view(), name='session-list-create'),
     path('sessions/<int:pk>/', views.ExamSessionDetail.as_view(), name='session-detail'),
+    path('sessions/<int:pk>/jobs/', views.SessionAnalysisJobList.as_view(), name='session-job-list'),
+    path('sessions/<int:pk>/stream-token/', views.stream_token, name='session-stream-token'),
+    path('sessions/<int:pk>/timeline/', views.session_timeline, name='session-timeline'),
     path('proctoring/analyze/', views.analyze_video, name='analyze-video'),
+    path('proctoring/jobs/<int:pk>/', views.AnalysisJobDetail.as_view(), name='analysis-job-detail'),
+    path('proctoring/jobs/<int:pk>/result/', views.analysis_job_result, name='analysis-job-result'),
     path('proctoring/analyze-frame/', views.analyze_frame, name='analyze-frame'),
     path('proctoring/violations/', views.ViolationList.as_view(), name='violation-list'),
-    path('api/sessions', views.sessions, name='sessions'),
+    path('proctoring/screenshots/metrics/', views.screenshot_metrics, name='screenshot-metrics'),
+    path('api/sessions', views.ExamSessionListCreate.as_view(), name='sessions'),
     path('', index, name='index'),
 ]
 
@@ -1,65 +1,464 @@
+import io
+import os
+
 import librosa
 import numpy as np
+import scipy.ndimage
+import soundfile as sf
+
+from proctoring_system.utils.audio_features import AudioFeatures, resample_blocks
+
+try:
+    import av
+except ImportError:
+    av = None
+
+# Long recordings are analyzed in windows of this length, each with its own verdict
+AUDIO_WINDOW_SECONDS = 30.0
 
-def analyze_audio(audio_path, start_timestamp=0):
+# Seconds of audio decoded at a time when streaming from a file
+AUDIO_BLOCK_SECONDS = 10.0
+
+# A trailing partial window shorter than this is not analyzed on its own
+MIN_WINDOW_SECONDS = 1.0
+
+# Voice activity gate: audio is classified in frames of this length, and only
+# non-silent segments go through the spectral analysis
+VAD_FRAME_SECONDS = 0.02
+SILENCE_RMS = 0.01  # about -40 dBFS
+SPEECH_MAX_ZCR = 0.2  # voiced speech crosses zero far less often than broadband noise
+VAD_HANGOVER_SECONDS = 0.25  # active segments are extended by this much on each side
+VAD_MIN_SILENCE_SECONDS = 1.0  # shorter pauses between active segments are analyzed with them
+
+def pcm16_to_float(data):
     """
-    Analyze audio for suspicious sounds like background voices, phone notifications, etc.
+    Convert little-endian 16-bit PCM bytes to float32 samples in [-1, 1).
+    """
+    return np.frombuffer(data, dtype='<i2').astype(np.float32) / 32768.0
+
+def to_mono(y):
+    """
+    Average (frames, channels) or (channels, frames) audio down to one channel.
+    """
+    y = np.asarray(y)
+    if y.ndim == 1:
+        return y
+    # soundfile returns (frames, channels); librosa uses (channels, frames)
+    channel_axis = 1 if y.shape[1] <= y.shape[0] else 0
+    return y.mean(axis=channel_axis)
+
+def _decode_container(data):
+    """
+    Decode an encoded audio file (WAV, FLAC, OGG, or WebM/MP4 with PyAV) held in memory.
+    """
+    try:
+        y, sr = sf.read(io.BytesIO(data), dtype='float32', always_2d=False)
+        return to_mono(y).astype(np.float32, copy=False), sr
+    except sf.LibsndfileError:
+        if av is None:
+            raise
+    # Browser recordings are usually WebM/Opus, which libsndfile can't read
+    with av.open(io.BytesIO(data)) as container:
+        return _decode_all(container)
+
+def _decode_blocks(container, sr):
+    """
+    Yield the first audio stream of an open PyAV container as mono float32 blocks at `sr`.
+    """
+    stream = container.streams.audio[0]
+    resampler = av.AudioResampler(format='flt', layout='mono', rate=sr)
+    
+    for frame in container.decode(stream):
+        for resampled in resampler.resample(frame):
+            yield resampled.to_ndarray().reshape(-1)
+    for resampled in resampler.resample(None):
+        yield resampled.to_ndarray().reshape(-1)
+
+def _decode_all(container, sr=None):
+    """
+    Decode the first audio stream of an open PyAV container to mono float32.
+    """
+    if not container.streams.audio:
+        return np.zeros(0, dtype=np.float32), sr or 0
+    
+    out_rate = sr or container.streams.audio[0].codec_context.sample_rate
+    chunks = list(_decode_blocks(container, out_rate))
+    if not chunks:
+        return np.zeros(0, dtype=np.float32), out_rate
+    return np.concatenate(chunks).astype(np.float32, copy=False), out_rate
+
+def _stream_container(path, sr):
+    with av.open(path) as container:
+        if container.streams.audio:
+            yield from _decode_blocks(container, sr)
+
+def open_audio_stream(path, sr=None, block_seconds=AUDIO_BLOCK_SECONDS):
+    """
+    Open an audio or video file for decoding a block at a time.
+    
+    Audio files libsndfile can read are streamed with soundfile (and resampled
+    with a streaming resampler if needed); anything else (e.g. the audio track
+    of a video) is streamed with PyAV when it is installed, and loaded whole
+    with librosa otherwise.
     
     Args:
-        audio_path: Path to the audio file
-        start_timestamp: Starting timestamp for audio chunk analysis
+        path: Path to the audio or video file
+        sr: Sample rate to resample to; the native rate if None
+        block_seconds: Approximate length of each block for soundfile
         
     Returns:
-        List of detected violations with description and confidence
+        Tuple of (sample rate, iterator of mono float32 blocks)
     """
-    violations = []
-    
     try:
-        # Load the audio file
-        y, sr = librosa.load(audio_path, sr=None)
+        info = sf.info(path)
+    except Exception:
+        info = None
+    
+    if info is not None:
+        blocks = sf.blocks(path, blocksize=max(1, int(block_seconds * info.samplerate)), dtype='float32')
+        blocks = (block.mean(axis=1) if block.ndim == 2 else block for block in blocks)
+        return sr or info.samplerate, resample_blocks(blocks, info.samplerate, sr or info.samplerate)
+    
+    if av is not None:
+        with av.open(path) as container:
+            if not container.streams.audio:
+                return sr or 0, iter(())
+            out_rate = sr or container.streams.audio[0].codec_context.sample_rate
+        return out_rate, _stream_container(path, out_rate)
+    
+    # No streaming decoder for this file; load it whole
+    y, native_sr = librosa.load(path, sr=sr)
+    return sr or native_sr, iter([y])
+
+def iter_windows(blocks, window_size):
+    """
+    Regroup blocks of any size into consecutive windows of `window_size` samples.
+    
+    Only the current block and the unfinished window are held in memory. The
+    last window may be shorter.
+    """
+    pending = []
+    pending_len = 0
+    
+    for block in blocks:
+        pending.append(block)
+        pending_len += len(block)
+        if pending_len < window_size:
+            continue
         
-        # Extract audio features
-        # Spectral centroid - brightness of sound
-        spec_cent = librosa.feature.spectral_centroid(y=y, sr=sr)[0]
+        joined = np.concatenate(pending) if len(pending) > 1 else pending[0]
+        full = len(joined) // window_size
+        for i in range(full):
+            yield joined[i * window_size:(i + 1) * window_size]
         
-        # Spectral bandwidth - range of frequencies
-        spec_bw = librosa.feature.spectral_bandwidth(y=y, sr=sr)[0]
+        rest = joined[full * window_size:]
+        pending = [rest] if len(rest) else []
+        pending_len = len(rest)
+    
+    if pending_len:
+        yield np.concatenate(pending)
+
+def load_audio(audio, sr=None):
+    """
+    Get mono float32 samples from an in-memory buffer or an array.
+    
+    Files are not loaded whole; analyze_audio streams them (see open_audio_stream).
+    
+    Args:
+        audio: One of
+            - bytes/bytearray/memoryview of an encoded file (WAV, FLAC, ...)
+            - bytes of headerless 16-bit mono PCM, when `sr` is given
+            - a NumPy array of samples at rate `sr` (int16 or float)
+        sr: Sample rate of raw PCM bytes or of an array
+    
+    Returns:
+        Tuple of (samples, sample rate)
+    """
+    if isinstance(audio, np.ndarray):
+        if sr is None:
+            raise ValueError("A sample rate is needed to analyze a sample array")
+        y = to_mono(audio)
+        if y.dtype == np.int16:
+            y = y.astype(np.float32) / 32768.0
+        return y.astype(np.float32, copy=False), sr
+    
+    if isinstance(audio, (bytes, bytearray, memoryview)):
+        if sr is not None:
+            return pcm16_to_float(audio), sr
+        return _decode_container(bytes(audio))
+    
+    raise TypeError(f"Unsupported audio input: {type(audio).__name__}")
+
+class AudioGateStats:
+    """
+    Seconds of audio per voice activity class, and how much of it the spectral
+    analysis actually saw, accumulated over every window analyzed.
+    """
+    
+    def __init__(self):
+        self.seconds = {'speech': 0.0, 'noise': 0.0, 'silence': 0.0}
+        self.total_seconds = 0.0
+        self.analyzed_seconds = 0.0
+    
+    def add(self, segments, sr):
+        for start, end, kind in segments:
+            self.total_seconds += (end - start) / sr
+            if kind in self.seconds:
+                self.seconds[kind] += (end - start) / sr
+            if kind != 'silence':
+                self.analyzed_seconds += (end - start) / sr
+    
+    @property
+    def skipped_fraction(self):
+        """
+        Fraction of the audio that skipped the spectral analysis.
+        """
+        if not self.total_seconds:
+            return 0.0
+        return 1.0 - self.analyzed_seconds / self.total_seconds
+
+def frame_statistics(y, sr, frame_seconds=VAD_FRAME_SECONDS):
+    """
+    RMS energy and zero-crossing rate of consecutive non-overlapping frames.
+    
+    Returns:
+        Tuple of (rms per frame, zero-crossing rate per frame, frame length in samples)
+    """
+    frame_length = max(2, int(frame_seconds * sr))
+    count = len(y) // frame_length
+    if count == 0:
+        frame_length, count = len(y), 1
+    
+    # A view of the samples, one row per frame; nothing is copied
+    frames = y[:count * frame_length].reshape(count, frame_length)
+    rms = np.sqrt(np.einsum('ij,ij->i', frames, frames) / frame_length)
+    zcr = np.count_nonzero(np.diff(np.signbit(frames), axis=1), axis=1) / frame_length
+    return rms, zcr, frame_length
+
+def detect_voice_activity(y, sr):
+    """
+    Split audio into speech, noise and silence segments.
+    
+    Frames below SILENCE_RMS are silence. Louder frames, extended by
+    VAD_HANGOVER_SECONDS on each side and joined across pauses shorter than
+    VAD_MIN_SILENCE_SECONDS, form active segments, which count as speech when
+    their median zero-crossing rate is low and as noise otherwise.
+    
+    Args:
+        y: Mono float32 samples
+        sr: Sample rate
         
-        # Spectral contrast - difference between peaks and valleys in spectrum
-        spec_contrast = librosa.feature.spectral_contrast(y=y, sr=sr)[0]
+    Returns:
+        List of (start sample, end sample, kind) covering all of `y`, where
+        kind is 'speech', 'noise' or 'silence'
+    """
+    if len(y) == 0:
+        return []
+    
+    rms, zcr, frame_length = frame_statistics(y, sr)
+    loud = rms >= SILENCE_RMS
+    hangover = int(np.ceil(VAD_HANGOVER_SECONDS * sr / frame_length))
+    active = scipy.ndimage.maximum_filter1d(loud.astype(np.uint8), 2 * hangover + 1) > 0
+    
+    # Bridge short pauses, so e.g. a run of beeps is one segment rather than many tiny ones
+    min_silence = int(np.ceil(VAD_MIN_SILENCE_SECONDS * sr / frame_length))
+    active_frames = np.flatnonzero(active)
+    gap_lengths = np.diff(active_frames) - 1
+    for gap in np.flatnonzero((gap_lengths > 0) & (gap_lengths < min_silence)):
+        active[active_frames[gap]:active_frames[gap + 1]] = True
+    
+    # Runs of frames with the same activity
+    edges = np.flatnonzero(np.diff(active.astype(np.int8))) + 1
+    starts = np.concatenate(([0], edges))
+    ends = np.concatenate((edges, [len(active)]))
+    
+    segments = []
+    for start, end in zip(starts, ends):
+        if active[start]:
+            run_zcr = zcr[start:end][loud[start:end]]
+            kind = 'speech' if np.median(run_zcr) < SPEECH_MAX_ZCR else 'noise'
+        else:
+            kind = 'silence'
+        # The last segment also takes the samples after the last whole frame
+        segments.append((int(start * frame_length), int(end * frame_length) if end < len(active) else len(y), kind))
+    return segments
+
+def analyze_audio_window(y, sr, start_timestamp=0, gate=True, stats=None):
+    """
+    Apply the audio rules to one window of samples.
+    
+    With the voice activity gate, spectral contrast and onset peaks are only
+    computed over the non-silent segments of the window, and an entirely
+    silent window is skipped.
+    
+    Args:
+        y: Mono float32 samples of the window
+        sr: Sample rate
+        start_timestamp: Timestamp of the first sample
+        gate: Skip silent audio (see detect_voice_activity)
+        stats: Optional AudioGateStats to add the window's segments to
         
-        # MFCC - for voice characteristics
-        mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13)
+    Returns:
+        List of detected violations with description, confidence, and the
+        timestamp and end_timestamp they were found between
+    """
+    violations = []
+    end_timestamp = start_timestamp + len(y) / sr
+    
+    segments = detect_voice_activity(y, sr) if gate else [(0, len(y), None)]
+    if stats is not None:
+        stats.add(segments, sr)
+    
+    active = [(start, end) for start, end, kind in segments if kind != 'silence']
+    if not active:
+        # Silence can't trip any rule, the background noise one included
+        return violations
+    
+    contrast = []
+    contrast_times = []
+    peak_times = []
+    for start, end in active:
+        # Every spectral feature of a segment comes from one shared STFT
+        features = AudioFeatures(y[start:end], sr)
+        offset = start / sr
         
-        # Check for multiple voices using spectral contrast
-        # Higher variance in spectral contrast can indicate multiple voices
-        if np.std(spec_contrast) > 15:  # Threshold determined empirically
-            violations.append({
-                "description": "Multiple voices detected in audio",
-                "confidence": 0.75,
-                "timestamp": start_timestamp + np.argmax(spec_contrast) / sr
-            })
+        # Spectral contrast - difference between peaks and valleys in spectrum
+        segment_contrast = features.contrast[0]
+        contrast.append(segment_contrast)
+        contrast_times.append(offset + features.frames_to_time(np.arange(len(segment_contrast))))
         
-        # Check for sudden noises (potential phone notifications, etc.)
         # Detect peaks in the audio amplitude
-        onset_env = librosa.onset.onset_strength(y=y, sr=sr)
-        peaks = librosa.util.peak_pick(onset_env, 3, 3, 3, 5, 0.5, 10)
+        peaks = librosa.util.peak_pick(features.onset_strength, pre_max=3, post_max=3, pre_avg=3, post_avg=5, delta=0.5, wait=10)
+        peak_times.extend(offset + features.frames_to_time(peaks))
+    
+    spec_contrast = np.concatenate(contrast)
+    contrast_times = np.concatenate(contrast_times)
+    
+    # Check for multiple voices using spectral contrast
+    # Higher variance in spectral contrast can indicate multiple voices
+    if np.std(spec_contrast) > 15:  # Threshold determined empirically
+        violations.append({
+            "description": "Multiple voices detected in audio",
+            "confidence": 0.75,
+            "timestamp": start_timestamp + float(contrast_times[np.argmax(spec_contrast)]),
+            "end_timestamp": end_timestamp
+        })
+    
+    # Check for sudden noises (potential phone notifications, etc.)
+    if len(peak_times) > 5:  # Threshold for suspicious number of peaks
+        violations.append({
+            "description": "Unusual number of audio peaks detected (possible notifications)",
+            "confidence": 0.65,
+            "timestamp": start_timestamp + float(peak_times[0]),
+            "end_timestamp": end_timestamp
+        })
+    
+    # Check for consistent background noise
+    percentile_5 = np.percentile(np.abs(y), 5)
+    if percentile_5 > 0.05:  # Threshold for background noise
+        violations.append({
+            "description": "High level of consistent background noise detected",
+            "confidence": 0.70,
+            "timestamp": start_timestamp,
+            "end_timestamp": end_timestamp
+        })
+    
+    return violations
+
+def analyze_audio_stream(blocks, sr, start_timestamp=0, window_seconds=AUDIO_WINDOW_SECONDS, analysis_rate=None,
+                         gate=True, stats=None):
+    """
+    Analyze audio arriving in blocks, one fixed-length window at a time.
+    
+    Memory stays bounded by the window and block size however long the
+    recording is. A violation found in consecutive windows is reported once,
+    with `end_timestamp` set to the end of the last of them.
+    
+    Args:
+        blocks: Iterable of mono float32 sample arrays
+        sr: Sample rate
+        start_timestamp: Timestamp of the first sample
+        window_seconds: Length of each analysis window
+        analysis_rate: Sample rate to analyze at; blocks at another rate are
+            resampled first. The native rate if None
+        gate: Only run the spectral analysis on non-silent audio
+        stats: Optional AudioGateStats to collect how much audio was skipped
+        
+    Returns:
+        List of detected violations with description, confidence, timestamp and end_timestamp
+    """
+    violations = []
+    open_violations = {}
+    offset = 0
+    
+    try:
+        if analysis_rate and analysis_rate != sr:
+            blocks = resample_blocks(blocks, sr, analysis_rate)
+            sr = analysis_rate
+        
+        window_size = max(1, int(window_seconds * sr))
+        
+        for window in iter_windows(blocks, window_size):
+            # Too little audio after the last full window to judge on its own
+            if offset and len(window) < MIN_WINDOW_SECONDS * sr:
+                break
+            
+            found = analyze_audio_window(window, sr, start_timestamp + offset / sr, gate, stats)
+            offset += len(window)
+            
+            found_descriptions = {violation['description'] for violation in found}
+            for description in list(open_violations):
+                if description not in found_descriptions:
+                    violations.append(open_violations.pop(description))
+            
+            for violation in found:
+                current = open_violations.get(violation['description'])
+                if current is None:
+                    open_violations[violation['description']] = violation
+                else:
+                    current['end_timestamp'] = violation['end_timestamp']
+                    current['confidence'] = max(current['confidence'], violation['confidence'])
+    
+    except Exception as e:
+        # Handle exceptions
+        print(f"Error in audio analysis: {str(e)}")
+    
+    violations.extend(open_violations.values())
+    violations.sort(key=lambda violation: violation['timestamp'])
+    return violations
+
+def analyze_audio(audio, start_timestamp=0, sr=None, window_seconds=AUDIO_WINDOW_SECONDS, analysis_rate=None,
+                  gate=True, stats=None):
+    """
+    Analyze audio for suspicious sounds like background voices, phone notifications, etc.
+    
+    Files are decoded and analyzed a window at a time (see analyze_audio_stream);
+    a chunk shorter than one window is judged as a whole.
+    
+    Args:
+        audio: Path to an audio or video file, an in-memory encoded file or PCM
+            bytes, or an array of samples (see load_audio)
+        start_timestamp: Starting timestamp for audio chunk analysis
+        sr: Sample rate of PCM bytes or of a sample array
+        window_seconds: Length of each analysis window
+        analysis_rate: Sample rate to analyze at; the native rate if None
+        gate: Only run the spectral analysis on non-silent audio
+        stats: Optional AudioGateStats to collect how much audio was skipped
         
-        if len(peaks) > 5:  # Threshold for suspicious number of peaks
-            violations.append({
-                "description": "Unusual number of audio peaks detected (possible notifications)",
-                "confidence": 0.65,
-                "timestamp": start_timestamp + peaks[0] * librosa.get_duration(y=y, sr=sr) / len(onset_env)
-            })
+    Returns:
+        List of detected violations with description, confidence, timestamp and end_timestamp
+    """
+    violations = []
+    
+    try:
+        if isinstance(audio, (str, os.PathLike)):
+            # Decoders resample on the fly
+            sr, blocks = open_audio_stream(audio, analysis_rate)
+        else:
+            y, sr = load_audio(audio, sr)
+            blocks = [y]
         
-        # Check for consistent background noise
-        percentile_5 = np.percentile(np.abs(y), 5)
-        if percentile_5 > 0.05:  # Threshold for background noise
-            violations.append({
-                "description": "High level of consistent background noise detected",
-                "confidence": 0.70,
-                "timestamp": start_timestamp
-            })
+        violations = analyze_audio_stream(blocks, sr, start_timestamp, window_seconds, analysis_rate, gate, stats)
         
     except Exception as e:
         # Handle exceptions
@@ -0,0 +1,170 @@
+from functools import cached_property, lru_cache
+
+import librosa
+import numpy as np
+import scipy.fft
+import soxr
+
+# STFT parameters, librosa's defaults
+N_FFT = 2048
+HOP_LENGTH = 512
+
+# Spectral contrast bands, librosa's defaults
+CONTRAST_BANDS = 6
+CONTRAST_FMIN = 200.0
+CONTRAST_QUANTILE = 0.02
+
+
+@lru_cache(maxsize=16)
+def mel_basis(sr, n_fft=N_FFT, n_mels=128):
+    """
+    Mel filter bank for a sample rate, built once and reused for every window.
+    """
+    return librosa.filters.mel(sr=sr, n_fft=n_fft, n_mels=n_mels)
+
+
+@lru_cache(maxsize=16)
+def contrast_bands(sr, n_fft=N_FFT, n_bands=CONTRAST_BANDS, fmin=CONTRAST_FMIN, quantile=CONTRAST_QUANTILE):
+    """
+    Frequency bin range and quantile size of each spectral contrast band.
+
+    Reproduces the octave bands of librosa.feature.spectral_contrast.
+
+    Returns:
+        List of (first bin, last bin + 1, bins averaged on each side) per band
+    """
+    freq = librosa.fft_frequencies(sr=sr, n_fft=n_fft)
+    octaves = np.zeros(n_bands + 2)
+    octaves[1:] = fmin * (2.0 ** np.arange(0, n_bands + 1))
+    if np.any(octaves[:-1] >= 0.5 * sr):
+        raise ValueError(f"Spectral contrast bands exceed the Nyquist frequency at {sr} Hz")
+
+    bands = []
+    for k, (f_low, f_high) in enumerate(zip(octaves[:-1], octaves[1:])):
+        idx = np.flatnonzero((freq >= f_low) & (freq <= f_high))
+        start = idx[0] - 1 if k > 0 else idx[0]
+        stop = len(freq) if k == n_bands else idx[-1] + 1
+        count = stop - start
+        # The top band keeps its last bin, the others drop it
+        if k < n_bands:
+            stop -= 1
+        bands.append((int(start), int(stop), max(int(np.rint(quantile * count)), 1)))
+    return bands
+
+
+def resample_blocks(blocks, sr, target_sr):
+    """
+    Resample a stream of blocks to `target_sr`, without seams at block boundaries.
+    """
+    if target_sr == sr:
+        yield from blocks
+        return
+
+    resampler = soxr.ResampleStream(sr, target_sr, 1, dtype='float32')
+    for block in blocks:
+        resampled = resampler.resample_chunk(np.ascontiguousarray(block, dtype=np.float32))
+        if len(resampled):
+            yield resampled
+    tail = resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True)
+    if len(tail):
+        yield tail
+
+
+class AudioFeatures:
+    """
+    Spectral features of one audio window, all derived from a single STFT.
+
+    The magnitude spectrogram is computed once on first use; the mel
+    spectrogram, spectral centroid, bandwidth, contrast, onset strength and
+    MFCCs are derived from it with NumPy, and each is only computed if it is
+    accessed. Results match the librosa.feature functions with default
+    arguments.
+
+    Args:
+        y: Mono float32 samples
+        sr: Sample rate
+        n_fft: FFT size
+        hop_length: Samples between frames
+    """
+
+    def __init__(self, y, sr, n_fft=N_FFT, hop_length=HOP_LENGTH):
+        self.y = y
+        self.sr = sr
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+
+    @cached_property
+    def magnitude(self):
+        """
+        Magnitude spectrogram, (1 + n_fft / 2, frames).
+        """
+        return np.abs(librosa.stft(self.y, n_fft=self.n_fft, hop_length=self.hop_length))
+
+    @cached_property
+    def frequencies(self):
+        return librosa.fft_frequencies(sr=self.sr, n_fft=self.n_fft)
+
+    @cached_property
+    def _normalized(self):
+        # Each frame's spectrum as a distribution over frequency
+        S = self.magnitude
+        totals = S.sum(axis=0, keepdims=True)
+        return S / np.where(totals > np.finfo(S.dtype).tiny, totals, 1.0)
+
+    @cached_property
+    def centroid(self):
+        return self.frequencies @ self._normalized
+
+    @cached_property
+    def bandwidth(self):
+        deviation = np.abs(self.frequencies[:, None] - self.centroid[None, :])
+        return np.sqrt(np.sum(self._normalized * deviation ** 2, axis=0))
+
+    @cached_property
+    def contrast(self):
+        """
+        Spectral contrast in dB, (bands + 1, frames).
+        """
+        S = self.magnitude
+        bands = contrast_bands(self.sr, self.n_fft)
+        valley = np.empty((len(bands), S.shape[1]))
+        peak = np.empty_like(valley)
+
+        for k, (start, stop, count) in enumerate(bands):
+            sub_band = S[start:stop]
+            # Only the `count` smallest and largest bins matter, so partition instead of sorting
+            valley[k] = np.partition(sub_band, count - 1, axis=0)[:count].mean(axis=0)
+            peak[k] = np.partition(sub_band, -count, axis=0)[-count:].mean(axis=0)
+
+        return librosa.power_to_db(peak) - librosa.power_to_db(valley)
+
+    @cached_property
+    def mel(self):
+        """
+        Mel power spectrogram, (128, frames).
+        """
+        return mel_basis(self.sr, self.n_fft) @ (self.magnitude ** 2)
+
+    @cached_property
+    def mel_db(self):
+        return librosa.power_to_db(self.mel)
+
+    @cached_property
+    def onset_strength(self):
+        """
+        Onset strength envelope, one value per frame.
+        """
+        S = self.mel_db
+        onset = np.maximum(0.0, S[:, 1:] - S[:, :-1]).mean(axis=0)
+        # Shift for the lag and the centered frames, as librosa does
+        pad = 1 + self.n_fft // (2 * self.hop_length)
+        return np.pad(onset, (pad, 0))[:S.shape[1]]
+
+    def mfcc(self, n_mfcc=13):
+        return scipy.fft.dct(self.mel_db, axis=0, type=2, norm='ortho')[:n_mfcc]
+
+    def frames_to_time(self, frames):
+        """
+        Offset in seconds of frame indices from the start of the window.
+        """
+        return np.asarray(frames) * self.hop_length / self.sr
@@ -0,0 +1,103 @@
+import cv2
+import numpy as np
+
+
+class ChangeGateStats:
+    """
+    Count the frames a ChangeGate passed on to the analyzers and the ones it skipped.
+    """
+
+    def __init__(self):
+        self.frames = 0
+        self.skipped = 0
+
+    def add(self, skipped):
+        self.frames += 1
+        self.skipped += int(skipped)
+
+    def merge(self, other):
+        self.frames += other.frames
+        self.skipped += other.skipped
+
+    @property
+    def analyzed(self):
+        return self.frames - self.skipped
+
+    @property
+    def skipped_fraction(self):
+        return self.skipped / self.frames if self.frames else 0.0
+
+
+def thumbnail(frame, size):
+    """
+    Small grayscale copy of a BGR frame, averaged down so sensor noise cancels out.
+    """
+    small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.int16)
+
+
+class ChangeGate:
+    """
+    Skip the analyzers on frames that look the same as the last analyzed one.
+
+    Each frame is shrunk to a grayscale thumbnail and compared with the
+    thumbnail of the last frame that was analyzed. The frame is analyzed
+    again if the mean absolute difference exceeds `mean_threshold`, if more
+    than `area_threshold` of the thumbnail pixels changed by over
+    `pixel_threshold` (a small object entering the scene), or if the last
+    analysis is older than `max_reuse_seconds`. Otherwise the caller reuses
+    the previous frame's results. Comparing against the last analyzed frame,
+    not the previous frame, means slow drift still adds up to a change.
+
+    Args:
+        mean_threshold: Mean absolute gray level difference that counts as a change
+        pixel_threshold: Gray level difference that counts a thumbnail pixel as changed
+        area_threshold: Fraction of changed thumbnail pixels that counts as a change
+        thumb_size: (width, height) of the comparison thumbnail
+        max_reuse_seconds: Longest time results are reused without a fresh analysis
+    """
+
+    def __init__(self, mean_threshold=3.0, pixel_threshold=20, area_threshold=0.002, thumb_size=(64, 36),
+                 max_reuse_seconds=10.0):
+        self.mean_threshold = mean_threshold
+        self.pixel_threshold = pixel_threshold
+        self.area_threshold = area_threshold
+        self.thumb_size = tuple(thumb_size)
+        self.max_reuse_seconds = max_reuse_seconds
+        self.stats = ChangeGateStats()
+        self.reference = None
+        self.reference_time = None
+        # Results of the last analyzed frame, kept by the caller
+        self.observation = None
+
+    def should_analyze(self, frame, timestamp):
+        """
+        Decide whether a frame needs a fresh analysis, and count the decision.
+
+        A frame that is analyzed becomes the new reference.
+        """
+        thumb = thumbnail(frame, self.thumb_size)
+        analyze = self.reference is None or self._changed(thumb, timestamp)
+
+        if analyze:
+            self.reference = thumb
+            self.reference_time = timestamp
+        self.stats.add(not analyze)
+        return analyze
+
+    def _changed(self, thumb, timestamp):
+        elapsed = timestamp - self.reference_time
+        if elapsed < 0 or elapsed >= self.max_reuse_seconds:
+            return True
+
+        difference = np.abs(thumb - self.reference)
+        if difference.mean() > self.mean_threshold:
+            return True
+        return np.count_nonzero(difference > self.pixel_threshold) > self.area_threshold * difference.size
+
+
+def make_change_gate(options):
+    """
+    Build a ChangeGate from its keyword arguments; None disables gating.
+    """
+    return ChangeGate(**options) if options is not None else None
@@ -0,0 +1,101 @@
+from collections import deque
+
+
+class EventTracker:
+    """
+    Merge repeated per-frame detections into violation events.
+
+    Detections are keyed by violation type and kind, falling back to the
+    description for detections without a `kind`. Descriptions may carry
+    changing details (a face count, a duration); the event keeps the
+    description it opened with. Each key keeps a
+    rolling window of recent hit timestamps; an event opens once a key has
+    `min_hits` hits inside `window` seconds, stays open while hits keep
+    arriving, and closes after `gap` seconds without one. Everything is based
+    on frame timestamps rather than frame counts, so the client can send frames
+    at any rate without changing what counts as one event. A detection that
+    knows when its episode began (a look-away, a talking burst) passes it as
+    `start`, and the event opens at that time rather than at its first hit.
+
+    Args:
+        gap: Seconds without a hit after which an open event closes
+        window: Length of the rolling hit window in seconds
+        min_hits: Hits inside the window needed to open an event, per
+            violation type (types not listed need one hit)
+    """
+
+    def __init__(self, gap=5.0, window=10.0, min_hits=None):
+        self.gap = gap
+        self.window = window
+        self.min_hits = min_hits or {}
+        self.hits = {}
+        self.open_events = {}
+
+    def update(self, timestamp, violations):
+        """
+        Feed the detections of one frame.
+
+        Args:
+            timestamp: Timestamp of the frame in seconds
+            violations: Detections with type, description, confidence and
+                optionally kind and start
+
+        Returns:
+            Tuple of (opened, closed) lists of event dicts with key, type,
+            description, confidence, start, end and hits
+        """
+        opened = []
+
+        for violation in violations:
+            key = (violation['type'], violation.get('kind', violation['description']))
+
+            hits = self.hits.setdefault(key, deque())
+            hits.append(timestamp)
+            while hits and hits[0] < timestamp - self.window:
+                hits.popleft()
+
+            event = self.open_events.get(key)
+            if event is not None:
+                event['end'] = max(event['end'], timestamp)
+                event['confidence'] = max(event['confidence'], violation['confidence'])
+                event['hits'] += 1
+            elif len(hits) >= self.min_hits.get(violation['type'], 1):
+                event = {
+                    "key": key,
+                    "type": violation['type'],
+                    "description": violation['description'],
+                    "confidence": violation['confidence'],
+                    "start": violation.get('start', hits[0]),
+                    "end": timestamp,
+                    "hits": len(hits),
+                }
+                self.open_events[key] = event
+                opened.append(event)
+
+        closed = self.expire(timestamp)
+        return opened, closed
+
+    def expire(self, timestamp):
+        """
+        Close the events that have had no hit for `gap` seconds.
+        """
+        closed = []
+        for key, event in list(self.open_events.items()):
+            if timestamp - event['end'] > self.gap:
+                closed.append(self.open_events.pop(key))
+
+        # Forget hit windows that can no longer open an event
+        for key, hits in list(self.hits.items()):
+            if hits and hits[-1] < timestamp - self.window:
+                del self.hits[key]
+
+        return closed
+
+    def close_all(self):
+        """
+        Close every open event, e.g. when the stream ends.
+        """
+        closed = list(self.open_events.values())
+        self.open_events.clear()
+        self.hits.clear()
+        return closed
@@ -2,61 +2,231 @@ import cv2
 import numpy as np
 import time
 
-# Load OpenCV's built-in face detector (Haar Cascade)
-face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+from proctoring_system.utils.frame_context import FrameContext
 
 # Track time user looks away
-look_away_start = None
 LOOK_AWAY_THRESHOLD = 20  # seconds
 
+# Only the largest faces in a frame are encoded, which bounds the per-frame cost
+MAX_FACES = 4
+
+# Normalized correlation below which a face is not the enrolled candidate
+FACE_MATCH_THRESHOLD = 0.6
+
+FACE_ENCODING_SIZE = (100, 100)
+
 # Simple face encoding function to replace InsightFace
 def get_face_encoding(face_img):
     # Resize for consistency
-    face_img = cv2.resize(face_img, (100, 100))
+    face_img = cv2.resize(face_img, FACE_ENCODING_SIZE)
     # Convert to grayscale
-    gray = cv2.cvtColor(face_img, cv2.COLOR_BGR2GRAY)
+    if face_img.ndim == 3:
+        face_img = cv2.cvtColor(face_img, cv2.COLOR_BGR2GRAY)
     # Flatten and normalize
-    return gray.flatten() / 255.0
-
-cap = cv2.VideoCapture(0)
-
-while cap.isOpened():
-    success, frame = cap.read()
-    if not success:
-        break
-        
-    # Convert to grayscale for face detection
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    
-    # Detect faces
-    faces = face_cascade.detectMultiScale(gray, 1.1, 4)
-    
-    if len(faces) > 1:
-        cv2.putText(frame, "Multiple Faces Detected!", (10, 50), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-    
-    for (x, y, w, h) in faces:
-        # Convert coordinates to match original format
-        x1, y1, x2, y2 = x, y, x+w, y+h
-        
-        # Draw rectangle around face
-        cv2.rectangle(frame, (x1, y1), (x2, y2), (255, 0, 0), 2)
-        
-        # Get face region
-        face_crop = frame[y1:y2, x1:x2]
-        
-        # Only process if face is big enough
-        if face_crop.shape[0] > 20 and face_crop.shape[1] > 20:
-            # Simple face encoding
-            face_encoding = get_face_encoding(face_crop)
-            
-            # Here you could compare this encoding to a reference
-            # For now, just display that a face was detected
-            cv2.putText(frame, "Face Detected", (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-    
-    cv2.imshow('Proctoring', frame)
-    
-    if cv2.waitKey(1) & 0xFF == ord('q'):
-        break
-
-cap.release()
-cv2.destroyAllWindows()
\ No newline at end of file
+    return face_img.flatten() / 255.0
+
+def normalize_encodings(encodings):
+    """
+    Zero-mean, unit-norm rows, so a dot product is the normalized correlation.
+    """
+    encodings = np.atleast_2d(np.asarray(encodings, dtype=np.float32))
+    encodings = encodings - encodings.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(encodings, axis=1, keepdims=True)
+    return encodings / np.maximum(norms, 1e-6)
+
+class GazeObservation:
+    """
+    What one frame shows about the candidate's face, before any timing logic.
+
+    Attributes:
+        face_count: Number of faces detected
+        match_scores: Best similarity of each encoded face to the reference,
+            or None if there was no reference to compare against
+        encoding: Encoding of the only face when there was no reference yet
+    """
+
+    def __init__(self, face_count, match_scores=None, encoding=None):
+        self.face_count = face_count
+        self.match_scores = match_scores
+        self.encoding = encoding
+
+def observe_gaze(frame, reference=None, context=None):
+    """
+    Detect and encode the faces in one frame.
+
+    Args:
+        frame: The video frame to analyze
+        reference: Normalized reference encodings (K, D) of the enrolled candidate
+        context: Optional FrameContext shared with the other analyzers
+
+    Returns:
+        GazeObservation for the frame
+    """
+    if context is None:
+        context = FrameContext(frame)
+
+    faces = context.faces
+    if len(faces) == 0:
+        return GazeObservation(0)
+
+    # Encode only the largest faces, skipping crops too small to compare
+    largest = faces[np.argsort(-(faces[:, 2] * faces[:, 3]))[:MAX_FACES]]
+    encodings = [
+        get_face_encoding(context.gray_region(x, y, w, h))
+        for x, y, w, h in largest
+        if w > 20 and h > 20
+    ]
+    if not encodings:
+        return GazeObservation(len(faces))
+
+    encodings = normalize_encodings(encodings)
+
+    if reference is None:
+        encoding = encodings[0] if len(faces) == 1 else None
+        return GazeObservation(len(faces), encoding=encoding)
+
+    # Compare every face against every reference encoding in one product
+    match_scores = (encodings @ reference.T).max(axis=1)
+    return GazeObservation(len(faces), match_scores=match_scores)
+
+class GazeState:
+    """
+    Per-session eye tracking state.
+
+    Holds the look-away timer and the enrolled reference encoding of the
+    candidate. The first frame with exactly one face enrolls the reference.
+
+    Once the face has been away for `look_away_threshold` seconds, every
+    further frame without a face reports the look-away with its `start`,
+    so callers can merge it into one violation spanning the whole look-away
+    (see EventTracker and merge_bursts).
+
+    Args:
+        look_away_threshold: Seconds without a face before a violation is raised
+        match_threshold: Similarity below which a face is not the candidate
+    """
+
+    def __init__(self, look_away_threshold=LOOK_AWAY_THRESHOLD, match_threshold=FACE_MATCH_THRESHOLD):
+        self.look_away_threshold = look_away_threshold
+        self.match_threshold = match_threshold
+        self.look_away_start = None
+        self.reference = None
+        self.enrolled_at = None
+
+    def enroll(self, encoding, timestamp):
+        """
+        Enroll the candidate's reference encoding, seen at `timestamp`.
+        """
+        self.reference = normalize_encodings(encoding)
+        self.enrolled_at = timestamp
+
+    def update(self, observation, timestamp):
+        """
+        Advance the state with one frame's observation.
+
+        Returns:
+            List of detected violations with kind, description and confidence;
+            look-aways also carry their `start`
+        """
+        violations = []
+
+        if observation.face_count == 0:
+            # Track time user looks away
+            if self.look_away_start is None:
+                self.look_away_start = timestamp
+            elif timestamp - self.look_away_start >= self.look_away_threshold:
+                violations.append({
+                    "kind": 'look_away',
+                    "description": f"Looking away from screen for {timestamp - self.look_away_start:.0f} seconds",
+                    "confidence": 0.70,
+                    "start": self.look_away_start,
+                })
+            return violations
+
+        self.look_away_start = None
+
+        if observation.face_count > 1:
+            violations.append({
+                "kind": 'multiple_faces',
+                "description": f"Multiple faces detected ({observation.face_count})",
+                "confidence": 0.80
+            })
+
+        if self.reference is None:
+            if observation.encoding is not None:
+                self.enroll(observation.encoding, timestamp)
+            return violations
+
+        # Frames before enrollment are not compared
+        if observation.match_scores is not None and timestamp >= self.enrolled_at:
+            best_score = float(np.max(observation.match_scores))
+            if best_score < self.match_threshold:
+                violations.append({
+                    "kind": 'face_mismatch',
+                    "description": "Face does not match the enrolled candidate",
+                    "confidence": round(min(0.95, max(0.5, 1.0 - best_score)), 2)
+                })
+
+        return violations
+
+def analyze_eye_movements(frame, state=None, timestamp=0.0, context=None):
+    """
+    Analyze the candidate's face for looking away, extra faces and impersonation.
+
+    Args:
+        frame: The video frame to analyze
+        state: Per-session GazeState; a fresh one is used if omitted
+        timestamp: Timestamp of the frame in seconds
+        context: Optional FrameContext shared with the other analyzers
+
+    Returns:
+        List of detected violations with description and confidence
+    """
+    violations = []
+
+    try:
+        if state is None:
+            state = GazeState()
+
+        observation = observe_gaze(frame, state.reference, context)
+        violations = state.update(observation, timestamp)
+
+    except Exception as e:
+        # Handle exceptions
+        print(f"Error in eye movement analysis: {str(e)}")
+
+    return violations
+
+def main():
+    """
+    Interactive webcam demo of the eye tracking analyzer.
+    """
+    cap = cv2.VideoCapture(0)
+    state = GazeState()
+    start = time.time()
+
+    while cap.isOpened():
+        success, frame = cap.read()
+        if not success:
+            break
+
+        context = FrameContext(frame)
+        violations = analyze_eye_movements(frame, state, time.time() - start, context)
+
+        for (x, y, w, h) in context.faces:
+            # Draw rectangle around face
+            cv2.rectangle(frame, (x, y), (x + w, y + h), (255, 0, 0), 2)
+
+        for i, violation in enumerate(violations):
+            cv2.putText(frame, violation['description'], (10, 50 + 30 * i), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+
+        cv2.imshow('Proctoring', frame)
+
+        if cv2.waitKey(1) & 0xFF == ord('q'):
+            break
+
+    cap.release()
+    cv2.destroyAllWindows()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+import math
+
+import numpy as np
+
+# Point pairs of the 68-point landmark model. The ratio is the mean of the
+# vertical distances over the horizontal one.
+MOUTH_VERTICAL = [(50, 58), (52, 56)]  # upper lip to lower lip
+MOUTH_HORIZONTAL = (48, 54)  # left to right corner
+
+
+def stack_landmarks(frames_landmarks, max_faces=None):
+    """
+    Stack per-frame landmark lists into one (frames, faces, 68, 2) array.
+
+    Frames with fewer faces than the most crowded one are padded with NaN,
+    so their missing faces get NaN ratios.
+
+    Args:
+        frames_landmarks: Per frame, a list of (1, 68, 2) or (68, 2) arrays as
+            returned by FacemarkLBF.fit (empty or None for no faces)
+        max_faces: Keep at most this many faces per frame
+
+    Returns:
+        float32 array of shape (frames, faces, 68, 2)
+    """
+    counts = [len(landmarks) if landmarks is not None else 0 for landmarks in frames_landmarks]
+    faces = max(counts, default=0)
+    if max_faces is not None:
+        faces = min(faces, max_faces)
+
+    stacked = np.full((len(frames_landmarks), faces, 68, 2), np.nan, dtype=np.float32)
+    for i, landmarks in enumerate(frames_landmarks):
+        if landmarks is None:
+            continue
+        for j, points in enumerate(landmarks[:faces]):
+            stacked[i, j] = np.reshape(points, (68, 2))
+    return stacked
+
+
+def _aspect_ratio(landmarks, vertical, horizontal):
+    landmarks = np.asarray(landmarks, dtype=np.float32)
+    top = landmarks[..., [a for a, _ in vertical], :]
+    bottom = landmarks[..., [b for _, b in vertical], :]
+    heights = np.linalg.norm(top - bottom, axis=-1).sum(axis=-1)
+    width = np.linalg.norm(landmarks[..., horizontal[0], :] - landmarks[..., horizontal[1], :], axis=-1)
+    return heights / (len(vertical) * width + 1e-6)
+
+
+def mouth_aspect_ratio(landmarks):
+    """
+    Mouth aspect ratio (MAR) of every face in one NumPy pass.
+
+    Args:
+        landmarks: Array of shape (..., 68, 2), e.g. (frames, faces, 68, 2)
+
+    Returns:
+        Array of shape (...) with the MAR of each face, NaN for padded faces
+    """
+    return _aspect_ratio(landmarks, MOUTH_VERTICAL, MOUTH_HORIZONTAL)
+
+
+class RatioHysteresis:
+    """
+    Smooth a per-frame ratio over time and switch on and off with hysteresis.
+
+    The ratio is smoothed with an exponential moving average whose weight
+    depends on the time between frames, so the result does not depend on
+    the sampling rate. The state switches on when the smoothed value rises
+    above `on_threshold` and off only when it drops below `off_threshold`,
+    so a value hovering around one threshold does not flicker. A frame
+    without a value (no face) switches the state off and resets the average.
+
+    Args:
+        on_threshold: Smoothed value above which the state switches on
+        off_threshold: Smoothed value below which the state switches off
+        time_constant: Smoothing time constant in seconds, 0 disables smoothing
+    """
+
+    def __init__(self, on_threshold, off_threshold, time_constant=0.5):
+        if off_threshold > on_threshold:
+            raise ValueError("off_threshold must not exceed on_threshold")
+        self.on_threshold = on_threshold
+        self.off_threshold = off_threshold
+        self.time_constant = time_constant
+        self.value = None
+        self.active = False
+        self.last_timestamp = None
+
+    def update(self, value, timestamp):
+        """
+        Feed one frame's value (None or NaN for no value).
+
+        Returns:
+            Tuple of (active, smoothed value)
+        """
+        if value is None or math.isnan(value):
+            self.value = None
+            self.active = False
+        elif self.value is None or self.time_constant <= 0:
+            self.value = float(value)
+        else:
+            dt = max(0.0, timestamp - self.last_timestamp)
+            weight = math.exp(-dt / self.time_constant)
+            self.value = weight * self.value + (1 - weight) * float(value)
+
+        if self.value is not None:
+            if self.active:
+                self.active = self.value >= self.off_threshold
+            else:
+                self.active = self.value > self.on_threshold
+
+        self.last_timestamp = timestamp
+        return self.active, self.value
+
+
+def ratio_events(timestamps, values, on_threshold, off_threshold, time_constant=0.5):
+    """
+    Find the stretches of a ratio series where the RatioHysteresis state is on.
+
+    Args:
+        timestamps: Frame timestamps in seconds, increasing
+        values: One value per frame, NaN for frames without one
+
+    Returns:
+        List of dicts with start, end (last active frame) and peak smoothed value
+    """
+    hysteresis = RatioHysteresis(on_threshold, off_threshold, time_constant)
+    events = []
+    event = None
+
+    for timestamp, value in zip(timestamps, values):
+        active, smoothed = hysteresis.update(value, timestamp)
+        if active:
+            if event is None:
+                event = {"start": timestamp, "end": timestamp, "peak": smoothed}
+                events.append(event)
+            event['end'] = timestamp
+            event['peak'] = max(event['peak'], smoothed)
+        else:
+            event = None
+
+    return events
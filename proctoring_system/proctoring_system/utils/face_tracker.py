@@ -0,0 +1,119 @@
+import cv2
+import numpy as np
+
+
+class FaceTracker:
+    """
+    Follow face boxes from frame to frame, running the face detector only now and then.
+
+    The detector runs on the first frame, then every `detect_interval`
+    frames, and whenever a face is lost. In between, each face found by the
+    last detection is searched for near its previous box by normalized
+    template matching on a downscaled copy of the region, which costs about
+    the same whatever the frame size. A face whose best match scores below
+    `min_score` counts as lost; faces that appear are picked up at the next
+    detection. Box sizes are kept between detections, so faces moving
+    towards or away from the camera are corrected at the next detection.
+
+    One tracker follows one stream of frames in order (a video chunk or a
+    live session). Boxes are in the working-resolution coordinates of
+    FrameContext.
+
+    Args:
+        detect_interval: Frames between full detections, 1 detects every frame
+        min_score: Template match score below which a face is lost
+        search_margin: Search area around the previous box, as a fraction of its size
+        template_size: Width in pixels faces are downscaled to for matching
+    """
+
+    def __init__(self, detect_interval=5, min_score=0.6, search_margin=0.5, template_size=32):
+        self.detect_interval = detect_interval
+        self.min_score = min_score
+        self.search_margin = search_margin
+        self.template_size = template_size
+        self.faces = np.empty((0, 4), dtype=np.int32)
+        self.templates = []
+        self.frames_since_detection = None
+        self.image_shape = None
+        self.detections = 0
+        self.tracked = 0
+
+    def update(self, context):
+        """
+        Face boxes of the next frame, detected or tracked.
+        """
+        gray = context.small_gray
+        if (self.frames_since_detection is None or self.frames_since_detection + 1 >= self.detect_interval
+                or gray.shape != self.image_shape):
+            return self._detect(context)
+
+        with context.timings.stage('tracking'):
+            tracked = [self._track(gray, box, template) for box, template in zip(self.faces, self.templates)]
+        if any(box is None for box in tracked):
+            return self._detect(context)
+
+        self.faces = np.asarray(tracked, dtype=np.int32).reshape(-1, 4)
+        self.frames_since_detection += 1
+        self.tracked += 1
+        return self.faces
+
+    def reset(self):
+        """
+        Forget the tracked faces, so the next frame is detected from scratch.
+        """
+        self.frames_since_detection = None
+
+    @property
+    def detection_fraction(self):
+        frames = self.detections + self.tracked
+        return self.detections / frames if frames else 0.0
+
+    def _detect(self, context):
+        gray = context.small_gray
+        self.faces = context.detect_faces()
+        self.templates = [self._template(gray, box) for box in self.faces]
+        self.frames_since_detection = 0
+        self.image_shape = gray.shape
+        self.detections += 1
+        return self.faces
+
+    def _factor(self, box):
+        return min(1.0, self.template_size / box[2])
+
+    def _template(self, gray, box):
+        x, y, w, h = box
+        factor = self._factor(box)
+        size = (max(1, round(w * factor)), max(1, round(h * factor)))
+        return cv2.resize(gray[y:y + h, x:x + w], size, interpolation=cv2.INTER_AREA)
+
+    def _track(self, gray, box, template):
+        """
+        New position of one face box, or None if the face was lost.
+        """
+        x, y, w, h = box
+        height, width = gray.shape
+        margin_x, margin_y = round(w * self.search_margin), round(h * self.search_margin)
+        x0, y0 = max(0, x - margin_x), max(0, y - margin_y)
+        x1, y1 = min(width, x + w + margin_x), min(height, y + h + margin_y)
+
+        factor = self._factor(box)
+        size = (max(1, round((x1 - x0) * factor)), max(1, round((y1 - y0) * factor)))
+        region = cv2.resize(gray[y0:y1, x0:x1], size, interpolation=cv2.INTER_AREA)
+        if region.shape[0] < template.shape[0] or region.shape[1] < template.shape[1]:
+            return None
+
+        scores = cv2.matchTemplate(region, template, cv2.TM_CCOEFF_NORMED)
+        _, best, _, (best_x, best_y) = cv2.minMaxLoc(scores)
+        if best < self.min_score:
+            return None
+
+        new_x = min(max(0, x0 + round(best_x / factor)), width - w)
+        new_y = min(max(0, y0 + round(best_y / factor)), height - h)
+        return new_x, new_y, w, h
+
+
+def make_face_tracker(options):
+    """
+    Build a FaceTracker from its keyword arguments; None detects faces on every frame.
+    """
+    return FaceTracker(**options) if options is not None else None
@@ -0,0 +1,201 @@
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+
+from proctoring_system.utils.model_registry import use_model
+
+# Default longest side, in pixels, of the image the face and object detectors
+# run on; the app passes settings.PROCTORING_WORKING_SIZE
+WORKING_SIZE = 640
+
+
+class StageTimings:
+    """
+    Accumulate wall-clock time per analysis stage.
+
+    Stages can nest; each stage is charged only its exclusive time, so a face
+    detection triggered from inside the 'lip' stage is reported under 'faces'
+    and not counted twice.
+    """
+
+    def __init__(self):
+        self.totals = defaultdict(float)
+        self.counts = defaultdict(int)
+        self._children = []
+
+    @contextmanager
+    def stage(self, name):
+        self._children.append(0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            child_time = self._children.pop()
+            self.totals[name] += elapsed - child_time
+            self.counts[name] += 1
+            if self._children:
+                self._children[-1] += elapsed
+
+    def report(self):
+        """
+        Total seconds, call count and mean milliseconds per stage.
+        """
+        return {
+            name: {
+                "seconds": total,
+                "count": self.counts[name],
+                "mean_ms": 1000 * total / self.counts[name],
+            }
+            for name, total in self.totals.items()
+        }
+
+
+class FrameContext:
+    """
+    Per-frame intermediate results shared by the eye, lip and object analyzers.
+
+    The grayscale image, face boxes and facial landmarks are computed lazily on
+    first access and then reused, so each frame pays for them once no matter
+    how many analyzers need them.
+
+    Detection runs on a working copy of the frame whose longer side is at
+    most `working_size` pixels, so its cost does not grow with the upload
+    resolution. Face boxes are mapped back to full-resolution coordinates,
+    and landmarks and face crops come from the full-resolution image, which
+    is only converted to grayscale around the faces.
+
+    Args:
+        frame: BGR video frame
+        timings: Optional StageTimings to charge the shared stages to
+        working_size: Longest side of the detection image in pixels, None
+            for full resolution
+        face_tracker: Optional FaceTracker that follows the faces of earlier
+            frames instead of detecting them on every frame
+    """
+
+    def __init__(self, frame, timings=None, working_size=WORKING_SIZE, face_tracker=None):
+        self.frame = frame
+        self.timings = timings if timings is not None else StageTimings()
+        self.face_tracker = face_tracker
+        height, width = frame.shape[:2]
+        self.scale = min(1.0, working_size / max(height, width)) if working_size else 1.0
+        self._small = None
+        self._small_gray = None
+        self._gray = None
+        self._faces = None
+        self._landmarks = None
+
+    @property
+    def small(self):
+        """
+        The frame at working resolution (the frame itself if it is small enough).
+        """
+        if self._small is None:
+            if self.scale < 1.0:
+                with self.timings.stage('resize'):
+                    height, width = self.frame.shape[:2]
+                    size = (max(1, round(width * self.scale)), max(1, round(height * self.scale)))
+                    self._small = cv2.resize(self.frame, size, interpolation=cv2.INTER_AREA)
+            else:
+                self._small = self.frame
+        return self._small
+
+    @property
+    def small_gray(self):
+        """
+        Grayscale frame at working resolution.
+        """
+        if self._small_gray is None:
+            if self.scale < 1.0:
+                small = self.small
+                with self.timings.stage('gray'):
+                    self._small_gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+            else:
+                self._small_gray = self.gray
+        return self._small_gray
+
+    @property
+    def gray(self):
+        """
+        Grayscale frame at full resolution.
+        """
+        if self._gray is None:
+            with self.timings.stage('gray'):
+                self._gray = cv2.cvtColor(self.frame, cv2.COLOR_BGR2GRAY)
+        return self._gray
+
+    def gray_region(self, x, y, w, h):
+        """
+        Full-resolution grayscale crop, converting only that region unless the whole frame already is.
+        """
+        if self._gray is not None:
+            return self._gray[y:y + h, x:x + w]
+        with self.timings.stage('gray'):
+            return cv2.cvtColor(self.frame[y:y + h, x:x + w], cv2.COLOR_BGR2GRAY)
+
+    def to_frame(self, boxes):
+        """
+        Map (N, 4) x, y, w, h boxes from working to full-resolution coordinates.
+        """
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        if self.scale < 1.0:
+            boxes = boxes / self.scale
+        return np.rint(boxes).astype(np.int32)
+
+    @property
+    def faces(self):
+        """
+        Face boxes as an (N, 4) array of x, y, w, h, in full-resolution coordinates.
+        """
+        if self._faces is None:
+            if self.face_tracker is not None:
+                faces = self.face_tracker.update(self)
+            else:
+                faces = self.detect_faces()
+            self._faces = self.to_frame(faces)
+        return self._faces
+
+    def detect_faces(self):
+        """
+        Run the face detector on the working image; boxes are in working coordinates.
+        """
+        gray = self.small_gray
+        # The detector's smallest face shrinks with the image, down to the cascade's 24 px window
+        min_size = max(24, round(30 * self.scale))
+        with self.timings.stage('faces'):
+            with use_model('face_cascade') as face_detector:
+                faces = face_detector.detectMultiScale(
+                    gray, scaleFactor=1.1, minNeighbors=5, minSize=(min_size, min_size)
+                )
+        return np.asarray(faces, dtype=np.int32).reshape(-1, 4)
+
+    @property
+    def landmarks(self):
+        """
+        68-point landmarks per face, in the same order as `faces`.
+
+        Fitted on the full-resolution region around the faces.
+        """
+        if self._landmarks is None:
+            faces = self.faces
+            if len(faces) == 0:
+                self._landmarks = []
+                return self._landmarks
+
+            # Faces plus a margin, since the model looks slightly outside the box
+            height, width = self.frame.shape[:2]
+            margin = (faces[:, 2:].max(axis=1) // 4)[:, None]
+            x0, y0 = np.maximum((faces[:, :2] - margin).min(axis=0), 0)
+            x1, y1 = np.minimum((faces[:, :2] + faces[:, 2:] + margin).max(axis=0), (width, height))
+            region = self.gray_region(x0, y0, x1 - x0, y1 - y0)
+            offset = np.array([x0, y0])
+
+            with self.timings.stage('landmarks'):
+                with use_model('facemark_lbf') as landmark_detector:
+                    _, landmarks = landmark_detector.fit(region, faces - np.append(offset, (0, 0)))
+                self._landmarks = [points + offset.astype(points.dtype) for points in landmarks]
+        return self._landmarks
@@ -1,77 +1,137 @@
-import cv2
 import numpy as np
 
-def analyze_lip_movements(frame):
+from proctoring_system.utils.face_ratios import RatioHysteresis, mouth_aspect_ratio, stack_landmarks
+from proctoring_system.utils.frame_context import FrameContext
+
+# Mouth aspect ratio above which the mouth counts as open (determined empirically)
+MAR_THRESHOLD = 0.5
+# A talking burst ends once the smoothed ratio drops below this
+MAR_RELEASE_THRESHOLD = 0.4
+# Time constant in seconds of the mouth aspect ratio smoothing
+MAR_TIME_CONSTANT = 0.5
+
+TALKING_DESCRIPTION = "Significant lip movement detected (possibly talking)"
+
+def analyze_lip_movements(frame, context=None):
     """
     Analyze lip movements to detect if someone might be talking or getting help.
 
     Args:
         frame: The video frame to analyze.
+        context: Optional FrameContext shared with the other analyzers.
 
     Returns:
         List of detected violations with description and confidence.
     """
     violations = []
 
-    try:
-        # Convert to grayscale
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    # Mouth aspect ratio of every face, computed in one pass
+    for mar in observe_lips(frame, context):
+        # Check if mouth is open (possible talking)
+        if mar > MAR_THRESHOLD:
+            violations.append({
+                "description": TALKING_DESCRIPTION,
+                "confidence": talking_confidence(mar)
+            })
 
-        # Load the face detector
-        face_detector = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+    return violations
 
-        # Detect faces
-        faces = face_detector.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
+def observe_lips(frame, context=None):
+    """
+    Mouth aspect ratio of every face in the frame.
 
-        if len(faces) == 0:
-            return []  # No face detected, can't analyze lips
+    Args:
+        frame: The video frame to analyze.
+        context: Optional FrameContext shared with the other analyzers.
 
-        # Load the facial landmark detector
-        landmark_detector = cv2.face.createFacemarkLBF()
-        landmark_detector.loadModel("lbfmodel.yaml")  # Path to the downloaded model file
+    Returns:
+        Array with one MAR per face, empty if no face was found.
+    """
+    if context is None:
+        context = FrameContext(frame)
+    return observe_lips_batch([frame], [context])[0]
 
-        # Detect facial landmarks
-        _, landmarks = landmark_detector.fit(gray, np.array(faces))
+def observe_lips_batch(frames, contexts):
+    """
+    Mouth aspect ratios of every face in several frames, in one vectorized pass.
 
-        # Loop through detected faces and landmarks
-        for landmark in landmarks:
-            # Extract mouth landmarks (points 48-68 in the 68-point model)
-            mouth_points = landmark[0][48:68]  # Points 48-67 (0-based indexing)
+    Args:
+        frames: The video frames to analyze.
+        contexts: The FrameContexts of the frames.
 
-            # Calculate mouth aspect ratio
-            mar = calculate_mouth_aspect_ratio(mouth_points)
+    Returns:
+        List with an array of per-face MARs for each frame.
+    """
+    frames_landmarks = []
+    for context in contexts:
+        try:
+            # Facial landmarks from the shared LBF model (loaded once per process), if there is a face
+            frames_landmarks.append(context.landmarks if len(context.faces) else None)
+        except Exception as e:
+            print(f"Error in lip movement analysis: {str(e)}")
+            frames_landmarks.append(None)
+
+    ratios = mouth_aspect_ratio(stack_landmarks(frames_landmarks))
+    return [frame_ratios[~np.isnan(frame_ratios)] for frame_ratios in ratios]
+
+def talking_confidence(mar):
+    # Scale confidence based on MAR
+    return min(float(mar) * 0.8, 0.95)
+
+class LipState:
+    """
+    Per-session lip movement state.
 
-            # Check if mouth is open (possible talking)
-            if mar > 0.5:  # Threshold determined empirically
-                violations.append({
-                    "description": "Significant lip movement detected (possibly talking)",
-                    "confidence": min(mar * 0.8, 0.95)  # Scale confidence based on MAR
-                })
+    The largest mouth aspect ratio of each frame is smoothed over time and
+    passed through a hysteresis (see RatioHysteresis), so a talking burst is
+    one stretch of frames rather than a flicker around the threshold. Every
+    frame inside a burst reports a violation carrying the burst's `start`,
+    so callers can merge a burst into a single violation.
 
-    except Exception as e:
-        # Handle exceptions
-        print(f"Error in lip movement analysis: {str(e)}")
+    Args:
+        open_threshold: Smoothed MAR above which a burst starts
+        release_threshold: Smoothed MAR below which a burst ends
+        time_constant: Smoothing time constant in seconds
+    """
 
-    return violations
+    def __init__(self, open_threshold=MAR_THRESHOLD, release_threshold=MAR_RELEASE_THRESHOLD,
+                 time_constant=MAR_TIME_CONSTANT):
+        self.hysteresis = RatioHysteresis(open_threshold, release_threshold, time_constant)
+        self.burst_start = None
+
+    def update(self, ratios, timestamp):
+        """
+        Advance the state with one frame's mouth aspect ratios.
+
+        Returns:
+            List of detected violations with description, confidence and start
+        """
+        ratios = np.asarray(ratios, dtype=np.float64)
+        value = np.nanmax(ratios) if np.any(~np.isnan(ratios)) else None
+        talking, smoothed = self.hysteresis.update(value, timestamp)
+
+        if not talking:
+            self.burst_start = None
+            return []
+
+        if self.burst_start is None:
+            self.burst_start = timestamp
+        return [{
+            "description": TALKING_DESCRIPTION,
+            "confidence": talking_confidence(smoothed),
+            "start": self.burst_start,
+        }]
 
 def calculate_mouth_aspect_ratio(mouth_points):
     """
     Calculate the mouth aspect ratio to detect mouth opening.
 
     Args:
-        mouth_points: A numpy array of mouth landmark points.
+        mouth_points: A numpy array of the 20 mouth landmark points (48-67).
 
     Returns:
         Mouth aspect ratio (MAR).
     """
-    # Vertical mouth distances
-    v1 = np.linalg.norm(mouth_points[2] - mouth_points[10])  # Upper lip to lower lip
-    v2 = np.linalg.norm(mouth_points[4] - mouth_points[8])   # Upper lip to lower lip
-
-    # Horizontal mouth distance
-    h = np.linalg.norm(mouth_points[0] - mouth_points[6])    # Left to right corner
-
-    # Calculate mouth aspect ratio
-    mar = (v1 + v2) / (2.0 * h + 1e-6)
-
-    return mar
\ No newline at end of file
+    landmarks = np.zeros((68, 2), dtype=np.float32)
+    landmarks[48:68] = mouth_points
+    return float(mouth_aspect_ratio(landmarks))
@@ -0,0 +1,188 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import cv2
+
+try:
+    import onnxruntime
+except ImportError:
+    onnxruntime = None
+
+# Path to the 68-point LBF facial landmark model (lbfmodel.yaml)
+LBF_MODEL_PATH = os.environ.get('PROCTORING_LBF_MODEL', 'lbfmodel.yaml')
+
+# YOLO-family object detection model: an ONNX export, or Darknet weights with
+# their .cfg in PROCTORING_OBJECT_MODEL_CONFIG
+OBJECT_MODEL_PATH = os.environ.get('PROCTORING_OBJECT_MODEL', 'yolov5s.onnx')
+OBJECT_MODEL_CONFIG = os.environ.get('PROCTORING_OBJECT_MODEL_CONFIG', '')
+
+
+def _current_rss():
+    """
+    Resident set size of this process in bytes, or None if unavailable.
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class ModelRegistry:
+    """
+    Lazily load models once per process and share them between callers.
+
+    Each model is registered with a loader function and built on first use.
+    Loading is guarded by a per-model lock, so concurrent first calls load the
+    model only once. OpenCV detectors are not safe to call from several threads
+    at once, so `use` also serializes calls to a shared instance. Models that
+    are cheap to load and small (the Haar cascade) can instead be registered
+    `per_thread`: every thread loads its own instance and uses it without a lock.
+    """
+
+    def __init__(self):
+        self._loaders = {}
+        self._models = {}
+        self._stats = {}
+        self._load_locks = {}
+        self._use_locks = {}
+        self._thread_models = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, loader, per_thread=False):
+        """
+        Register a zero-argument loader for a model name.
+
+        With `per_thread`, each thread gets its own instance instead of sharing one.
+        """
+        with self._lock:
+            self._loaders[name] = loader
+            self._load_locks[name] = threading.Lock()
+            self._use_locks[name] = threading.RLock()
+            self._thread_models[name] = threading.local() if per_thread else None
+            self._models.pop(name, None)
+            self._stats.pop(name, None)
+
+    def get(self, name):
+        """
+        Return the instance of a model for the calling thread, loading it on first use.
+
+        This is the shared instance unless the model is registered `per_thread`.
+        """
+        try:
+            return self._models[name]
+        except KeyError:
+            pass
+
+        try:
+            thread_models = self._thread_models[name]
+        except KeyError:
+            raise KeyError(f"No model registered as '{name}'")
+
+        if thread_models is not None:
+            model = getattr(thread_models, 'model', None)
+            if model is None:
+                model = thread_models.model = self._load(name)
+            return model
+
+        with self._load_locks[name]:
+            # Another thread may have loaded it while we waited
+            if name in self._models:
+                return self._models[name]
+            model = self._models[name] = self._load(name)
+            return model
+
+    def _load(self, name):
+        rss_before = _current_rss()
+        start = time.perf_counter()
+        model = self._loaders[name]()
+        load_seconds = time.perf_counter() - start
+        rss_after = _current_rss()
+
+        self._stats[name] = {
+            "load_seconds": load_seconds,
+            "rss_bytes": rss_after - rss_before if rss_before is not None else None,
+        }
+        return model
+
+    @contextmanager
+    def use(self, name):
+        """
+        Borrow a model for exclusive use by the calling thread.
+        """
+        model = self.get(name)
+        if self._thread_models[name] is not None:
+            # Only this thread holds the instance
+            yield model
+            return
+        with self._use_locks[name]:
+            yield model
+
+    def preload(self, names=None):
+        """
+        Load the given models (all registered models by default) and return their stats.
+        """
+        for name in names or list(self._loaders):
+            self.get(name)
+        return self.stats()
+
+    def names(self):
+        return sorted(self._loaders)
+
+    def is_loaded(self, name):
+        return name in self._models or getattr(self._thread_models.get(name), 'model', None) is not None
+
+    def stats(self):
+        """
+        Load time in seconds and resident memory growth in bytes per loaded model
+        (of the latest instance, for per-thread models).
+        """
+        return {name: dict(stats) for name, stats in self._stats.items()}
+
+
+def _load_face_cascade():
+    classifier = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+    if classifier.empty():
+        raise RuntimeError("Could not load Haar face cascade")
+    return classifier
+
+
+def _load_facemark_lbf():
+    landmark_detector = cv2.face.createFacemarkLBF()
+    landmark_detector.loadModel(LBF_MODEL_PATH)
+    return landmark_detector
+
+
+def _load_object_detector():
+    if not os.path.exists(OBJECT_MODEL_PATH):
+        raise RuntimeError(f"Object detection model not found: {OBJECT_MODEL_PATH}")
+    net = cv2.dnn.readNet(OBJECT_MODEL_PATH, OBJECT_MODEL_CONFIG)
+    net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+    net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+    return net
+
+
+def _load_object_detector_onnxruntime():
+    if onnxruntime is None:
+        raise RuntimeError("The onnxruntime engine needs the onnxruntime package")
+    if not os.path.exists(OBJECT_MODEL_PATH):
+        raise RuntimeError(f"Object detection model not found: {OBJECT_MODEL_PATH}")
+    return onnxruntime.InferenceSession(OBJECT_MODEL_PATH, providers=['CPUExecutionProvider'])
+
+
+registry = ModelRegistry()
+# About 1 MB and 10 ms to load, so every thread detects faces without waiting
+registry.register('face_cascade', _load_face_cascade, per_thread=True)
+registry.register('facemark_lbf', _load_facemark_lbf)
+registry.register('object_detector', _load_object_detector)
+registry.register('object_detector_ort', _load_object_detector_onnxruntime)
+
+
+def get_model(name):
+    return registry.get(name)
+
+
+def use_model(name):
+    return registry.use(name)
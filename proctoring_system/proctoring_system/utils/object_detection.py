@@ -1,68 +1,295 @@
 import cv2
 import numpy as np
 
-def detect_objects(frame):
+from proctoring_system.utils.frame_context import FrameContext
+from proctoring_system.utils import model_registry
+from proctoring_system.utils.model_registry import use_model
+
+# Detected classes that count as a violation, and the confidence they need
+FORBIDDEN_OBJECTS = frozenset(["cell phone", "book", "laptop", "tablet", "person"])
+MIN_CONFIDENCE = 0.6
+
+# Class names in the order COCO-trained YOLO models output them
+COCO_CLASSES = [
+    "person", "bicycle", "car", "motorcycle", "airplane", "bus", "train", "truck", "boat", "traffic light",
+    "fire hydrant", "stop sign", "parking meter", "bench", "bird", "cat", "dog", "horse", "sheep", "cow",
+    "elephant", "bear", "zebra", "giraffe", "backpack", "umbrella", "handbag", "tie", "suitcase", "frisbee",
+    "skis", "snowboard", "sports ball", "kite", "baseball bat", "baseball glove", "skateboard", "surfboard",
+    "tennis racket", "bottle", "wine glass", "cup", "fork", "knife", "spoon", "bowl", "banana", "apple",
+    "sandwich", "orange", "broccoli", "carrot", "hot dog", "pizza", "donut", "cake", "chair", "couch",
+    "potted plant", "bed", "dining table", "toilet", "tv", "laptop", "mouse", "remote", "keyboard",
+    "cell phone", "microwave", "oven", "toaster", "sink", "refrigerator", "book", "clock", "vase",
+    "scissors", "teddy bear", "hair drier", "toothbrush",
+]
+
+
+class ContourBackend:
     """
-    Detect suspicious objects in the frame like phones, books, additional screens, etc.
-    
+    The bright-rectangle contour heuristic, one frame at a time.
+
+    Needs no model, so it is the fallback when no detection model is deployed.
+    """
+
+    name = 'contour'
+    batch_size = 1
+
+    def detect_batch(self, frames, contexts=None):
+        contexts = contexts or [None] * len(frames)
+        return [
+            simulate_object_detection(frame, gray=context.small_gray, scale=context.scale)
+            if context is not None else simulate_object_detection(frame)
+            for frame, context in zip(frames, contexts)
+        ]
+
+
+class DnnBackend:
+    """
+    YOLO-family object detector on the CPU, running `batch_size` frames per forward pass.
+
+    The model is loaded once per process through the model registry (see
+    PROCTORING_OBJECT_MODEL) and run with OpenCV DNN or, with
+    engine='onnxruntime', ONNX Runtime. Supported outputs are YOLOv5-style
+    (rows of box, objectness and class scores), YOLOv8-style (channels first,
+    no objectness) and Darknet YOLO as decoded by OpenCV.
+
     Args:
-        frame: The video frame to analyze
-        
+        batch_size: Frames per forward pass
+        input_size: Square network input size in pixels
+        score_threshold: Minimum class confidence to keep a box
+        nms_threshold: IoU above which overlapping boxes of a class are merged
+        class_names: Class names in model output order
+        engine: 'opencv' or 'onnxruntime'
+        layout: 'yolov5', 'yolov8' or 'darknet'; guessed from the model if None
+    """
+
+    name = 'dnn'
+
+    def __init__(self, batch_size=8, input_size=640, score_threshold=0.25, nms_threshold=0.45,
+                 class_names=None, engine='opencv', layout=None):
+        if engine not in ('opencv', 'onnxruntime'):
+            raise ValueError(f"Unknown inference engine: {engine}")
+        self.batch_size = batch_size
+        self.input_size = input_size
+        self.score_threshold = score_threshold
+        self.nms_threshold = nms_threshold
+        self.class_names = class_names or COCO_CLASSES
+        self.engine = engine
+        self.layout = layout or ('darknet' if model_registry.OBJECT_MODEL_CONFIG else None)
+
+    def detect_batch(self, frames, contexts=None):
+        # The network input is small, so resize from the working copies when there are any
+        images = [context.small for context in contexts] if contexts else frames
+        results = []
+        for start in range(0, len(frames), self.batch_size):
+            batch = frames[start:start + self.batch_size]
+            outputs = self._forward(images[start:start + self.batch_size])
+            for output, frame in zip(outputs, batch):
+                results.append(decode_yolo_output(
+                    output, frame.shape, self.input_size, self.class_names,
+                    self.score_threshold, self.nms_threshold, self.layout,
+                ))
+        return results
+
+    def _forward(self, frames):
+        """
+        Run one batch through the network; returns one raw output array per frame.
+        """
+        blob = cv2.dnn.blobFromImages(frames, 1 / 255.0, (self.input_size, self.input_size), swapRB=True, crop=False)
+
+        if self.engine == 'onnxruntime':
+            with use_model('object_detector_ort') as session:
+                model_input = session.get_inputs()[0]
+                if isinstance(model_input.shape[0], int) and model_input.shape[0] != len(frames):
+                    # Exported with a fixed batch size of 1
+                    output = np.concatenate([session.run(None, {model_input.name: blob[i:i + 1]})[0]
+                                             for i in range(len(frames))])
+                else:
+                    output = session.run(None, {model_input.name: blob})[0]
+        else:
+            with use_model('object_detector') as net:
+                try:
+                    net.setInput(blob)
+                    output = net.forward()
+                except cv2.error:
+                    if len(frames) == 1:
+                        raise
+                    # Exported with a fixed batch size; run this call one frame per pass,
+                    # leaving batch_size alone since the backend is shared
+                    outputs = []
+                    for i in range(len(frames)):
+                        net.setInput(blob[i:i + 1])
+                        single = net.forward()
+                        outputs.append(single.reshape(1, *single.shape[-2:]))
+                    output = np.concatenate(outputs)
+
+        # OpenCV drops the batch axis of a single image's output
+        return output.reshape(len(frames), *output.shape[-2:])
+
+
+BACKENDS = {
+    'contour': ContourBackend,
+    'dnn': DnnBackend,
+}
+
+
+def make_backend(name='contour', **options):
+    """
+    Build an object detector backend from its name ('contour' or 'dnn').
+    """
+    try:
+        backend_class = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown object detector backend: {name}")
+    return backend_class(**options)
+
+
+def decode_yolo_output(output, frame_shape, input_size, class_names, score_threshold=0.25, nms_threshold=0.45,
+                       layout=None):
+    """
+    Turn one image's raw YOLO output into detections in frame coordinates.
+
+    Args:
+        output: (rows, 5 + classes) for YOLOv5/Darknet, (4 + classes, rows) for YOLOv8
+        frame_shape: Shape of the original frame
+        input_size: Square network input size the frame was resized to
+        class_names: Class names in output order
+        score_threshold: Minimum class confidence to keep a box
+        nms_threshold: IoU threshold for per-class non-maximum suppression
+        layout: 'yolov5', 'yolov8' or 'darknet'; guessed from the shape if None
+
     Returns:
-        List of detected violations with description and confidence
+        List of detections with class, confidence and bbox [x, y, w, h]
+    """
+    if layout is None:
+        layout = 'yolov8' if output.shape[0] < output.shape[1] else 'yolov5'
+
+    if layout == 'yolov8':
+        output = output.T
+        scores = output[:, 4:]
+    elif layout == 'yolov5':
+        scores = output[:, 5:] * output[:, 4:5]
+    else:
+        # OpenCV's Darknet region layer already folds the objectness into the class scores
+        scores = output[:, 5:]
+
+    class_ids = scores.argmax(axis=1)
+    confidences = scores[np.arange(len(scores)), class_ids]
+    keep = confidences >= score_threshold
+    if not keep.any():
+        return []
+
+    boxes = output[keep, :4].astype(np.float32)
+    class_ids = class_ids[keep]
+    confidences = confidences[keep]
+
+    # Darknet boxes are relative to the image, the others are in input pixels
+    height, width = frame_shape[:2]
+    scale = np.array([width, height, width, height], dtype=np.float32)
+    if layout != 'darknet':
+        scale /= input_size
+    boxes *= scale
+    boxes[:, :2] -= boxes[:, 2:] / 2  # center to top-left corner
+
+    indices = cv2.dnn.NMSBoxesBatched(
+        boxes.tolist(), confidences.tolist(), class_ids.tolist(), score_threshold, nms_threshold
+    )
+
+    detections = []
+    for i in np.asarray(indices, dtype=int).reshape(-1):
+        class_id = int(class_ids[i])
+        detections.append({
+            "class": class_names[class_id] if class_id < len(class_names) else str(class_id),
+            "confidence": round(float(confidences[i]), 2),
+            "bbox": [int(round(v)) for v in boxes[i]],
+        })
+    return detections
+
+
+def detections_to_violations(detection_results):
+    """
+    Keep the detections of forbidden objects that are confident enough.
     """
     violations = []
-    
+    for detection in detection_results:
+        obj_class = detection["class"]
+        confidence = detection["confidence"]
+
+        # Add to violations if it's a forbidden object
+        if obj_class in FORBIDDEN_OBJECTS and confidence > MIN_CONFIDENCE:
+            violations.append({
+                "description": f"Suspicious object detected: {obj_class}",
+                "confidence": confidence
+            })
+    return violations
+
+
+def detect_objects_batch(frames, contexts=None, backend=None):
+    """
+    Detect suspicious objects in several frames with one batched backend call.
+
+    Args:
+        frames: The video frames to analyze
+        contexts: Optional FrameContexts of the frames, shared with the other analyzers
+        backend: Object detector backend; the contour heuristic if omitted
+
+    Returns:
+        List with the detected violations of each frame
+    """
     try:
-        # Convert frame to RGB for object detection models
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        
-        # In a real implementation, you would use a pre-trained object detection model like YOLO, SSD, or Faster R-CNN
-        # For simplicity, we'll simulate object detection results
-        
-        # Simulate detection of suspicious objects
-        # This would be replaced with actual model inference
-        detection_results = simulate_object_detection(rgb_frame)
-        
-        # Process the detection results
-        for detection in detection_results:
-            obj_class = detection["class"]
-            confidence = detection["confidence"]
-            
-            # Add to violations if it's a forbidden object
-            forbidden_objects = ["cell phone", "book", "laptop", "tablet", "person"]
-            
-            if obj_class in forbidden_objects and confidence > 0.6:
-                violations.append({
-                    "description": f"Suspicious object detected: {obj_class}",
-                    "confidence": confidence
-                })
-        
+        if backend is None:
+            backend = ContourBackend()
+        if contexts is None:
+            contexts = [FrameContext(frame) for frame in frames]
+
+        return [detections_to_violations(results) for results in backend.detect_batch(frames, contexts)]
+
     except Exception as e:
         # Handle exceptions
         print(f"Error in object detection: {str(e)}")
-    
-    return violations
+        return [[] for _ in frames]
+
+
+def detect_objects(frame, context=None, backend=None):
+    """
+    Detect suspicious objects in the frame like phones, books, additional screens, etc.
 
-def simulate_object_detection(frame):
+    Args:
+        frame: The video frame to analyze
+        context: Optional FrameContext shared with the other analyzers
+        backend: Object detector backend; the contour heuristic if omitted
+
+    Returns:
+        List of detected violations with description and confidence
+    """
+    contexts = [context] if context is not None else None
+    return detect_objects_batch([frame], contexts, backend)[0]
+
+
+def simulate_object_detection(frame, gray=None, scale=1.0):
     """
     Simulate object detection for demonstration purposes
     In a real system, this would be replaced with an actual model
+    
+    Takes a BGR frame; pass `gray` to reuse an existing grayscale conversion,
+    which may be downscaled by `scale` (bboxes are returned in frame coordinates)
     """
     # This is just for simulation - no real detections are happening
-    h, w, _ = frame.shape
+    h, w = gray.shape[:2] if gray is not None else frame.shape[:2]
     results = []
     
     # Check for bright rectangular areas that might be phones/screens
-    gray = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
-    blurred = cv2.GaussianBlur(gray, (15, 15), 0)
+    if gray is None:
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    # Blur and minimum area are in full-resolution pixels, scaled to the image
+    kernel = max(3, int(15 * scale) | 1)
+    blurred = cv2.GaussianBlur(gray, (kernel, kernel), 0)
     _, thresh = cv2.threshold(blurred, 200, 255, cv2.THRESH_BINARY)
     
     contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
     
     for contour in contours:
         area = cv2.contourArea(contour)
-        if area > 1000:  # Minimum area to be considered
+        if area > 1000 * scale ** 2:  # Minimum area to be considered
             x, y, w, h = cv2.boundingRect(contour)
             aspect_ratio = float(w) / h
             
@@ -84,4 +311,8 @@ def simulate_object_detection(frame):
             "bbox": [0, 0, w//3, h//3]
         })
     
+    if scale != 1.0:
+        for result in results:
+            result["bbox"] = [int(round(v / scale)) for v in result["bbox"]]
+    
     return results
\ No newline at end of file
@@ -0,0 +1,543 @@
+import multiprocessing
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from proctoring_system.utils.change_gate import make_change_gate
+from proctoring_system.utils.eye_tracking import FACE_MATCH_THRESHOLD, GazeState, observe_gaze
+from proctoring_system.utils.face_tracker import make_face_tracker
+from proctoring_system.utils.lip_movement import MAR_RELEASE_THRESHOLD, LipState, observe_lips_batch
+from proctoring_system.utils.object_detection import detect_objects_batch, make_backend
+from proctoring_system.utils.frame_source import FrameSource, make_sampler
+from proctoring_system.utils.frame_context import WORKING_SIZE, FrameContext
+
+# Workers are spawned rather than forked so they never inherit the parent's
+# threads, locks or database connections
+MP_CONTEXT = multiprocessing.get_context('spawn')
+
+
+def _frame_violations(violation_type, timestamp, detected):
+    return [
+        {
+            "type": violation_type,
+            "timestamp": timestamp,
+            "description": violation['description'],
+            "confidence": violation['confidence']
+        }
+        for violation in detected
+    ]
+
+
+def _reuse_observation(observation, timestamp):
+    """
+    Copy an earlier frame's observation to a frame that shows the same scene.
+    """
+    return {
+        "timestamp": timestamp,
+        "gaze": observation['gaze'],
+        "mouth": observation['mouth'],
+        "violations": [dict(violation, timestamp=timestamp) for violation in observation['violations']],
+        "reused": True,
+    }
+
+
+def notable_kinds(observation):
+    """
+    The kinds of violation an observation may be part of: eye violation kinds,
+    'talking' and the object descriptions.
+    """
+    kinds = set()
+    gaze = observation['gaze']
+    if gaze is not None:
+        if gaze.face_count == 0:
+            kinds.add('look_away')
+        elif gaze.face_count > 1:
+            kinds.add('multiple_faces')
+        if gaze.match_scores is not None and float(np.max(gaze.match_scores)) < FACE_MATCH_THRESHOLD:
+            kinds.add('face_mismatch')
+    mouth = observation['mouth']
+    if mouth is not None and len(mouth) and float(np.max(mouth)) > MAR_RELEASE_THRESHOLD:
+        kinds.add('talking')
+    kinds.update(violation['description'] for violation in observation['violations'])
+    return kinds
+
+
+class EventFrames:
+    """
+    Keep the frames that may open a violation event, for screenshots.
+
+    A frame is kept, shrunk to `max_width`, when it shows a kind of violation
+    (see notable_kinds) not seen in the previous `gap` seconds, so memory
+    grows with the number of events rather than with the video length. The
+    frame and its kinds are stored on the observation; reduce_observations
+    hands each violation the latest kept frame of its kind.
+
+    Args:
+        max_width: Width in pixels kept frames are shrunk to, None keeps the frame size
+        gap: Seconds after which a kind seen again starts a new event
+    """
+
+    def __init__(self, max_width=640, gap=5.0):
+        self.max_width = max_width
+        self.gap = gap
+        self.last_seen = {}
+
+    def keep(self, frames, observations):
+        for frame, observation in zip(frames, observations):
+            timestamp = observation['timestamp']
+            kinds = notable_kinds(observation)
+            new_kinds = [
+                kind for kind in kinds
+                if kind not in self.last_seen or timestamp - self.last_seen[kind] > self.gap
+            ]
+            for kind in kinds:
+                self.last_seen[kind] = timestamp
+            if new_kinds:
+                observation['frame'] = self.shrink(frame)
+                observation['frame_kinds'] = new_kinds
+
+    def shrink(self, frame):
+        height, width = frame.shape[:2]
+        if self.max_width and width > self.max_width:
+            size = (self.max_width, max(1, round(height * self.max_width / width)))
+            return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        return frame.copy()
+
+
+def _with_frame(violation, frame):
+    if frame is not None:
+        violation['frame'] = frame
+    return violation
+
+
+def observe_frames(frames, timestamps, reference=None, timings=None, object_backend=None, change_gate=None,
+                   face_tracker=None, working_size=WORKING_SIZE):
+    """
+    Run the per-frame part of every analyzer on a batch of frames.
+
+    With a ChangeGate, frames that look like the last analyzed frame are not
+    analyzed; they get a copy of that frame's observation, marked 'reused'.
+    The gaze timers still advance with them, since the reduction runs on
+    every observation.
+
+    The analyzers share one FrameContext per frame, so the grayscale
+    conversion, face detection and landmark fitting run once per frame.
+    Mouth aspect ratios are computed for the whole batch in one pass, and
+    object detection runs once per batch, so a model backend can infer
+    several frames per forward pass. Apart from the optional gate and
+    tracker, nothing here depends on earlier frames, so frames can be
+    observed in any order or process.
+
+    Args:
+        frames: The video frames to analyze
+        timestamps: Timestamp of each frame in seconds
+        reference: Normalized reference face encodings of the candidate
+        timings: Optional StageTimings collecting per-stage time
+        object_backend: Object detector backend; the contour heuristic if omitted
+        change_gate: Optional ChangeGate, kept across batches of one video or session
+        face_tracker: Optional FaceTracker, kept across batches of one video or session
+        working_size: Longest side of the detection image, None for full resolution
+
+    Returns:
+        List with, per frame, a dict with the timestamp, the GazeObservation
+        (None if eye tracking failed), the mouth aspect ratio of each face
+        and the stateless violations
+    """
+    if change_gate is None:
+        return _analyze_frames(frames, timestamps, reference, timings, object_backend, face_tracker, working_size)
+
+    # Index of the analyzed frame each frame takes its observation from; -1 is
+    # the gate's observation from an earlier batch
+    sources = []
+    analyzed = []
+    for i, (frame, timestamp) in enumerate(zip(frames, timestamps)):
+        with (timings.stage('gate') if timings is not None else nullcontext()):
+            fresh = change_gate.should_analyze(frame, timestamp)
+        if fresh:
+            analyzed.append(i)
+        sources.append(len(analyzed) - 1)
+
+    results = _analyze_frames(
+        [frames[i] for i in analyzed], [timestamps[i] for i in analyzed], reference, timings, object_backend,
+        face_tracker, working_size,
+    )
+
+    observations = []
+    for i, (timestamp, source) in enumerate(zip(timestamps, sources)):
+        if source >= 0 and analyzed[source] == i:
+            observations.append(results[source])
+        else:
+            observations.append(_reuse_observation(results[source] if source >= 0 else change_gate.observation,
+                                                   timestamp))
+    if results:
+        change_gate.observation = results[-1]
+
+    return observations
+
+
+def _analyze_frames(frames, timestamps, reference=None, timings=None, object_backend=None, face_tracker=None,
+                    working_size=WORKING_SIZE):
+    observations = []
+    # Faces are looked up frame by frame in order below, as the tracker needs
+    contexts = [FrameContext(frame, timings, working_size, face_tracker) for frame in frames]
+
+    for frame, timestamp, context in zip(frames, timestamps, contexts):
+        with context.timings.stage('eye'):
+            try:
+                gaze = observe_gaze(frame, reference, context)
+            except Exception as e:
+                print(f"Error in eye movement analysis: {str(e)}")
+                gaze = None
+
+        observations.append({"timestamp": timestamp, "gaze": gaze, "mouth": None, "violations": []})
+
+    if frames:
+        # Landmarks are fitted per frame, the mouth ratios of the whole batch in one pass
+        with contexts[0].timings.stage('lip'):
+            mouths = observe_lips_batch(frames, contexts)
+        for observation, mouth in zip(observations, mouths):
+            observation['mouth'] = mouth
+
+        with contexts[0].timings.stage('object'):
+            detected_objects = detect_objects_batch(frames, contexts, object_backend)
+        for observation, detected in zip(observations, detected_objects):
+            observation['violations'].extend(_frame_violations('object', observation['timestamp'], detected))
+
+    return observations
+
+
+def observe_frame(frame, timestamp, reference=None, timings=None, object_backend=None, change_gate=None,
+                  face_tracker=None, working_size=WORKING_SIZE):
+    """
+    Run the per-frame part of every analyzer on a single frame.
+
+    Returns:
+        Dict with the timestamp, the GazeObservation (None if eye tracking
+        failed) and the stateless violations
+    """
+    return observe_frames(
+        [frame], [timestamp], reference, timings, object_backend, change_gate, face_tracker, working_size
+    )[0]
+
+
+def reduce_observations(observations, gaze_state, lip_state=None):
+    """
+    Turn frame observations, in timestamp order, into violations.
+
+    This is the stateful part of the analysis (look-away timers, enrollment,
+    talking bursts) and is cheap, so it always runs in order in a single
+    process. Lip and look-away violations carry the `start` of their burst;
+    see merge_bursts. If event frames were kept (see EventFrames), each violation
+    gets the latest kept frame of its kind under 'frame'.
+    """
+    violations = []
+    if lip_state is None:
+        lip_state = LipState()
+    # Latest kept event frame of each kind (see EventFrames)
+    frames = {}
+
+    for observation in observations:
+        timestamp = observation['timestamp']
+        for kind in observation.get('frame_kinds', ()):
+            frames[kind] = observation['frame']
+        if observation['gaze'] is not None:
+            for violation in gaze_state.update(observation['gaze'], timestamp):
+                violations.append(
+                    _with_frame(dict(violation, type='eye', timestamp=timestamp), frames.get(violation['kind']))
+                )
+        if observation['mouth'] is not None:
+            for violation in lip_state.update(observation['mouth'], timestamp):
+                violations.append(
+                    _with_frame(dict(violation, type='lip', timestamp=timestamp), frames.get('talking'))
+                )
+        for violation in observation['violations']:
+            violations.append(_with_frame(dict(violation), frames.get(violation['description'])))
+
+    return violations
+
+
+def analyze_frame_violations(frame, timestamp, timings=None, gaze_state=None, object_backend=None,
+                             change_gate=None, face_tracker=None, lip_state=None, working_size=WORKING_SIZE):
+    """
+    Run every frame analyzer on a single frame.
+
+    Args:
+        frame: The video frame to analyze
+        timestamp: Timestamp of the frame in seconds
+        timings: Optional StageTimings collecting per-stage time
+        gaze_state: Per-session GazeState; a fresh one is used if omitted
+        object_backend: Object detector backend; the contour heuristic if omitted
+        change_gate: Optional per-session ChangeGate to reuse results for unchanged frames
+        face_tracker: Optional per-session FaceTracker to follow faces between detections
+        lip_state: Per-session LipState; a fresh one is used if omitted
+        working_size: Longest side of the detection image, None for full resolution
+
+    Returns:
+        List of violations with type, timestamp, description and confidence
+    """
+    if gaze_state is None:
+        gaze_state = GazeState()
+
+    observation = observe_frame(
+        frame, timestamp, gaze_state.reference, timings, object_backend, change_gate, face_tracker, working_size
+    )
+    return reduce_observations([observation], gaze_state, lip_state)
+
+
+def merge_bursts(violations):
+    """
+    Merge the per-frame violations of each burst into one violation.
+
+    Violations with a `start` (talking bursts, look-aways) become one
+    violation per burst, at the burst's start, with the `end_timestamp` of
+    its last frame and its peak confidence; a burst keeps the description of
+    its first frame. Other violations pass through unchanged.
+    """
+    merged = []
+    bursts = {}
+
+    for violation in violations:
+        if 'start' not in violation:
+            merged.append(violation)
+            continue
+
+        key = (violation['type'], violation.get('kind', violation['description']), violation['start'])
+        burst = bursts.get(key)
+        if burst is None:
+            burst = {
+                "type": violation['type'],
+                "timestamp": violation['start'],
+                "end_timestamp": violation['timestamp'],
+                "description": violation['description'],
+                "confidence": violation['confidence'],
+            }
+            _with_frame(burst, violation.get('frame'))
+            bursts[key] = burst
+            merged.append(burst)
+        else:
+            burst['end_timestamp'] = violation['timestamp']
+            burst['confidence'] = max(burst['confidence'], violation['confidence'])
+
+    return merged
+
+
+def analyze_video_range(video_path, start_frame=0, end_frame=None, policy='fixed', sample_options=None,
+                        progress=None, timings=None, reference=None, detector='contour', detector_options=None,
+                        gate_options=None, tracker_options=None, restart_frames=(), event_frames=None,
+                        working_size=WORKING_SIZE):
+    """
+    Observe the sampled frames of one range of a video file.
+
+    Sampled frames are buffered and observed in batches of the object
+    detector's batch size. The change gate, face tracker and event frame
+    keeper start fresh at the range start and at every frame index in
+    `restart_frames`, with the batch flushed first, so a range read in one pass gives the same
+    observations as the same range cut into chunks at those frames.
+
+    Args:
+        video_path: Path to the video file
+        start_frame: First frame index of the range
+        end_frame: Frame index to stop before, or None for the end of the file
+        policy: Frame sampling policy name
+        sample_options: Keyword arguments for the sampler
+        progress: Optional callable receiving the fraction of the range analyzed
+        timings: Optional StageTimings collecting per-stage time
+        reference: Normalized reference face encodings of the candidate
+        detector: Object detector backend name
+        detector_options: Keyword arguments for the object detector backend
+        gate_options: Keyword arguments for a ChangeGate, None analyzes every sampled frame
+        tracker_options: Keyword arguments for a FaceTracker, None detects faces on every frame
+        restart_frames: Frame indices, in increasing order, where the gate, tracker and keeper start over
+        event_frames: Keyword arguments for EventFrames, None keeps no frames
+        working_size: Longest side of the detection image, None for full resolution
+
+    Returns:
+        List of frame observations in timestamp order
+    """
+    observations = []
+    sampler = make_sampler(policy, **(sample_options or {}))
+    object_backend = make_backend(detector, **(detector_options or {}))
+    change_gate = make_change_gate(gate_options)
+    face_tracker = make_face_tracker(tracker_options)
+    keeper = EventFrames(**event_frames) if event_frames is not None else None
+    batch, batch_timestamps = [], []
+    restarts = [frame for frame in restart_frames if frame > start_frame]
+
+    def observe_batch():
+        batch_observations = observe_frames(
+            batch, batch_timestamps, reference, timings, object_backend, change_gate, face_tracker, working_size
+        )
+        if keeper is not None:
+            keeper.keep(batch, batch_observations)
+        observations.extend(batch_observations)
+
+    with FrameSource(video_path, sampler=sampler, start_frame=start_frame, end_frame=end_frame) as frames:
+        range_end = frames.frame_count if end_frame is None else end_frame
+        range_length = max(1, range_end - start_frame)
+
+        for frame_idx, timestamp, frame in frames:
+            if restarts and frame_idx >= restarts[0]:
+                while restarts and frame_idx >= restarts[0]:
+                    restarts.pop(0)
+                if batch:
+                    observe_batch()
+                    batch, batch_timestamps = [], []
+                change_gate = make_change_gate(gate_options)
+                face_tracker = make_face_tracker(tracker_options)
+                keeper = EventFrames(**event_frames) if event_frames is not None else None
+
+            batch.append(frame)
+            batch_timestamps.append(timestamp)
+            if len(batch) >= object_backend.batch_size:
+                observe_batch()
+                batch, batch_timestamps = [], []
+                if progress is not None:
+                    progress(min(1.0, (frame_idx + 1 - start_frame) / range_length))
+
+        if batch:
+            observe_batch()
+        if progress is not None:
+            progress(1.0)
+
+    return observations
+
+
+def find_enrollment(video_path, start_frame=0, end_frame=None, policy='fixed', sample_options=None,
+                    working_size=WORKING_SIZE):
+    """
+    Find the first sampled frame in a range that can enroll the candidate.
+
+    This is a separate decode of the range, so callers keep the range short
+    (see analyze_video_file's `enrollment_seconds`).
+
+    Returns:
+        Tuple of (timestamp, encoding), or None if no frame has exactly one face
+    """
+    sampler = make_sampler(policy, **(sample_options or {}))
+
+    with FrameSource(video_path, sampler=sampler, start_frame=start_frame, end_frame=end_frame) as frames:
+        for frame_idx, timestamp, frame in frames:
+            try:
+                gaze = observe_gaze(frame, context=FrameContext(frame, working_size=working_size))
+            except Exception as e:
+                print(f"Error in eye movement analysis: {str(e)}")
+                continue
+            if gaze.encoding is not None:
+                return timestamp, gaze.encoding
+
+    return None
+
+
+def count_reused(observations, gate_stats):
+    """
+    Add the analyzed and reused observations to a ChangeGateStats, if given.
+    """
+    if gate_stats is not None:
+        for observation in observations:
+            gate_stats.add(observation.get('reused', False))
+
+
+def _analyze_chunk(args):
+    return analyze_video_range(*args)
+
+
+def plan_chunks(frame_count, fps, chunk_seconds):
+    """
+    Split a video into contiguous (start_frame, end_frame) ranges.
+    """
+    chunk_frames = max(1, int(fps * chunk_seconds))
+    return [
+        (start, min(start + chunk_frames, frame_count))
+        for start in range(0, frame_count, chunk_frames)
+    ]
+
+
+def analyze_video_file(video_path, workers=1, chunk_seconds=60, policy='fixed', sample_options=None,
+                       progress=None, detector='contour', detector_options=None, gate_options=None,
+                       gate_stats=None, tracker_options=None, enrollment_seconds=30, event_frames=None,
+                       working_size=WORKING_SIZE):
+    """
+    Analyze a whole video file, optionally in parallel chunks.
+
+    The video is cut into time ranges of `chunk_seconds` that are decoded and
+    observed in separate worker processes. The candidate's reference face is
+    found first (the first sampled frame with exactly one face within the
+    first `enrollment_seconds`), so every worker compares against the same
+    reference. If no such frame is found there, the first single-face frame of
+    the main pass becomes the reference, but the frames were observed without
+    one, so that video gets no face-mismatch checks. The observations are then
+    reduced in timestamp order with a single GazeState and LipState, so the
+    merged list matches the serial path exactly; each talking burst becomes
+    one violation with an end_timestamp. The fixed-rate sampler picks frames by
+    their absolute index, which keeps the sampled frames identical too;
+    history-dependent samplers restart at each chunk boundary.
+
+    The change gate, face tracker and event frame keeper depend on earlier
+    frames, so they start over at every chunk boundary, counted from t=0, in
+    the serial path as well (see analyze_video_range's `restart_frames`). Results therefore
+    depend on `chunk_seconds` but not on the number of workers.
+
+    Args:
+        video_path: Path to the video file
+        workers: Number of worker processes, 1 analyzes in-process
+        chunk_seconds: Length of each chunk in seconds of video
+        policy: Frame sampling policy name
+        sample_options: Keyword arguments for the sampler
+        progress: Optional callable receiving the fraction of the video analyzed
+        detector: Object detector backend name; each worker loads its own model
+        detector_options: Keyword arguments for the object detector backend
+        gate_options: Keyword arguments for a ChangeGate, None analyzes every
+            sampled frame; the gate starts fresh at each chunk boundary
+        gate_stats: Optional ChangeGateStats counting analyzed and skipped frames
+        tracker_options: Keyword arguments for a FaceTracker, None detects faces
+            on every frame; the tracker starts fresh at each chunk boundary
+        enrollment_seconds: Seconds from the start searched for the reference
+            face before the main pass; None searches the whole video
+        event_frames: Keyword arguments for EventFrames, to keep the frame
+            that opened each violation's event under 'frame' for screenshots
+            during the analysis pass; None keeps no frames
+        working_size: Longest side of the image the face and object detectors
+            run on, None for full resolution
+
+    Returns:
+        List of violations in timestamp order
+    """
+    gaze_state = GazeState()
+
+    with FrameSource(video_path) as source:
+        chunks = plan_chunks(source.frame_count, source.fps, chunk_seconds)
+        enrollment_end = None if enrollment_seconds is None else max(1, int(source.fps * enrollment_seconds))
+
+    enrollment = find_enrollment(video_path, 0, enrollment_end, policy, sample_options, working_size)
+    if enrollment is not None:
+        gaze_state.enroll(enrollment[1], enrollment[0])
+
+    if workers <= 1 or len(chunks) <= 1:
+        observations = analyze_video_range(
+            video_path, 0, None, policy, sample_options, progress, reference=gaze_state.reference,
+            detector=detector, detector_options=detector_options, gate_options=gate_options,
+            tracker_options=tracker_options, restart_frames=[start for start, _ in chunks],
+            event_frames=event_frames, working_size=working_size,
+        )
+        count_reused(observations, gate_stats)
+        return merge_bursts(reduce_observations(observations, gaze_state))
+
+    observations = []
+    max_workers = min(workers, len(chunks))
+
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=MP_CONTEXT) as executor:
+        jobs = [
+            (video_path, start, end, policy, sample_options, None, None, gaze_state.reference,
+             detector, detector_options, gate_options, tracker_options, (), event_frames, working_size)
+            for start, end in chunks
+        ]
+        # map() yields results in submission order, i.e. by chunk start time
+        for done, chunk_observations in enumerate(executor.map(_analyze_chunk, jobs), start=1):
+            observations.extend(chunk_observations)
+            if progress is not None:
+                progress(done / len(chunks))
+
+    count_reused(observations, gate_stats)
+    return merge_bursts(reduce_observations(observations, gaze_state))
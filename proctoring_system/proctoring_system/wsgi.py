@@ -12,5 +12,7 @@ import os
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'proctoring_system.settings')
+# Server processes run the analysis job monitor (see PROCTORING_JOB_MONITOR)
+os.environ.setdefault('PROCTORING_JOB_MONITOR', '1')
 
 application = get_wsgi_application()